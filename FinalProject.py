@@ -1,89 +1,148 @@
+import os
+import time
+import uuid
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.io as pio
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-import ast
-from functools import reduce
-
-# Read the CSV file and put into dataframe
-steam_data = pd.read_csv("data\games.csv", encoding="latin-1", low_memory=False)
-
-# I don't want to see duplicate game titles ruining my beautiful graphs
-steam_data = steam_data.drop_duplicates(subset=['Name'])
-
-steam_data = steam_data.dropna(subset=['Supported languages'])
-
-# Define a function to map the age values to maturity ratings 
-def map_age_to_rating(age):
-    if 0 <= age < 10:
-        return 'G'
-    elif 10 <= age < 13:
-        return 'PG'
-    elif 13 <= age < 15:
-        return 'M'
-    elif 15 <= age < 17:
-        return 'MA'
-    elif 17 <= age < 21:
-        return 'R'
-    else:
-        return 'X'
-    
-
-# Apply the function to create a new column 'Maturity Rating'
-steam_data['Maturity Rating'] = steam_data['Required age'].apply(map_age_to_rating)
-
-# There are so many values which are multiple cents thanks to international currency differences.
-# It can be fixed by just rounding all of them up.
-steam_data['Price'] = steam_data['Price'].round()
-
-# Parse the 'TRUE' and 'FALSE' values to Python boolean format
-#steam_data['Windows'] = steam_data['Windows'].map({'TRUE': True, 'FALSE': False})
-#steam_data['Mac'] = steam_data['Mac'].map({'TRUE': True, 'FALSE': False})
-#steam_data['Linux'] = steam_data['Linux'].map({'TRUE': True, 'FALSE': False})
-
-# Calculate the merged reviews column (rounded to the nearest 10%)
-steam_data['Merged Reviews'] = ((steam_data['Positive'] / (steam_data['Positive'] + steam_data['Negative'])) * 10).round() * 10
-
-# Because of how these are stored, it is much easier to split them into lists in order to use them.
-# Why? It has to do with the fact that their base format is like 'Single-player,Steam achievements,etc.'
-steam_data['developers separated'] = steam_data['Developers'].str.split(',')
-steam_data['publishers separated'] = steam_data['Publishers'].str.split(',')
-steam_data['categories separated'] = steam_data['Categories'].str.split(',')
-steam_data['genres separated'] = steam_data['Genres'].str.split(',')
-steam_data['tags separated'] = steam_data['Tags'].str.split(',')
-
-# Create a Dash web application
-app = dash.Dash(__name__)
-
-all_languages = []
-
-for supported_languages in steam_data['Supported languages']:
-    try:
-        languages = ast.literal_eval(supported_languages)
-        all_languages.extend(languages)
-    except (ValueError, SyntaxError):
-        # Handle invalid data gracefully (e.g., non-list values)
-        pass
-
-language_series = pd.Series(all_languages)
-
-language_counts = language_series.value_counts().reset_index().head(50)
-language_counts.columns = ['Language', 'Count']
-
-# Create a bar chart using Plotly Express for language counts
-language_chart = px.bar(
-    language_counts,
-    x='Language',
-    y='Count',
-    title='Language Counts'
-)
-
-# Update chart layout for interactivity
-language_chart.update_layout(
-    clickmode='event+select',
-    showlegend=False
-)
+import flask
+from dash import Patch, dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from steam_data import DATA_PATH, PLATFORMS, SUCCESS_METRICS, TREND_PERIODS, count_platforms, platform_bits
+from query_engine import OUTPUT_FORMATS, OUTPUT_MIMETYPES, QueryEngine, parse_queries
+from result_cache import ResultCache, top_games_cache_key
+from request_metrics import CallbackMetrics, RequestTimer
+from dataset_manager import DatasetManager
+from background_jobs import BackgroundJobs, JobCancelled
+from sharded_filter import ShardedFilter
+
+# How often (in seconds) to check whether games.csv has been replaced, 0 turns reloading off
+RELOAD_SECONDS = float(os.environ.get('STEAM_RELOAD_SECONDS', 30))
+
+# Read the CSV file and put into dataframe (or the preprocessed snapshot of it, see steam_data.py).
+# The manager swaps in a new version of it whenever the csv changes, so everything below grabs
+# dataset_manager.current when it needs the data instead of keeping its own copy.
+# It's created by create_app below.
+dataset_manager = None
+
+# The multi-select dropdowns don't ship every option with the page (there are hundreds of thousands of them),
+# instead the server sends back the most common matches for whatever has been typed so far
+DROPDOWN_OPTION_LIMIT = 50
+
+# How many games the game search shows at most
+GAME_SEARCH_LIMIT = 10
+
+searchable_dropdowns = {
+    'developers-dropdown': 'developers separated',
+    'publishers-dropdown': 'publishers separated',
+    'categories-dropdown': 'categories separated',
+    'genres-dropdown': 'genres separated',
+    'tags-dropdown': 'tags separated',
+}
+
+# Users tend to flip back and forth between the same few selections, so the finished charts are kept around.
+# The memory limit can be changed with the STEAM_RESULT_CACHE_MB environment variable.
+RESULT_CACHE_MB = float(os.environ.get('STEAM_RESULT_CACHE_MB', 64))
+result_cache = ResultCache(int(RESULT_CACHE_MB * 1024 * 1024))
+
+# Every callback is timed stage by stage, and the numbers are served on /metrics for Prometheus to scrape.
+# Requests slower than STEAM_SLOW_REQUEST_MS milliseconds get printed with where the time went (0 turns that off).
+SLOW_REQUEST_MS = float(os.environ.get('STEAM_SLOW_REQUEST_MS', 1000))
+callback_metrics = CallbackMetrics(SLOW_REQUEST_MS / 1000)
+
+# How much building the top games chart without plotly express, and only sending the parts of it that changed,
+# saves (see make_top_games_figure)
+figure_bytes = callback_metrics.add_counter('steam_top_games_figure_bytes_total', 'Bytes of top games chart sent, by whether the whole figure or just the changes were sent.', ('response',))
+figure_bytes_saved = callback_metrics.add_counter('steam_top_games_figure_bytes_saved_total', 'Bytes not sent thanks to sending just the changes to the top games chart.')
+figure_seconds_saved = callback_metrics.add_counter('steam_top_games_figure_build_seconds_saved_total', 'Time saved building top games charts without plotly express (compared with timing px.bar once).')
+
+# Building a top 15 chart that isn't in the cache happens on a pool of STEAM_BACKGROUND_WORKERS background threads,
+# so slow ones don't hold up the server. Only the newest request of every page load gets built, each page load
+# gets at most STEAM_SESSION_JOBS of them running at once, and a request waits STEAM_DEBOUNCE_MS milliseconds
+# first in case another one replaces it. Setting STEAM_BACKGROUND_WORKERS to 0 builds them in the request instead.
+BACKGROUND_WORKERS = int(os.environ.get('STEAM_BACKGROUND_WORKERS', 4))
+SESSION_JOBS = int(os.environ.get('STEAM_SESSION_JOBS', 1))
+DEBOUNCE_MS = float(os.environ.get('STEAM_DEBOUNCE_MS', 150))
+background_jobs = BackgroundJobs(os.path.join(os.path.dirname(DATA_PATH), 'jobs'), BACKGROUND_WORKERS, SESSION_JOBS,
+                                 DEBOUNCE_MS / 1000, metrics=callback_metrics)
+
+# Queries that still have at least STEAM_SHARD_MIN_ROWS games left after the language, rating, price and review
+# filters, and use any of the others, get split between STEAM_FILTER_PROCESSES processes (0 or 1 turns it off)
+FILTER_PROCESSES = int(os.environ.get('STEAM_FILTER_PROCESSES', min(os.cpu_count() or 1, 4)))
+SHARD_MIN_ROWS = int(os.environ.get('STEAM_SHARD_MIN_ROWS', 100000))
+sharded_filter = ShardedFilter(FILTER_PROCESSES, SHARD_MIN_ROWS)
+
+# How often (in milliseconds) the page asks whether its chart is ready yet
+JOB_POLL_MS = 200
+
+# Hit/miss/eviction counts of the result cache, for working out how big it needs to be
+def cache_stats():
+    return result_cache.stats()
+
+def metrics():
+    # Plus how this process's data reloads are going (see dataset_manager.py)
+    reload_lines = [
+        '# HELP steam_dataset_reloads_total New versions of games.csv swapped in by this process.',
+        '# TYPE steam_dataset_reloads_total counter',
+        f'steam_dataset_reloads_total {dataset_manager.reloads}',
+        '# HELP steam_dataset_reload_failing 1 if the last reload of games.csv failed (the old data is still being used).',
+        '# TYPE steam_dataset_reload_failing gauge',
+        f'steam_dataset_reload_failing {int(dataset_manager.last_error is not None)}',
+    ]
+    return flask.Response(callback_metrics.render() + '\n'.join(reload_lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# The same top 15s the chart shows, for scripts and reports: POST a query (the fields are listed in query_engine.py)
+# or a list of them as JSON to /api/top-games. A list can also be streamed back as JSON Lines or CSV,
+# with ?format=jsonl or ?format=csv.
+def api_top_games():
+    body = flask.request.get_json(silent=True)
+    if body is None:
+        return flask.jsonify({'error': "Expected a JSON query, or a list of them"}), 400
+
+    output_format = flask.request.args.get('format', 'json')
+    if output_format != 'json' and output_format not in OUTPUT_FORMATS:
+        return flask.jsonify({'error': f"Unknown format {output_format!r}, it can be json, {', '.join(OUTPUT_FORMATS)}"}), 400
+
+    # ?explain=1 adds the steps taken to answer each query, for working out why one is slow
+    explain = flask.request.args.get('explain', '') not in ('', '0', 'false')
+
+    queries = parse_queries(body if isinstance(body, list) else [body])
+    engine = QueryEngine(dataset_manager.current, sharded_filter, memo=True)
+    results = engine.run_batch(queries, new_timer=lambda: callback_metrics.request('api top games'), explain=explain)
+
+    if not isinstance(body, list):
+        result = next(results)
+        return flask.jsonify(result), 400 if 'error' in result else 200
+    if output_format == 'json':
+        return flask.jsonify(list(results))
+    return flask.Response(flask.stream_with_context(OUTPUT_FORMATS[output_format](results)), mimetype=OUTPUT_MIMETYPES[output_format])
+
+# The language chart only changes when the data does, so it's kept until the next reload
+language_charts = {}
+
+# It's kept as a plain dict, so it doesn't have to be validated and converted again every time the page is loaded
+def make_language_chart(dataset):
+    if dataset.version not in language_charts:
+        # Create a bar chart using Plotly Express for language counts
+        language_chart = px.bar(
+            dataset.language_counts,
+            x='Language',
+            y='Count',
+            title='Language Counts'
+        )
+
+        # Update chart layout for interactivity
+        language_chart.update_layout(
+            clickmode='event+select',
+            showlegend=False
+        )
+
+        language_charts.clear()
+        language_charts[dataset.version] = language_chart.to_plotly_json()
+
+    return language_charts[dataset.version]
 
 category_dropdown_style = {
     #'backgroundColor': 'white',  # Background color
@@ -116,100 +175,82 @@ maturity_rating_dropdown = html.Div([
     )
 ])
 
-price_ranges = steam_data['Price'].unique()
-price_ranges = sorted(price_ranges, reverse=False)  # Ensure it goes in descending order
-price_ranges = [int(price) if not pd.isna(price) else None for price in price_ranges]  # Round the price values to integers, replace NaN with None
-price_range_dropdown = html.Div([
-    html.Label("Select Price Range"),
-    dcc.Dropdown(
-        id='price-range-dropdown',
-        options=[{'label': price, 'value': price} for price in price_ranges if price is not None],  # Filter out None values
-        value=None, # price_ranges[0] if price_ranges and price_ranges[0] is not None else None  # Set default value to the first non-None value
-        style=category_dropdown_style
-    )
-])
-
-# Handle 'DLC count' values
-# Note: This code block doesn't filter the values to integer, meaning it isn't properly ordered and doesn't function to full capacity.
-#dlc_ranges = steam_data['DLC count'].unique()
-#dlc_ranges = sorted(dlc_ranges, reverse=False)  # Ensure it goes in descending order
-#dlc_range_dropdown = html.Div([
-#    html.Label("Select No. of DLC's"),
-#    dcc.Dropdown(
-#        id='dlc-range-dropdown',
-#        options=[{'label': dlc, 'value': dlc} for dlc in dlc_ranges if dlc is not None],  # Filter out None values
-#        value=None # dlc_ranges[0] if dlc_ranges and dlc_ranges[0] is not None else None  # Set default value to the first non-None value
-#    )
-#])
-
-# Create dropdowns for each platform
-#windows_dropdown = html.Div([
-#    html.Label("Windows Support?"),
-#    dcc.Dropdown(
-#        id='windows-dropdown',
-#        options=[
-#            {'label': 'True', 'value': True},
-#            {'label': 'False', 'value': False},
-#        ],
-#        multi=False,
-#        value=None,  # Default to None
-#        style=category_dropdown_style
-#    )
-#])
-
-#mac_dropdown = html.Div([
-#    html.Label("Mac Support?"),
-#    dcc.Dropdown(
-#        id='mac-dropdown',
-#        options=[
-#            {'label': 'True', 'value': True},
-#            {'label': 'Flase', 'value': False},
-#        ],
-#        multi=False,
-#        value=None,  # Default to None
-#        style=category_dropdown_style
-#    )
-#])
-
-#linux_dropdown = html.Div([
-#    html.Label("Linux Support?"),
-#    dcc.Dropdown(
-#        id='linux-dropdown',
-#        options=[
-#            {'label': 'True', 'value': True},
-#            {'label': 'False', 'value': False},
-#        ],
-#        multi=False,
-#        value=None,  # Default to None
-#        style=category_dropdown_style
-#    )
-#])
-
-# Handle 'Positive' values
-#positive_ranges = steam_data['Positive'].unique()
-#positive_ranges = [int(pos) if pd.notna(pos) and isinstance(pos, (int, float)) else None for pos in positive_ranges]
-#positive_ranges = sorted(positive_ranges, reverse=False)  # Ensure it goes in descending order
-#positive_range_dropdown = html.Div([
-#    html.Label("No. of Positive Steam Ratings"),
-#    dcc.Dropdown(
-#        id='positive-range-dropdown',
-#        options=[{'label': pos, 'value': pos} for pos in positive_ranges if pos is not None],  # Filter out None values
-#        value=None  # Set default value to the first non-None value
-#    )
-#])
-
-# Handle 'Negative' values
-#negative_ranges = steam_data['Negative'].unique()
-#negative_ranges = [int(neg) if pd.notna(neg) and isinstance(neg, (int, float)) else None for neg in negative_ranges]
-#negative_ranges = sorted(negative_ranges, reverse=False)  # Ensure it goes in descending order
-#negative_range_dropdown = html.Div([
-#    html.Label("No. of Negative Steam Ratings"),
-#    dcc.Dropdown(
-#        id='negative-range-dropdown',
-#        options=[{'label': neg, 'value': neg} for neg in negative_ranges if neg is not None],  # Filter out None values
-#        value=None  # Set default value to the first non-None value
-#    )
-#])
+# How many marks each range slider has
+RANGE_SLIDER_STOPS = 11
+
+# Short labels for the slider marks, e.g. 1200 as '1.2k'
+def short_number(number):
+    for size, suffix in [(1e9, 'B'), (1e6, 'M'), (1e3, 'k')]:
+        if abs(number) >= size:
+            return f'{number / size:.3g}{suffix}'
+    return f'{number:g}'
+
+# The values come from the data, so the sliders get rebuilt every time the page is loaded. The marks are spread
+# out so each step between them takes in about as many games (most games have a handful of reviews, a few have
+# millions), and the slider snaps to them. The old dropdowns listed every single value, and only matched it exactly.
+def make_range_slider(dataset, column, label, slider_id):
+    stops = sorted({int(stop) for stop in dataset.range_indexes[column].stops(RANGE_SLIDER_STOPS)}) or [0]
+    return html.Div([
+        html.Label(label),
+        dcc.RangeSlider(
+            id=slider_id,
+            min=stops[0],
+            max=stops[-1],
+            step=None,  # Only the marks can be picked
+            marks={stop: short_number(stop) for stop in stops},
+            value=[stops[0], stops[-1]],  # Everything, i.e. the filter isn't used
+            allowCross=False
+        )
+    ], style={'margin-bottom': '10px'})
+
+# A slider's value as a range for the query. An end pushed all the way to the side has no limit on that side,
+# so the whole slider means the filter isn't used. Anything that isn't a [low, high] list is passed on as it is.
+def selected_range(dataset, column, value):
+    if not isinstance(value, (list, tuple)):
+        return value
+    stops = dataset.range_indexes[column].stops(RANGE_SLIDER_STOPS)
+    if len(stops) == 0:
+        return None
+    low = None if value[0] <= stops[0] else value[0]
+    high = None if value[1] >= stops[-1] else value[1]
+    return None if low is None and high is None else [low, high]
+
+# Which platforms a game has to run on. With 'Any of them' it needs one of the ticked platforms, with 'All of them'
+# every one. The old True/False dropdowns were always combined with 'or'. Each platform shows how many games
+# run on it, the counts of every combination of platforms are worked out when the data is loaded.
+def make_platform_filter(dataset):
+    return html.Div([
+        html.Label("Platforms"),
+        dcc.Checklist(
+            id='platforms-checklist',
+            options=[
+                {'label': f' {platform} ({count_platforms(dataset.platform_counts, platform_bits([platform])):,} games)', 'value': platform}
+                for platform in PLATFORMS
+            ],
+            value=[],  # Nothing ticked, the filter isn't used
+            inline=True,
+            inputStyle={'margin-left': '10px'}
+        ),
+        dcc.RadioItems(
+            id='platform-mode',
+            options=[
+                {'label': ' Any of them', 'value': 'any'},
+                {'label': ' All of them', 'value': 'all'},
+            ],
+            value='any',
+            inline=True,
+            inputStyle={'margin-left': '10px'}
+        ),
+        html.Div(id='platform-count')
+    ], style={'margin-bottom': '10px'})
+
+# How many games (of every language) the ticked platforms take in, straight from the combination counts
+def count_platform_games(selected_platforms, selected_platform_mode):
+    if not selected_platforms:
+        return ""
+    count = count_platforms(dataset_manager.current.platform_counts, platform_bits(selected_platforms), selected_platform_mode == 'all')
+    joiner = ' and ' if selected_platform_mode == 'all' else ' or '
+    return f"{count:,} games run on {joiner.join(selected_platforms)}"
 
 # Create a dropdown for selecting the percentage of positive reviews
 percentage_dropdown = html.Div([
@@ -226,42 +267,13 @@ percentage_dropdown = html.Div([
     )
 ])
 
-# Handle 'Achievement' values
-# Note: This code block doesn't filter the values to integer, meaning it isn't properly ordered and doesn't function to full capacity.
-#achievement_ranges = steam_data['Achievements'].unique()
-#achievement_ranges = sorted(achievement_ranges, reverse=False)  # Ensure it goes in descending order
-#achievement_range_dropdown = html.Div([
-#    html.Label("No. of Achievements"),
-#    dcc.Dropdown(
-#        id='achievement-range-dropdown',
-#        options=[{'label': ach, 'value': ach} for ach in achievement_ranges if ach is not None],  # Filter out None values
-#        value=None # achievement_ranges[0] if achievement_ranges and achievement_ranges[0] is not None else None  # Set default value to the first non-None value
-#    )
-#)
-
-# Handle 'Recommendations' values
-# Note: This code block doesn't filter the values to integer, meaning it isn't properly ordered and doesn't function to full capacity.
-#recommendation_ranges = steam_data['Recommendations'].unique()
-#recommendation_ranges = sorted(recommendation_ranges, reverse=False)  # Ensure it goes in descending order
-#recommendation_range_dropdown = html.Div([
-#    html.Label("No. of Recommendations"),
-#    dcc.Dropdown(
-#        id='recommendation-range-dropdown',
-#        options=[{'label': rec, 'value': rec} for rec in recommendation_ranges if rec is not None],  # Filter out None values
-#        value=None # recommendation_ranges[0] if recommendation_ranges and recommendation_ranges[0] is not None else None  # Set default value to the first non-None value
-#    )
-#])
-
 # Create a multi-select dropdown for Developers
 developers_dropdown = html.Div([
     html.Label("Select Developer/s"),
     dcc.Dropdown(
         id='developers-dropdown',
-        options=[
-            {'label': developer, 'value': developer}
-            for developer_list in steam_data['developers separated'].dropna()
-            for developer in developer_list
-        ],
+        options=[],  # Filled in by the search callback below as the user types
+        placeholder="Start typing to search...",
         multi=True,  # Allow multiple selections
         value=[],  # Set initial value to an empty list
         style=category_dropdown_style
@@ -273,11 +285,8 @@ publishers_dropdown = html.Div([
     html.Label("Select Publishers"),
     dcc.Dropdown(
         id='publishers-dropdown',
-        options=[
-            {'label': publisher, 'value': publisher}
-            for publisher_list in steam_data['publishers separated'].dropna()
-            for publisher in publisher_list
-        ],
+        options=[],  # Filled in by the search callback below as the user types
+        placeholder="Start typing to search...",
         multi=True,  # Allow multiple selections
         value=[],  # Set initial value to an empty list
         style=category_dropdown_style
@@ -289,11 +298,8 @@ categories_dropdown = html.Div([
     html.Label("Select Steam Categories"),
     dcc.Dropdown(
         id='categories-dropdown',
-        options=[
-            {'label': category, 'value': category}
-            for category_list in steam_data['categories separated'].dropna()
-            for category in category_list
-        ],
+        options=[],  # Filled in by the search callback below as the user types
+        placeholder="Start typing to search...",
         multi=True,  # Allow multiple selections
         value=[],  # Set initial value to an empty list
         style=category_dropdown_style
@@ -305,11 +311,8 @@ genres_dropdown = html.Div([
     html.Label("Select Steam Genres"),
     dcc.Dropdown(
         id='genres-dropdown',
-        options=[
-            {'label': genre, 'value': genre}
-            for genre_list in steam_data['genres separated'].dropna()
-            for genre in genre_list
-        ],
+        options=[],  # Filled in by the search callback below as the user types
+        placeholder="Start typing to search...",
         multi=True,  # Allow multiple selections
         value=[],  # Set initial value to an empty list
         style=category_dropdown_style
@@ -321,11 +324,8 @@ tags_dropdown = html.Div([
     html.Label("Select Steam Tags"),
     dcc.Dropdown(
         id='tags-dropdown',
-        options=[
-            {'label': tag, 'value': tag}
-            for tag_list in steam_data['tags separated'].dropna()
-            for tag in tag_list
-        ],
+        options=[],  # Filled in by the search callback below as the user types
+        placeholder="Start typing to search...",
         multi=True,  # Allow multiple selections
         value=[],  # Set initial value to an empty list
         style=category_dropdown_style
@@ -354,218 +354,319 @@ alert_label = html.Div([
     html.H3(id='alert_label', style={'color': 'blue'})
 ])
 
+# A search box for finding a particular game (typos and all) and seeing how it did by every success metric
+game_search = html.Div([
+    html.Label("Search for a Game"),
+    dcc.Input(
+        id='game-search',
+        type='text',
+        placeholder="Type part of a game's name...",
+        style={'width': '98%'}
+    ),
+    html.Div(id='game-search-results')
+])
+
+# What the release trend chart shows for every month or year of release
+TREND_VALUES = {
+    'count': 'Games released',
+    'mean': 'Average',
+    'sum': 'Total',
+    'max': 'Best',
+}
+
+release_trend_controls = html.Div([
+    html.Label("Release Dates"),
+    dcc.RadioItems(
+        id='trend-period',
+        options=[
+            {'label': ' By year', 'value': 'year'},
+            {'label': ' By month', 'value': 'month'},
+        ],
+        value='year',
+        inline=True,
+        inputStyle={'margin-left': '10px'}
+    ),
+    dcc.RadioItems(
+        id='trend-value',
+        options=[
+            {'label': ' Games released', 'value': 'count'},
+            {'label': ' Average of the success metric', 'value': 'mean'},
+            {'label': ' Total of the success metric', 'value': 'sum'},
+            {'label': ' Best by the success metric', 'value': 'max'},
+        ],
+        value='count',
+        inline=True,
+        inputStyle={'margin-left': '10px'}
+    ),
+])
+
 # Arrange dropdowns in two columns (excluding Success Metric)
-dropdowns_column1 = html.Div([
-    maturity_rating_dropdown,
-    price_range_dropdown,
-    percentage_dropdown,
-    #dlc_range_dropdown,
-    #positive_range_dropdown,
-    #negative_range_dropdown,
-    developers_dropdown,
-    #achievement_range_dropdown,
-], style={'width': '49%', 'display': 'inline-block'})
-
-dropdowns_column2 = html.Div([
-    categories_dropdown,
-    genres_dropdown,
-    tags_dropdown,
-    publishers_dropdown,
-    #windows_dropdown,
-    #mac_dropdown,
-    #linux_dropdown,
-], style={'width': '49%', 'display': 'inline-block'})
+def make_dropdowns_column1(dataset):
+    return html.Div([
+        maturity_rating_dropdown,
+        make_range_slider(dataset, 'Price', "Select Price Range", 'price-range-slider'),
+        percentage_dropdown,
+        make_range_slider(dataset, 'DLC count', "Select No. of DLC's", 'dlc-range-slider'),
+        make_range_slider(dataset, 'Positive', "No. of Positive Steam Ratings", 'positive-range-slider'),
+        make_range_slider(dataset, 'Negative', "No. of Negative Steam Ratings", 'negative-range-slider'),
+        developers_dropdown,
+        make_range_slider(dataset, 'Achievements', "No. of Achievements", 'achievement-range-slider'),
+        make_range_slider(dataset, 'Recommendations', "No. of Recommendations", 'recommendation-range-slider'),
+    ], style={'width': '49%', 'display': 'inline-block'})
+
+def make_dropdowns_column2(dataset):
+    return html.Div([
+        categories_dropdown,
+        genres_dropdown,
+        tags_dropdown,
+        publishers_dropdown,
+        make_platform_filter(dataset),
+    ], style={'width': '49%', 'display': 'inline-block'})
 
 dropdowns_column3 = html.Div([
     success_metric_dropdown,
 ], style={'width': '98%', 'display': 'inline-block'})
 
-# Define the layout with the language count chart and an empty top games chart
-app.layout = html.Div([
-    dcc.Graph(id='language-count-chart', figure=language_chart),
-    dropdowns_column1,
-    dropdowns_column2,
-    dropdowns_column3,
-    alert_label,
-    dcc.Graph(id='top-games-chart'),
-])
-
-@app.callback(
-    [Output('top-games-chart', 'figure'),
-     Output('alert_label', 'children')],
-    [Input('language-count-chart', 'selectedData'),
-     Input('maturity-rating-dropdown', 'value'),
-     Input('price-range-dropdown', 'value'),
-     #Input('dlc-range-dropdown', 'value'),
-     #Input('windows-dropdown', 'value'),
-     #Input('mac-dropdown', 'value'),
-     #Input('linux-dropdown', 'value'),
-     #Input('positive-range-dropdown', 'value'),
-     #Input('negative-range-dropdown', 'value'), 
-     Input('percentage-dropdown', 'value'),
-     #Input('achievement-range-dropdown', 'value'),
-     #Input('recommendation-range-dropdown', 'value'),
-     Input('developers-dropdown', 'value'),
-     Input('publishers-dropdown', 'value'),
-     Input('categories-dropdown', 'value'),
-     Input('tags-dropdown', 'value'),
-     Input('genres-dropdown', 'value'),
-     Input('success-metric-dropdown','value')]
-)
-def update_top_games_chart(selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric): # selected_dlc_count, selected_windows, selected_mac, selected_linux, selected_positive, selected_negative, selected_achievements, selected_recommendations
-    #if selected_windows is None and selected_mac is None and selected_linux is None:
-    #    return {}  # Return an empty figure if all platform options are None
-
-    if selectedData:
+# Define the layout with the language count chart and an empty top games chart.
+# It's a function so every page load gets the latest version of the data.
+def serve_layout():
+    dataset = dataset_manager.current
+    return html.Div([
+        dcc.Graph(id='language-count-chart', figure=make_language_chart(dataset)),
+        make_dropdowns_column1(dataset),
+        make_dropdowns_column2(dataset),
+        dropdowns_column3,
+        alert_label,
+        dcc.Graph(id='top-games-chart'),
+        release_trend_controls,
+        dcc.Graph(id='release-trend-chart'),
+        game_search,
+        # Whether the top games chart is showing a bar chart, if it is only the changes to it get sent
+        dcc.Store(id='top-games-chart-shown', data=False),
+        # Which page load this is, and the background job building its chart (see background_jobs.py)
+        dcc.Store(id='session-id', data=uuid.uuid4().hex),
+        dcc.Store(id='top-games-job'),
+        dcc.Interval(id='top-games-poll', interval=JOB_POLL_MS, disabled=True),
+    ])
+
+def register_option_search(app, dropdown_id, separated_column):
+    @app.callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        State(dropdown_id, 'value')
+    )
+    def update_options(search_value, selected_values):
+        # Nothing typed (this also fires right after picking an option), so keep the options as they are
+        if not search_value:
+            raise PreventUpdate
+
+        with callback_metrics.request(dropdown_id + ' search') as timer:
+            with timer.stage('prefix search') as stage:
+                matches = dataset_manager.current.option_indexes[separated_column].search(search_value, DROPDOWN_OPTION_LIMIT)
+                stage.rows_out = len(matches)
+
+        # The values already picked have to stay in the options, or the dropdown can't show them anymore
+        selected_values = [value for value in (selected_values or []) if value not in matches]
+        return [{'label': value, 'value': value} for value in selected_values + matches]
+
+# The closest matches to what's been typed in the game search, from the trigram index of the names (see steam_index.py)
+def search_games(search_text):
+    if not search_text or not search_text.strip():
+        return []
+
+    dataset = dataset_manager.current
+    with callback_metrics.request('game search') as timer:
+        timer.details = repr(search_text)
+
+        with timer.stage('trigram search') as stage:
+            rows, matches = dataset.name_index.search(search_text, GAME_SEARCH_LIMIT)
+            stage.rows_out = len(rows)
+
+        if len(rows) == 0:
+            return html.P("No games found with a name like that.")
+
+        with timer.stage('results table', len(rows)):
+            metric_values = [dataset.games[metric].to_numpy()[rows] for metric in SUCCESS_METRICS]
+            header = html.Tr([html.Th('Name'), html.Th('Match')] + [html.Th(metric) for metric in SUCCESS_METRICS])
+            result_rows = [
+                html.Tr([html.Td(name), html.Td(f'{match:.0%}')] + [html.Td('-' if np.isnan(values[i]) else f'{values[i]:,.0f}') for values in metric_values])
+                for i, (name, match) in enumerate(zip(dataset.names.take(rows), matches))
+            ]
+            return html.Table([header] + result_rows)
+
+def update_top_games_chart(selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None, chart_shown=False):
+    inputs = (selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric,
+              selected_dlc_count, selected_positive, selected_negative, selected_achievements, selected_recommendations, selected_platforms, selected_platform_mode)
+
+    # Grab the data once, so a reload finishing halfway through this request can't mix two versions
+    dataset = dataset_manager.current
+
+    # The cache is tied to the version of the data, so reloading it throws away all the old charts
+    cache_key = top_games_cache_key(*inputs)
+
+    with callback_metrics.request('top games chart') as timer:
+        timer.details = str(cache_key)
+
+        with timer.stage('cache lookup'):
+            cached_result = result_cache.get(cache_key, version=dataset.load_number)
+        if cached_result is not None:
+            timer.result = 'cache hit'
+            fig, alert_text, fig_bytes = cached_result
+        else:
+            fig, alert_text, fig_bytes = build_and_cache_top_games_chart(dataset, inputs, cache_key, timer)
+
+        return send_top_games_chart(fig, alert_text, fig_bytes, chart_shown, timer)
+
+def build_and_cache_top_games_chart(dataset, inputs, cache_key, timer):
+    fig, alert_text = build_top_games_chart(dataset, *inputs, timer=timer)
+    fig_bytes = len(pio.to_json(fig, validate=False)) if fig else 0
+    with timer.stage('cache store'):
+        result_cache.put(cache_key, (fig, alert_text, fig_bytes), version=dataset.load_number)
+    return fig, alert_text, fig_bytes
+
+# The figure, alert and whether there's a chart showing, for the three outputs of the top games callback
+def send_top_games_chart(fig, alert_text, fig_bytes, chart_shown, timer):
+    if not fig or not chart_shown:
+        if fig:
+            callback_metrics.inc(figure_bytes, ('full',), fig_bytes)
+        return fig, alert_text, bool(fig)
+
+    # The page already has a bar chart on it, so just send the new bars and title
+    with timer.stage('figure patch'):
+        patch = patch_top_games_figure(fig)
+        patch_bytes = len(pio.to_json(patch.to_plotly_json(), validate=False))
+    callback_metrics.inc(figure_bytes, ('patch',), patch_bytes)
+    callback_metrics.inc(figure_bytes_saved, amount=max(fig_bytes - patch_bytes, 0))
+    return patch, alert_text, True
+
+# The background version of update_top_games_chart. Charts in the cache are still sent straight away, anything
+# else gets handed to a background job, and the alert label says it's being worked on until poll_top_games_chart
+# picks up the result. The last two outputs are the job's id and whether the page should keep polling for it.
+def start_top_games_chart(selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None, chart_shown=False, session_id=None):
+    inputs = (selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric,
+              selected_dlc_count, selected_positive, selected_negative, selected_achievements, selected_recommendations, selected_platforms, selected_platform_mode)
+    dataset = dataset_manager.current
+    cache_key = top_games_cache_key(*inputs)
+
+    with callback_metrics.request('top games chart') as timer:
+        timer.details = str(cache_key)
+
+        with timer.stage('cache lookup'):
+            cached_result = result_cache.get(cache_key, version=dataset.load_number)
+        if cached_result is not None:
+            timer.result = 'cache hit'
+            # Whatever the session had running before isn't wanted anymore
+            background_jobs.cancel(session_id)
+            return send_top_games_chart(*cached_result, chart_shown, timer) + (None, True)
+
+        timer.result = 'queued'
+        job_id = background_jobs.submit(session_id, run_top_games_job, dataset, inputs, cache_key)
+        return dash.no_update, "Working on it...", dash.no_update, job_id, False
+
+def run_top_games_job(dataset, inputs, cache_key, progress):
+    with callback_metrics.request('top games chart job', on_stage=lambda stage: progress(f"Working on it... ({stage})")) as timer:
+        timer.details = str(cache_key)
+        try:
+            return build_and_cache_top_games_chart(dataset, inputs, cache_key, timer)
+        except JobCancelled:
+            timer.result = 'superseded'
+            raise
+
+# Checks on the page's background job, showing how far along it is until the chart is ready
+def poll_top_games_chart(n_intervals, job_id, session_id, chart_shown=False):
+    if job_id is None:
+        return dash.no_update, dash.no_update, dash.no_update, True
+
+    state, value = background_jobs.status(session_id, job_id)
+    if state == 'running':
+        return dash.no_update, value, dash.no_update, False
+    if state == 'gone':
+        return dash.no_update, dash.no_update, dash.no_update, True
+    if state == 'error':
+        return dash.no_update, "Something went wrong building the chart, please try again.", dash.no_update, True
+
+    with callback_metrics.request('top games chart poll') as timer:
+        return send_top_games_chart(*value, chart_shown, timer) + (True,)
+
+# px.bar spends most of its time checking and filling in everything about the figure (resolving the template
+# and so on), and all of that comes out the same for every top games chart, only the names, values and title
+# change. So it's run once, and every chart after that is the result with those swapped in.
+top_games_figure_base = {}
+
+def make_top_games_figure(names, values, title):
+    if not top_games_figure_base:
+        example = pd.DataFrame({'Name': ['Example'], 'success_metric': [1.0]})
+
+        # The first call also loads the parts of plotly it needs, so only the second one is timed
+        for _ in range(2):
+            start = time.perf_counter()
+            example_figure = px.bar(example, x='Name', y='success_metric', title='Example', category_orders={"Name": ['Example']}).to_plotly_json()
+        top_games_figure_base['px seconds'] = time.perf_counter() - start
+        top_games_figure_base['figure'] = example_figure
+
+    start = time.perf_counter()
+    base = top_games_figure_base['figure']
+    layout = base['layout']
+    fig = {
+        'data': [dict(base['data'][0], x=names, y=values)],
+        'layout': dict(layout, title=dict(layout['title'], text=title), xaxis=dict(layout['xaxis'], categoryarray=names)),
+    }
+    callback_metrics.inc(figure_seconds_saved, amount=max(top_games_figure_base['px seconds'] - (time.perf_counter() - start), 0))
+    return fig
+
+# The changes that turn the top games chart on the page into fig
+def patch_top_games_figure(fig):
+    patch = Patch()
+    patch['data'][0]['x'] = fig['data'][0]['x']
+    patch['data'][0]['y'] = fig['data'][0]['y']
+    patch['layout']['title']['text'] = fig['layout']['title']['text']
+    patch['layout']['xaxis']['categoryarray'] = fig['layout']['xaxis']['categoryarray']
+    return patch
+
+# The query (see query_engine.py) for what's selected on the page. None (or nothing selected) means a filter isn't used.
+def selection_query(dataset, selected_language, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, metric_column, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None):
+    return {
+        'language': selected_language,
+        'maturity_rating': selected_maturity_rating,
+        'price': selected_range(dataset, 'Price', selected_price_range),
+        'positive_percentage': selected_percentage,
+        'developers': selected_developers or [],
+        'publishers': selected_publishers or [],
+        'categories': selected_categories or [],
+        'genres': selected_genres or [],
+        'tags': selected_tags or [],
+        'dlc_count': selected_range(dataset, 'DLC count', selected_dlc_count),
+        'positive': selected_range(dataset, 'Positive', selected_positive),
+        'negative': selected_range(dataset, 'Negative', selected_negative),
+        'achievements': selected_range(dataset, 'Achievements', selected_achievements),
+        'recommendations': selected_range(dataset, 'Recommendations', selected_recommendations),
+        'platforms': selected_platforms or [],
+        'platform_mode': selected_platform_mode or 'any',
+        'metric': metric_column,
+    }
+
+# timer records how long each stage takes and how many rows go in and out of it (see request_metrics.py)
+def build_top_games_chart(dataset, selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None, timer=None):
+    timer = timer if timer is not None else RequestTimer()
+
+    if selectedData and selectedData.get('points'):
         # Extract the selected language
         selected_language = selectedData['points'][0]['x']
-        print("Selected language:", selected_language)
-
-        # Filter the DataFrame for the selected language
-        filtered_df = steam_data[steam_data['Supported languages'].str.contains(selected_language)]
-
-        # Debugging: Print some information about the filtered DataFrame
-        print("Filtered DataFrame info:")
-        print(filtered_df.info())
-
-        if selected_maturity_rating is not None:
-            filtered_df = filtered_df[filtered_df['Maturity Rating'] == selected_maturity_rating]
-
-        # Only apply the 'Price' filter if a price range is selected
-        if selected_price_range is not None:
-            filtered_df = filtered_df[filtered_df['Price'] == selected_price_range]
-
-        # Only apply the 'DLC count' filter if a dlc range is selected
-        #if selected_dlc_count is not None:
-        #    filtered_df = filtered_df[filtered_df['DLC count'] == selected_dlc_count]
-
-        # Filter the DataFrame based on the selected platforms
-        #platform_conditions = []
-
-        #if selected_windows is not None:
-        #    platform_conditions.append(filtered_df['Windows'] == selected_windows)
-        #if selected_mac is not None:
-        #    platform_conditions.append(filtered_df['Mac'] == selected_mac)
-        #if selected_linux is not None:
-        #    platform_conditions.append(filtered_df['Linux'] == selected_linux)
-
-        #if platform_conditions:
-            # Use logical OR to combine platform conditions
-        #    platform_filter = reduce(lambda x, y: x | y, platform_conditions)
-        #    filtered_df = filtered_df[platform_filter]
-
-        # Only apply the 'Positive' filter if a positive range is selected
-        #if selected_positive is not None:
-        #    filtered_df = filtered_df[filtered_df['Positive'] == selected_positive]
-
-        # Only apply the 'Negative' filter if a negative range is selected
-        #if selected_negative is not None:
-        #    filtered_df = filtered_df[filtered_df['Negative'] == selected_negative]
-
-        if selected_percentage is not None:
-            # Filter the DataFrame based on the selected percentage of positive reviews
-            min_positive_percentage = selected_percentage - 10  # Adjust the range based on the selected percentage
-            max_positive_percentage = selected_percentage
-
-            filtered_df = filtered_df[(filtered_df['Merged Reviews'] >= min_positive_percentage) & (filtered_df['Merged Reviews'] <= max_positive_percentage)]
-
-        # Only apply the 'Achievements' filter if an achievement range is selected
-        #if selected_achievements is not None:
-        #    filtered_df = filtered_df[filtered_df['Achievements'] == selected_achievements]
-
-        # Only apply the 'Recommendations' filter if a recommendation range is selected
-        #if selected_recommendations is not None:
-        #    filtered_df = filtered_df[filtered_df['Recommendations'] == selected_recommendations]
-
-        # Filter the DataFrame based on the selected developers
-        if selected_developers:
-            developer_conditions = []  # List to store individual developer conditions
-
-            for selected_developer in selected_developers:
-                developer_conditions.append(
-                    filtered_df['developers separated'].apply(
-                        lambda devs: selected_developer in devs if isinstance(devs, list) else False
-                    )
-                )
-
-            # Combine the individual developer conditions using the logical AND operator
-            if developer_conditions:
-                developer_filter = reduce(lambda x, y: x & y, developer_conditions)
-                filtered_df = filtered_df[developer_filter]
-
-        # Filter the DataFrame based on the selected publishers
-        if selected_publishers:
-            publisher_conditions = []  # List to store individual publisher conditions
-
-            for selected_publisher in selected_publishers:
-                publisher_conditions.append(
-                    filtered_df['publishers separated'].apply(
-                        lambda pubs: selected_publisher in pubs if isinstance(pubs, list) else False
-                    )
-                )
-
-            # Combine the individual publisher conditions using the logical AND operator
-            if publisher_conditions:
-                publisher_filter = reduce(lambda x, y: x & y, publisher_conditions)
-                filtered_df = filtered_df[publisher_filter]    
-
-        # Filter the DataFrame based on the selected categories
-        if selected_categories:
-            category_conditions = []  # List to store individual category conditions
-
-            for selected_category in selected_categories:
-                category_conditions.append(
-                    filtered_df['categories separated'].apply(
-                        lambda cats: selected_category in cats if isinstance(cats, list) else False
-                    )
-                )
-
-            # Combine the individual category conditions using the logical AND operator
-            if category_conditions:
-                category_filter = reduce(lambda x, y: x & y, category_conditions)
-                filtered_df = filtered_df[category_filter]
-
-        # Filter the DataFrame based on the selected Genres
-        if selected_genres:
-            genre_conditions = []  # List to store individual genre conditions
-
-            for selected_genre in selected_genres:
-                genre_conditions.append(
-                    filtered_df['genres separated'].apply(
-                        lambda gens: selected_genre in gens if isinstance(gens, list) else False
-                    )
-                )
-
-            # Combine the individual genre conditions using the logical AND operator
-            if genre_conditions:
-                genre_filter = reduce(lambda x, y: x & y, genre_conditions)
-                filtered_df = filtered_df[genre_filter]
-
-        # Filter the DataFrame based on the selected Tags
-        if selected_tags:
-            # Use apply and lambda to handle lists in the 'tags separated' column
-            filtered_df = filtered_df[filtered_df['tags separated'].apply(
-                lambda tags: any(tag in selected_tags for tag in tags) if isinstance(tags, list) else False
-            )]
-
-        # Update the 'success' metric column based on the selected metric
-        if selected_metric == 'Peak CCU':
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['Peak CCU'], errors='coerce')
-        elif selected_metric == 'Metacritic score':
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['Metacritic score'], errors='coerce')
-        elif selected_metric == 'User score':
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['User score'], errors='coerce')
-        elif selected_metric == 'Recommendations':
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['Recommendations'], errors='coerce')
-        elif selected_metric == 'Average playtime forever':
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['Average playtime forever'], errors='coerce')
-        else:
-            filtered_df['success_metric'] = pd.to_numeric(filtered_df['Median playtime forever'], errors='coerce')
 
-        # Sort the filtered DataFrame by 'Peak CCU' in descending order
-        top_15_games = filtered_df.sort_values(by='success_metric', ascending=False).head(15)
+        # The success metrics are already numbers (see steam_data.py), anything that isn't one of them
+        # falls back to 'Median playtime forever' like it always has
+        metric_column = selected_metric if selected_metric in SUCCESS_METRICS else 'Median playtime forever'
+
+        # The filtering itself happens in the query engine (see query_engine.py), the same one the
+        # /api/top-games endpoint and the command line use
+        query = selection_query(dataset, selected_language, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, metric_column,
+                                selected_dlc_count, selected_positive, selected_negative, selected_achievements, selected_recommendations, selected_platforms, selected_platform_mode)
+        top_rows, metric_values = QueryEngine(dataset, sharded_filter).top_rows(query, timer)
+
+        top_15_names = dataset.names.take(top_rows)
+        top_15_values = metric_values[top_rows]
 
-        if top_15_games.empty:
+        if len(top_rows) == 0:
             fig = {}
             alert_text = "There are no items in the dataset which match your selection."
             return fig, alert_text
@@ -575,18 +676,158 @@ def update_top_games_chart(selectedData, selected_maturity_rating, selected_pric
             return fig, alert_text
         else:
             # Create a bar plot for the top 15 games
-            fig = px.bar(
-                top_15_games,
-                x='Name',
-                y='success_metric',
-                title=f'Top 15 Games in {selected_language}',
-                category_orders={"Name": top_15_games.sort_values(by='success_metric', ascending=False)["Name"]}  # Ensure the x-axis order matches the DataFrame order
-            )
+            # (the same figure px.bar would make, x as the names and y as the success_metric, see make_top_games_figure)
+            with timer.stage('figure build'):
+                fig = make_top_games_figure(
+                    top_15_names,
+                    top_15_values,
+                    title=f'Top 15 Games in {selected_language}',
+                )  # The x-axis order matches the order of the names (they're already sorted)
             alert_text = ""
             return fig, alert_text
 
     # If nothing is selected, return an empty figure, and the alert for the user to select a language
     return {}, "Please select a language."
 
+# The release trend chart follows the same selections as the top games chart, but works without a language as well
+# (it's every game then). It's quick enough to build in the request: a trend of one language, genre or tag (or of
+# every game) is read straight off the rollups worked out when the data was loaded, and anything else only needs
+# the filters, not the top 15 (see trend in query_engine.py).
+def update_release_trend_chart(selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None, selected_period='year', selected_value='count'):
+    inputs = (selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric,
+              selected_dlc_count, selected_positive, selected_negative, selected_achievements, selected_recommendations, selected_platforms, selected_platform_mode)
+    dataset = dataset_manager.current
+    cache_key = ('release trend', selected_period, selected_value) + top_games_cache_key(*inputs)
+
+    with callback_metrics.request('release trend chart') as timer:
+        timer.details = str(cache_key)
+
+        with timer.stage('cache lookup'):
+            fig = result_cache.get(cache_key, version=dataset.load_number)
+        if fig is not None:
+            timer.result = 'cache hit'
+            return fig
+
+        fig = build_release_trend_chart(dataset, *inputs, selected_period, selected_value, timer=timer)
+        with timer.stage('cache store'):
+            result_cache.put(cache_key, fig, version=dataset.load_number)
+        return fig
+
+# A plain dict instead of px.bar, which would take longer to build it than the trend takes to work out
+def build_release_trend_chart(dataset, selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric, selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None, selected_recommendations=None, selected_platforms=None, selected_platform_mode=None, selected_period='year', selected_value='count', timer=None):
+    timer = timer if timer is not None else RequestTimer()
+    selected_language = selectedData['points'][0]['x'] if selectedData and selectedData.get('points') else None
+    metric_column = selected_metric if selected_metric in SUCCESS_METRICS else 'Median playtime forever'
+    period = selected_period if selected_period in TREND_PERIODS else 'year'
+    shown = selected_value if selected_value in TREND_VALUES else 'count'
+
+    query = selection_query(dataset, selected_language, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers, selected_publishers, selected_categories, selected_genres, selected_tags, metric_column,
+                            selected_dlc_count, selected_positive, selected_negative, selected_achievements, selected_recommendations, selected_platforms, selected_platform_mode)
+    periods, counts, sums, value_counts, maxima = QueryEngine(dataset, sharded_filter).trend(query, period, timer)
+
+    with timer.stage('figure build', len(periods)):
+        if shown == 'count':
+            values = counts.astype(np.float64)
+        elif shown == 'sum':
+            values = sums
+        elif shown == 'max':
+            values = maxima.astype(np.float64)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = sums / value_counts
+
+        # Months as '2008-10', which plotly puts on a date axis
+        if period == 'month':
+            x = [f'{month // 12}-{month % 12 + 1:02d}' for month in periods.tolist()]
+        else:
+            x = periods.tolist()
+        y = [None if np.isnan(value) else value for value in values.tolist()]
+
+        value_title = TREND_VALUES[shown] if shown == 'count' else f'{TREND_VALUES[shown]} {metric_column}'
+        title = f"{value_title} by {period} of release ({selected_language or 'every language'})"
+        if not x:
+            title = "None of the games matching your selection have a release date."
+        return {
+            'data': [{'type': 'bar', 'x': x, 'y': y}],
+            'layout': {
+                'title': {'text': title},
+                'xaxis': {'title': {'text': f'Release {period}'}},
+                'yaxis': {'title': {'text': value_title}},
+            },
+        }
+
+# Builds the Dash web application. Production servers import it through wsgi.py (see there for how the
+# worker processes share the data).
+def create_app(manager=None):
+    global dataset_manager
+    dataset_manager = manager if manager is not None else DatasetManager(DATA_PATH, poll_seconds=RELOAD_SECONDS)
+
+    # Create a Dash web application
+    app = dash.Dash(__name__)
+    app.layout = serve_layout
+    app.server.route('/cache-stats')(cache_stats)
+    app.server.route('/metrics')(metrics)
+    app.server.route('/api/top-games', methods=['POST'])(api_top_games)
+
+    for dropdown_id, separated_column in searchable_dropdowns.items():
+        register_option_search(app, dropdown_id, separated_column)
+
+    app.callback(Output('game-search-results', 'children'), Input('game-search', 'value'))(search_games)
+    app.callback(Output('platform-count', 'children'), [Input('platforms-checklist', 'value'), Input('platform-mode', 'value')])(count_platform_games)
+
+    top_games_outputs = [
+        Output('top-games-chart', 'figure'),
+        Output('alert_label', 'children'),
+        Output('top-games-chart-shown', 'data'),
+    ]
+    top_games_inputs = [
+        Input('language-count-chart', 'selectedData'),
+        Input('maturity-rating-dropdown', 'value'),
+        Input('price-range-slider', 'value'),
+        Input('percentage-dropdown', 'value'),
+        Input('developers-dropdown', 'value'),
+        Input('publishers-dropdown', 'value'),
+        Input('categories-dropdown', 'value'),
+        Input('genres-dropdown', 'value'),
+        Input('tags-dropdown', 'value'),
+        Input('success-metric-dropdown','value'),
+        Input('dlc-range-slider', 'value'),
+        Input('positive-range-slider', 'value'),
+        Input('negative-range-slider', 'value'),
+        Input('achievement-range-slider', 'value'),
+        Input('recommendation-range-slider', 'value'),
+        Input('platforms-checklist', 'value'),
+        Input('platform-mode', 'value'),
+    ]
+
+    app.callback(Output('release-trend-chart', 'figure'), top_games_inputs + [Input('trend-period', 'value'), Input('trend-value', 'value')])(update_release_trend_chart)
+
+    if BACKGROUND_WORKERS <= 0:
+        app.callback(top_games_outputs, top_games_inputs, State('top-games-chart-shown', 'data'))(update_top_games_chart)
+        return app
+
+    app.callback(
+        top_games_outputs + [Output('top-games-job', 'data'), Output('top-games-poll', 'disabled')],
+        top_games_inputs,
+        [State('top-games-chart-shown', 'data'), State('session-id', 'data')]
+    )(start_top_games_chart)
+
+    app.callback(
+        [Output(output.component_id, output.component_property, allow_duplicate=True) for output in top_games_outputs]
+        + [Output('top-games-poll', 'disabled', allow_duplicate=True)],
+        Input('top-games-poll', 'n_intervals'),
+        [State('top-games-job', 'data'), State('session-id', 'data'), State('top-games-chart-shown', 'data')],
+        prevent_initial_call=True
+    )(poll_top_games_chart)
+
+    return app
+
 if __name__ == '__main__':
+    # The development server. For more than one user at a time, run wsgi.py under gunicorn instead (see the README)
+    app = create_app()
+
+    # With debug on, Flask runs this file twice and the first copy only watches the code for changes,
+    # so only the copy that actually serves the app watches the data
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        dataset_manager.start_watching()
     app.run_server(debug=True)
\ No newline at end of file
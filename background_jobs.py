@@ -0,0 +1,211 @@
+import os
+import re
+import time
+import pickle
+import shutil
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# A running slot older than this was left behind by a process that died halfway through a job
+STALE_SLOT_SECONDS = 5 * 60
+
+# How often a job waiting for a free slot checks again
+SLOT_WAIT_SECONDS = 0.05
+
+# Session ids come from the browser, so anything that isn't a plain id gets lumped in together
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+# Raised inside a job once a newer one has been started for the same session, to stop it early
+class JobCancelled(Exception):
+    pass
+
+
+# Runs slow callbacks on a pool of background threads, so a request doesn't tie up the server while they run.
+# The page gets an id back straight away and asks for the result every so often instead (see FinalProject.py).
+#
+# Every session (one page load) only cares about its newest request, so starting a job drops the ones that
+# haven't started yet, and the ones already running stop at their next progress update. Each session also
+# only gets session_limit jobs running at once, the rest wait for a free slot.
+#
+# Everything about a job (the newest one of every session, how far along it is, its result, which slots
+# are taken) is kept in files under one folder, so it works the same whichever server process the next
+# request from the page lands on, without needing a separate queue server.
+class BackgroundJobs:
+    def __init__(self, directory, workers=4, session_limit=1, debounce_seconds=0.15, keep_seconds=10 * 60, metrics=None):
+        self.directory = directory
+        self.workers = workers
+        self.session_limit = max(session_limit, 1)
+        self.debounce_seconds = debounce_seconds
+        self.keep_seconds = keep_seconds
+        self.metrics = metrics
+        self.jobs = metrics.add_counter('steam_background_jobs_total', 'Background jobs, by how they ended.', ('result',)) if metrics else None
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _count(self, result):
+        if self.metrics is not None:
+            self.metrics.inc(self.jobs, (result,))
+
+    def _session_dir(self, session_id):
+        if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+            session_id = 'anonymous'
+        return os.path.join(self.directory, session_id)
+
+    def _write(self, path, data):
+        # Written under a name nothing else uses and then renamed, so a reader never sees half of it
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(data)
+        os.replace(temporary_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def latest(self, session_id):
+        data = self._read(os.path.join(self._session_dir(session_id), 'latest'))
+        return data.decode() if data else None
+
+    def _executor(self):
+        # Threads don't survive a fork, so a forked server worker starts its own pool
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='background-job')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    # Makes a new job id the session's newest, which drops (or stops) all of its older jobs
+    def _replace_latest(self, session_id, job_id):
+        session_dir = self._session_dir(session_id)
+        os.makedirs(session_dir, exist_ok=True)
+
+        previous = self.latest(session_id)
+        self._write(os.path.join(session_dir, 'latest'), job_id.encode())
+        if previous:
+            self._remove(os.path.join(session_dir, f'{previous}.progress'))
+            self._remove(os.path.join(session_dir, f'{previous}.result'))
+
+    # Starts function(*args, progress=...) in the background and returns the new job's id. progress(text) records
+    # how far along the job is, and raises JobCancelled once the job isn't the session's newest anymore.
+    def submit(self, session_id, function, *args):
+        job_id = uuid.uuid4().hex
+        self._replace_latest(session_id, job_id)
+        self._write(os.path.join(self._session_dir(session_id), f'{job_id}.progress'), b'Waiting to start...')
+        self._count('submitted')
+
+        self._sweep()
+        self._executor().submit(self._run, session_id, job_id, function, args)
+        return job_id
+
+    # Drops the session's jobs without starting a new one (when the request could be answered straight away)
+    def cancel(self, session_id):
+        self._replace_latest(session_id, uuid.uuid4().hex)
+
+    # Raises JobCancelled if a newer job has been started for the session
+    def check(self, session_id, job_id):
+        if self.latest(session_id) != job_id:
+            raise JobCancelled()
+
+    def _progress(self, session_id, job_id, text):
+        self.check(session_id, job_id)
+        self._write(os.path.join(self._session_dir(session_id), f'{job_id}.progress'), text.encode())
+
+    # Takes one of the session's running slots, waiting (and giving up if the job gets replaced) until one is free
+    def _acquire_slot(self, session_id, job_id):
+        session_dir = self._session_dir(session_id)
+        while True:
+            for slot in range(self.session_limit):
+                slot_path = os.path.join(session_dir, f'running.{slot}')
+                try:
+                    slot_file = os.open(slot_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(slot_path) > STALE_SLOT_SECONDS:
+                            os.remove(slot_path)
+                    except OSError:
+                        pass
+                    continue
+                os.write(slot_file, f'{os.getpid()} {job_id}'.encode())
+                os.close(slot_file)
+                return slot_path
+
+            self._progress(session_id, job_id, 'Waiting for your other requests to finish...')
+            time.sleep(SLOT_WAIT_SECONDS)
+
+    def _run(self, session_id, job_id, function, args):
+        session_dir = self._session_dir(session_id)
+        slot_path = None
+        try:
+            # Give the user a moment to finish changing things, so a burst of changes only runs the last one
+            time.sleep(self.debounce_seconds)
+            self.check(session_id, job_id)
+
+            slot_path = self._acquire_slot(session_id, job_id)
+            result = ('done', function(*args, progress=lambda text: self._progress(session_id, job_id, text)))
+        except JobCancelled:
+            self._count('superseded')
+            return
+        except Exception as error:
+            traceback.print_exc()
+            result = ('error', repr(error))
+        finally:
+            if slot_path is not None:
+                self._remove(slot_path)
+
+        # It could have been replaced right at the end, in which case nobody wants the result anymore
+        if self.latest(session_id) != job_id:
+            self._count('superseded')
+            return
+        self._write(os.path.join(session_dir, f'{job_id}.result'), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        self._remove(os.path.join(session_dir, f'{job_id}.progress'))
+        self._count(result[0])
+
+    # Returns ('done', result), ('error', description), ('running', progress text),
+    # or ('gone', None) if the job was replaced or cleaned up
+    def status(self, session_id, job_id):
+        if not isinstance(job_id, str) or not job_id.isalnum():
+            return 'gone', None
+
+        session_dir = self._session_dir(session_id)
+        data = self._read(os.path.join(session_dir, f'{job_id}.result'))
+        if data is not None:
+            return pickle.loads(data)
+
+        progress = self._read(os.path.join(session_dir, f'{job_id}.progress'))
+        if progress is not None:
+            return 'running', progress.decode()
+        return 'gone', None
+
+    # Throws away the folders of sessions that haven't started a job in a while (closed tabs and so on),
+    # at most once a minute
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+
+        try:
+            session_names = os.listdir(self.directory)
+        except OSError:
+            return
+        for session_name in session_names:
+            latest_path = os.path.join(self.directory, session_name, 'latest')
+            try:
+                if now - os.path.getmtime(latest_path) > self.keep_seconds:
+                    shutil.rmtree(os.path.join(self.directory, session_name), ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,201 @@
+import os
+import csv
+import sys
+import numpy as np
+
+# Writes a made-up games.csv with the same columns and formats as the real Kaggle file
+# (https://www.kaggle.com/datasets/fronkongames/steam-games-dataset), so the load pipeline and the
+# callbacks can be timed on any number of rows without needing the real thing.
+#
+#   python -m benchmarks.generate_games 100000 data/games.csv [seed]
+#
+# The same row count and seed always give exactly the same file.
+
+COLUMNS = [
+    'AppID', 'Name', 'Release date', 'Estimated owners', 'Peak CCU', 'Required age', 'Price', 'DLC count',
+    'About the game', 'Supported languages', 'Full audio languages', 'Reviews', 'Header image', 'Website',
+    'Support url', 'Support email', 'Windows', 'Mac', 'Linux', 'Metacritic score', 'Metacritic url',
+    'User score', 'Positive', 'Negative', 'Score rank', 'Achievements', 'Recommendations', 'Notes',
+    'Average playtime forever', 'Average playtime two weeks', 'Median playtime forever',
+    'Median playtime two weeks', 'Developers', 'Publishers', 'Categories', 'Genres', 'Tags', 'Screenshots', 'Movies',
+]
+
+LANGUAGES = [
+    'English', 'German', 'French', 'Russian', 'Simplified Chinese', 'Spanish - Spain', 'Japanese',
+    'Italian', 'Portuguese - Brazil', 'Korean', 'Polish', 'Traditional Chinese', 'Turkish',
+    'Spanish - Latin America', 'Ukrainian', 'Portuguese - Portugal', 'Dutch', 'Czech', 'Thai', 'Swedish',
+    'Hungarian', 'Danish', 'Finnish', 'Norwegian', 'Arabic', 'Romanian', 'Vietnamese', 'Indonesian',
+    'Greek', 'Bulgarian', 'English (UK)', 'Hebrew', 'Slovakian', 'Lithuanian', 'Catalan', 'Croatian',
+    'Serbian', 'Estonian', 'Latvian', 'Filipino', 'Malay', 'Persian', 'Hindi', 'Slovenian', 'Icelandic',
+    'Bangla', 'Georgian', 'Irish', 'Welsh', 'Basque', 'Afrikaans', 'Kazakh', 'Swahili', 'Urdu',
+]
+
+CATEGORIES = [
+    'Single-player', 'Steam Achievements', 'Steam Cloud', 'Full controller support', 'Multi-player',
+    'Steam Trading Cards', 'Partial Controller Support', 'Online PvP', 'PvP', 'Co-op', 'Steam Leaderboards',
+    'Online Co-op', 'Shared/Split Screen', 'Remote Play Together', 'Family Sharing', 'Stats',
+    'Remote Play on TV', 'In-App Purchases', 'Includes level editor', 'Steam Workshop', 'Captions available',
+    'Cross-Platform Multiplayer', 'LAN PvP', 'Commentary available', 'VR Support', 'MMO', 'LAN Co-op',
+    'Tracked Controller Support', 'Valve Anti-Cheat enabled', 'Includes Source SDK', 'Mods',
+]
+
+GENRES = [
+    'Indie', 'Casual', 'Action', 'Adventure', 'Simulation', 'Strategy', 'RPG', 'Early Access',
+    'Free to Play', 'Sports', 'Racing', 'Massively Multiplayer', 'Utilities', 'Design & Illustration',
+    'Violent', 'Education', 'Animation & Modeling', 'Gore', 'Nudity', 'Sexual Content',
+    'Audio Production', 'Video Production', 'Software Training', 'Game Development', 'Photo Editing',
+    'Web Publishing', 'Accounting', 'Movie', 'Documentary', 'Episodic', 'Short', 'Tutorial',
+]
+
+WORDS = [
+    'Dark', 'Lost', 'Star', 'Dungeon', 'Quest', 'Legend', 'Shadow', 'Space', 'Pixel', 'Hero', 'Dragon',
+    'City', 'Farm', 'Racer', 'Tower', 'Defense', 'Island', 'Survival', 'Zombie', 'Puzzle', 'Knight',
+    'Empire', 'Galaxy', 'Ghost', 'Forest', 'Castle', 'Robot', 'Ninja', 'Ocean', 'Sky', 'Blade', 'Magic',
+    'Frontier', 'Escape', 'Simulator', 'Tycoon', 'Arena', 'Chronicles', 'Rising', 'Odyssey', 'Horizon',
+]
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+OWNER_RANGES = ['0 - 20000', '20000 - 50000', '50000 - 100000', '100000 - 200000', '200000 - 500000', '500000 - 1000000']
+PRICES = [0.99, 1.99, 2.99, 4.99, 5.99, 7.99, 9.99, 12.99, 14.99, 19.99, 24.99, 29.99, 39.99, 49.99, 59.99]
+
+# Rows are made this many at a time, with numpy drawing all the random numbers for a block at once
+BLOCK_ROWS = 10000
+
+
+# How popular each of n values is: a few are on lots of games, most are on one or two,
+# the same shape as the developers and tags in the real data
+def popularity(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+# Picks between low and high values for every row, each value drawn from the pool with the given
+# popularity, and returns them as one list per row (without repeats)
+def pick_values(rng, pool, probabilities, rows, low, high):
+    counts = rng.integers(low, high + 1, size=rows)
+    picks = rng.choice(len(pool), size=counts.sum(), p=probabilities)
+    ends = np.cumsum(counts)
+    return [[pool[i] for i in dict.fromkeys(picks[end - count:end].tolist())] for count, end in zip(counts, ends)]
+
+
+# Mostly zero, with a long tail of games that have a lot of it (peak players, reviews, playtime...)
+def long_tail(rng, rows, share_zero, scale):
+    values = np.floor(rng.pareto(1.2, size=rows) * scale).astype(np.int64)
+    values[rng.random(rows) < share_zero] = 0
+    return values
+
+
+def generate_games_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+
+    # The real file has roughly one developer and one publisher for every two or three games,
+    # and a few hundred tags
+    developers = [f'{WORDS[i % len(WORDS)]} {WORDS[(i // len(WORDS)) % len(WORDS)]} Studio {i}' for i in range(max(rows // 3, 10))]
+    publishers = [f'{WORDS[i % len(WORDS)]} Games {i}' for i in range(max(rows // 4, 10))]
+    tags = GENRES + [f'{a} {b}' for a in WORDS[:20] for b in WORDS[20:40]][:400]
+    descriptions = [' '.join(rng.choice(WORDS, size=rng.integers(40, 200))) for _ in range(200)]
+
+    language_odds = popularity(len(LANGUAGES), 0.8)
+    developer_odds, publisher_odds = popularity(len(developers), 0.7), popularity(len(publishers), 0.7)
+    category_odds, genre_odds, tag_odds = popularity(len(CATEGORIES), 0.7), popularity(len(GENRES), 0.9), popularity(len(tags), 0.9)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(COLUMNS)
+
+        next_app_id = 10
+        for block_start in range(0, rows, BLOCK_ROWS):
+            n = min(BLOCK_ROWS, rows - block_start)
+
+            app_ids = next_app_id + np.cumsum(rng.integers(1, 20, size=n))
+            next_app_id = int(app_ids[-1])
+
+            # About 1 in 100 names is a repeat of an earlier one, which the preprocessing has to drop
+            names = [f'{WORDS[a]} {WORDS[b]} {number}' for a, b, number in zip(
+                rng.integers(0, len(WORDS), size=n), rng.integers(0, len(WORDS), size=n), rng.integers(0, rows, size=n))]
+            repeats = np.flatnonzero(rng.random(n) < 0.01)
+            for i in repeats[repeats > 0]:
+                names[i] = names[rng.integers(0, i)]
+
+            languages = pick_values(rng, LANGUAGES, language_odds, n, 1, 12)
+            audio_languages = pick_values(rng, LANGUAGES, language_odds, n, 0, 3)
+            no_languages = rng.random(n) < 0.005
+
+            game_developers = pick_values(rng, developers, developer_odds, n, 1, 2)
+            game_publishers = pick_values(rng, publishers, publisher_odds, n, 1, 2)
+            game_categories = pick_values(rng, CATEGORIES, category_odds, n, 1, 7)
+            game_genres = pick_values(rng, GENRES, genre_odds, n, 1, 4)
+            game_tags = pick_values(rng, tags, tag_odds, n, 0, 20)
+
+            free = rng.random(n) < 0.2
+            prices = np.where(free, 0.0, rng.choice(PRICES, size=n))
+            ages = rng.choice([0, 0, 0, 0, 0, 0, 0, 0, 10, 13, 16, 17, 18, 21], size=n)
+            years = rng.integers(1997, 2025, size=n)
+            days = rng.integers(1, 29, size=n)
+            months = rng.integers(0, 12, size=n)
+            has_metacritic = rng.random(n) < 0.05
+            metacritic = np.where(has_metacritic, rng.integers(30, 97, size=n), 0)
+            user_scores = np.where(rng.random(n) < 0.01, rng.integers(0, 100, size=n), 0)
+            peak_ccu = long_tail(rng, n, 0.7, 5)
+            positive = long_tail(rng, n, 0.2, 20)
+            negative = np.floor(positive * rng.random(n) * 0.5).astype(np.int64)
+            recommendations = np.where(positive > 100, positive * 2 // 3, 0)
+            achievements = np.where(rng.random(n) < 0.5, rng.integers(1, 100, size=n), 0)
+            dlc_counts = long_tail(rng, n, 0.8, 1)
+            average_playtime = long_tail(rng, n, 0.8, 60)
+            median_playtime = np.floor(average_playtime * rng.random(n)).astype(np.int64)
+            platforms = rng.random((n, 3)) < [0.999, 0.2, 0.15]
+            descriptions_picked = rng.integers(0, len(descriptions), size=n)
+
+            for i in range(n):
+                app_id = int(app_ids[i])
+                writer.writerow([
+                    app_id,
+                    names[i],
+                    f'{MONTHS[months[i]]} {days[i]}, {years[i]}',
+                    OWNER_RANGES[min(int(positive[i]) // 500, len(OWNER_RANGES) - 1)],
+                    peak_ccu[i],
+                    ages[i],
+                    f'{prices[i]:.2f}',
+                    dlc_counts[i],
+                    descriptions[descriptions_picked[i]],
+                    # The same python list literal format as the real file, e.g. "['English', 'French']"
+                    '' if no_languages[i] else str(languages[i]),
+                    str(audio_languages[i]),
+                    '',
+                    f'https://cdn.akamai.steamstatic.com/steam/apps/{app_id}/header.jpg',
+                    '',
+                    '',
+                    '',
+                    *['True' if supported else 'False' for supported in platforms[i]],
+                    metacritic[i],
+                    f'https://www.metacritic.com/game/pc/{app_id}' if has_metacritic[i] else '',
+                    user_scores[i],
+                    positive[i],
+                    negative[i],
+                    '',
+                    achievements[i],
+                    recommendations[i],
+                    '',
+                    average_playtime[i],
+                    0,
+                    median_playtime[i],
+                    0,
+                    ','.join(game_developers[i]),
+                    ','.join(game_publishers[i]),
+                    ','.join(game_categories[i]),
+                    ','.join(game_genres[i]),
+                    ','.join(game_tags[i]),
+                    f'https://cdn.akamai.steamstatic.com/steam/apps/{app_id}/ss_1.jpg,https://cdn.akamai.steamstatic.com/steam/apps/{app_id}/ss_2.jpg',
+                    f'http://cdn.akamai.steamstatic.com/steam/apps/{app_id}/movie_max.mp4',
+                ])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('usage: python -m benchmarks.generate_games ROWS OUTPUT_CSV [SEED]')
+    generate_games_csv(sys.argv[2], int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,532 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import requests
+from benchmarks.generate_games import generate_games_csv
+from benchmarks.run_benchmarks import percentiles
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Starts the dashboard on a local port and has a number of made-up analysts use it at once, through the same
+# /_dash-update-component requests the page sends: load the page, click a language, change a few of the
+# filters (typing into the searchable dropdowns first), switch the metric a couple of times, then start over.
+# Each change waits for its chart like the page does, polling for it when it's built in the background, and
+# asks for the release trend chart as well.
+#
+#   python -m benchmarks.load_test --users 1 10 50                       (Flask's own server, the project's data)
+#   python -m benchmarks.load_test --server gunicorn --workers 4 --users 10 50 100 --rows 100000
+#   python -m benchmarks.load_test --url http://some-server:8050 --users 25
+#
+# Every number of users runs for --duration seconds, one after the other against the same server, and gets
+# its throughput, latency percentiles and error rate reported, along with the server's memory over time.
+# Where the throughput stops going up with more users is where that way of running the server is saturated.
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How often the page asks for a chart being built in the background (JOB_POLL_MS in FinalProject.py)
+POLL_SECONDS = 0.2
+
+# Longer than this for one chart counts as an error
+CHART_TIMEOUT_SECONDS = 60
+
+# How long the server gets to start (building the snapshot from a big csv the first time can take a while)
+START_TIMEOUT_SECONDS = 600
+
+# The filters an analyst changes after picking a language, a few of them each time
+FILTER_CHANGES = ['maturity', 'price', 'percentage', 'genres', 'tags', 'range', 'platforms']
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+# The command (and extra environment variables) that starts each kind of server on the port
+def server_command(server, port, workers):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-c', os.path.join(PROJECT_DIR, 'gunicorn.conf.py')], \
+            {'STEAM_BIND': f'127.0.0.1:{port}', 'STEAM_WORKERS': str(workers)}
+    if server == 'waitress':
+        return [sys.executable, '-m', 'waitress', f'--listen=127.0.0.1:{port}', f'--threads={workers}', 'wsgi:server'], {}
+    # Flask's own server handles one request at a time, the same as running FinalProject.py (without the debugger)
+    return [sys.executable, '-c', f"import wsgi; wsgi.server.run('127.0.0.1', {port}, threaded=False)"], {}
+
+
+# The dashboard running in its own process(es). It's started in work_dir, so it serves (and keeps its snapshot
+# and jobs in) work_dir/data.
+class LocalServer:
+    def __init__(self, server, workers, work_dir, settings):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.work_dir = work_dir
+        self.log_path = os.path.join(tempfile.gettempdir(), f'steam-load-test-{self.port}.log')
+
+        command, env = server_command(server, self.port, workers)
+        env = dict(os.environ, **env, **settings)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [PROJECT_DIR, env.get('PYTHONPATH')]))
+        self.log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_until_ready(self, timeout=START_TIMEOUT_SECONDS):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"The server stopped while starting, see {self.log_path}:\n{self.log_tail()}")
+            try:
+                if requests.get(self.url + '/_dash-layout', timeout=5).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"The server didn't start within {timeout} seconds, see {self.log_path}")
+
+    def log_tail(self, lines=20):
+        with open(self.log_path) as log:
+            return ''.join(log.readlines()[-lines:])
+
+    # Resident memory of the server and everything it started (workers, filter processes...) in MB. The
+    # memory-mapped snapshot is shared between them but counted in every one, so this is on the high side.
+    def rss_mb(self):
+        if psutil is None:
+            return None
+        try:
+            process = psutil.Process(self.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return None
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+# The first component in the layout with the id
+def find_component(layout, component_id):
+    if isinstance(layout, list):
+        for child in layout:
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+        return None
+    if not isinstance(layout, dict):
+        return None
+
+    props = layout.get('props', {})
+    if props.get('id') == component_id:
+        return props
+    return find_component(props.get('children'), component_id)
+
+
+# The (id, property) of every output of a callback. Several outputs come as '..a.b...c.d..', and an output
+# shared with another callback has '@' and a hash after its property.
+def callback_outputs(dependency):
+    outputs = []
+    for output in dependency['output'].strip('.').split('...'):
+        component_id, component_property = output.rsplit('.', 1)
+        outputs.append({'id': component_id, 'property': component_property.split('@')[0]})
+    return outputs
+
+
+# One browser tab: loads the page, then calls its callbacks the way the page does
+class DashClient:
+    def __init__(self, url):
+        self.url = url
+        self.session = requests.Session()
+        self.layout = None
+        self.callbacks = None
+
+    def load_page(self):
+        for path in ['/', '/_dash-layout', '/_dash-dependencies']:
+            response = self.session.get(self.url + path, timeout=CHART_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            if path == '/_dash-layout':
+                self.layout = response.json()
+            elif path == '/_dash-dependencies':
+                self.callbacks = response.json()
+
+    # The callback triggered by the property, or None if there isn't one
+    def find_callback(self, input_id, input_property):
+        for callback in self.callbacks:
+            if {'id': input_id, 'property': input_property} in callback['inputs']:
+                return callback
+        return None
+
+    # The callback that sends the property, or None if there isn't one
+    def find_output_callback(self, output_id, output_property):
+        for callback in self.callbacks:
+            if {'id': output_id, 'property': output_property} in callback_outputs(callback):
+                return callback
+        return None
+
+    # The value of every input (or state) of a callback, from values ('id.property' -> value), falling back to the layout
+    def values(self, items, values):
+        result = []
+        for item in items:
+            key = f"{item['id']}.{item['property']}"
+            value = values[key] if key in values else (find_component(self.layout, item['id']) or {}).get(item['property'])
+            result.append({'id': item['id'], 'property': item['property'], 'value': value})
+        return result
+
+    # Returns the HTTP status and the new values of the outputs ({id: {property: value}}, empty for a 204)
+    def call(self, callback, values, changed):
+        outputs = callback_outputs(callback)
+        body = {
+            'output': callback['output'],
+            'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+            'inputs': self.values(callback['inputs'], values),
+            'state': self.values(callback['state'], values),
+            'changedPropIds': changed,
+        }
+        response = self.session.post(self.url + '/_dash-update-component', json=body, timeout=CHART_TIMEOUT_SECONDS)
+        if response.status_code != 200:
+            return response.status_code, {}
+        return 200, response.json().get('response', {})
+
+
+# Everything measured at one number of users, added to from every analyst's thread
+class LevelResults:
+    def __init__(self, users):
+        self.users = users
+        self.lock = threading.Lock()
+        self.request_seconds = []
+        self.chart_seconds = []
+        self.page_seconds = []
+        self.errors = 0
+        self.error_examples = []
+
+    def add(self, kind, seconds):
+        with self.lock:
+            getattr(self, f'{kind}_seconds').append(seconds)
+
+    def error(self, description):
+        with self.lock:
+            self.errors += 1
+            if len(self.error_examples) < 5:
+                self.error_examples.append(description)
+
+    def summary(self, seconds):
+        requests_done = len(self.request_seconds)
+        return {
+            'users': self.users,
+            'seconds': seconds,
+            'requests': requests_done,
+            'requests_per_second': requests_done / seconds,
+            'charts': len(self.chart_seconds),
+            'charts_per_second': len(self.chart_seconds) / seconds,
+            'chart_latency': percentiles(self.chart_seconds) if self.chart_seconds else None,
+            'request_latency': percentiles(self.request_seconds) if self.request_seconds else None,
+            'page_load_latency': percentiles(self.page_seconds) if self.page_seconds else None,
+            'errors': self.errors,
+            'error_rate': self.errors / max(requests_done + self.errors, 1),
+            'error_examples': self.error_examples,
+        }
+
+
+# One made-up analyst, going through sessions on the dashboard until stop_at
+class Analyst:
+    def __init__(self, url, think_seconds, results, seed):
+        self.client = DashClient(url)
+        self.think_seconds = think_seconds
+        self.results = results
+        self.random = random.Random(seed)
+
+    def think(self, stop_at):
+        time.sleep(min(self.think_seconds * self.random.uniform(0.5, 1.5), max(stop_at - time.time(), 0)))
+
+    def request(self, callback, values, changed):
+        start = time.perf_counter()
+        try:
+            status, response = self.client.call(callback, values, changed)
+        except requests.RequestException as error:
+            self.results.error(f"{changed}: {type(error).__name__}")
+            return None
+        if status not in (200, 204):
+            self.results.error(f"{changed}: HTTP {status}")
+            return None
+        self.results.add('request', time.perf_counter() - start)
+        return response
+
+    # Changes one of the top games inputs and waits for its chart (or its alert), polling like the page does
+    # when it gets built in the background
+    def update_chart(self, values, changed):
+        # The page asks for the release trend chart with the same change too
+        if self.trend_callback is not None:
+            self.request(self.trend_callback, values, [changed])
+
+        start = time.perf_counter()
+        response = self.request(self.chart_callback, values, [changed])
+        while response is not None:
+            for component_id, props in response.items():
+                for component_property, value in props.items():
+                    values[f'{component_id}.{component_property}'] = value
+
+            alert = response.get('alert_label', {}).get('children')
+            if isinstance(alert, str) and alert.startswith("Something went wrong"):
+                self.results.error(f"{changed}: {alert}")
+                return
+            # Without background jobs (STEAM_BACKGROUND_WORKERS=0) the chart always comes straight back
+            if self.poll_callback is None or values.get('top-games-poll.disabled', True) or values.get('top-games-job.data') is None:
+                self.results.add('chart', time.perf_counter() - start)
+                return
+            if time.perf_counter() - start > CHART_TIMEOUT_SECONDS:
+                self.results.error(f"{changed}: no chart after {CHART_TIMEOUT_SECONDS} seconds")
+                return
+
+            time.sleep(POLL_SECONDS)
+            values['top-games-poll.n_intervals'] = (values.get('top-games-poll.n_intervals') or 0) + 1
+            response = self.request(self.poll_callback, values, ['top-games-poll.n_intervals'])
+
+    # Types a letter into a searchable dropdown and picks from what comes back, like the page's searches
+    def search_options(self, dropdown_id, values, count):
+        values[f'{dropdown_id}.search_value'] = self.random.choice('abcdeghilmnoprst')
+        response = self.request(self.client.find_callback(dropdown_id, 'search_value'), values, [f'{dropdown_id}.search_value'])
+        options = (response or {}).get(dropdown_id, {}).get('options') or []
+        values[f'{dropdown_id}.search_value'] = ''
+        return [option['value'] for option in self.random.sample(options, min(count, len(options)))]
+
+    def slider_range(self, slider_id):
+        slider = find_component(self.client.layout, slider_id)
+        marks = sorted(float(mark) for mark in slider['marks'])
+        low, high = sorted(self.random.sample(range(len(marks)), 2)) if len(marks) > 1 else (0, 0)
+        return [marks[low], marks[high]]
+
+    # Picks a new value for one of the filters
+    def change_filter(self, change, values):
+        layout = self.client.layout
+        if change == 'maturity':
+            values['maturity-rating-dropdown.value'] = self.random.choice(find_component(layout, 'maturity-rating-dropdown')['options'])['value']
+            return 'maturity-rating-dropdown.value'
+        if change == 'price':
+            values['price-range-slider.value'] = self.slider_range('price-range-slider')
+            return 'price-range-slider.value'
+        if change == 'percentage':
+            values['percentage-dropdown.value'] = self.random.choice(find_component(layout, 'percentage-dropdown')['options'])['value']
+            return 'percentage-dropdown.value'
+        if change in ('genres', 'tags'):
+            dropdown_id = f'{change}-dropdown'
+            values[f'{dropdown_id}.value'] = self.search_options(dropdown_id, values, self.random.randint(1, 2))
+            return f'{dropdown_id}.value'
+        if change == 'range':
+            slider_id = self.random.choice(['dlc-range-slider', 'positive-range-slider', 'negative-range-slider',
+                                            'achievement-range-slider', 'recommendation-range-slider'])
+            values[f'{slider_id}.value'] = self.slider_range(slider_id)
+            return f'{slider_id}.value'
+        platforms = [option['value'] for option in find_component(layout, 'platforms-checklist')['options']]
+        values['platforms-checklist.value'] = self.random.sample(platforms, self.random.randint(1, len(platforms)))
+        return 'platforms-checklist.value'
+
+    # Load the page, pick a language, change a few filters, switch the metric once or twice
+    def session(self, stop_at):
+        start = time.perf_counter()
+        try:
+            self.client.load_page()
+        except requests.RequestException as error:
+            self.results.error(f"page load: {type(error).__name__}")
+            self.think(stop_at)
+            return
+        self.results.add('page', time.perf_counter() - start)
+
+        # The top games chart is found by what it sends, since the release trend chart takes the same inputs: the
+        # callback handing out its background job, or (without background jobs) the one sending the chart itself
+        self.chart_callback = self.client.find_output_callback('top-games-job', 'data') \
+            or self.client.find_output_callback('top-games-chart', 'figure')
+        self.poll_callback = self.client.find_callback('top-games-poll', 'n_intervals')
+        self.trend_callback = self.client.find_output_callback('release-trend-chart', 'figure')
+        values = {}
+
+        # The page calls every callback once as it loads, before a language has been picked
+        self.update_chart(values, 'language-count-chart.selectedData')
+
+        languages = find_component(self.client.layout, 'language-count-chart')['figure']['data'][0]['x']
+        metrics = [option['value'] for option in find_component(self.client.layout, 'success-metric-dropdown')['options']]
+        changes = ['language'] + self.random.sample(FILTER_CHANGES, self.random.randint(1, 3)) + ['metric'] * self.random.randint(1, 2)
+
+        for change in changes:
+            self.think(stop_at)
+            if time.time() >= stop_at:
+                return
+            if change == 'language':
+                # Most people go for one of the big languages
+                language = self.random.choice(languages[:10] if self.random.random() < 0.8 else languages)
+                values['language-count-chart.selectedData'] = {'points': [{'x': language}]}
+                changed = 'language-count-chart.selectedData'
+            elif change == 'metric':
+                values['success-metric-dropdown.value'] = self.random.choice(metrics)
+                changed = 'success-metric-dropdown.value'
+            else:
+                changed = self.change_filter(change, values)
+            self.update_chart(values, changed)
+
+    def run(self, stop_at):
+        while time.time() < stop_at:
+            self.session(stop_at)
+
+
+# Samples the server's memory every interval seconds until stopped, as (seconds since start, users, MB)
+class MemorySampler(threading.Thread):
+    def __init__(self, server, interval):
+        super().__init__(daemon=True)
+        self.server = server
+        self.interval = interval
+        self.users = 0
+        self.samples = []
+        self.stopped = threading.Event()
+        self.start_time = time.time()
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss_mb = self.server.rss_mb()
+            if rss_mb is not None:
+                self.samples.append((round(time.time() - self.start_time, 1), self.users, round(rss_mb, 1)))
+            self.stopped.wait(self.interval)
+
+
+def run_level(url, users, duration, think_seconds, seed):
+    results = LevelResults(users)
+    stop_at = time.time() + duration
+    analysts = [Analyst(url, think_seconds, results, seed * 1000 + i) for i in range(users)]
+    threads = [threading.Thread(target=analyst.run, args=(stop_at,), daemon=True) for analyst in analysts]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.summary(time.time() - start)
+
+
+def format_latency(latency):
+    if latency is None:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    return f"{latency['p50']:8.0f} {latency['p95']:8.0f} {latency['p99']:8.0f}"
+
+
+def print_report(levels, memory_samples):
+    print(f"\n{'users':>6} {'charts/s':>9} {'requests/s':>11}   {'chart ms':^26}   {'request ms':^26} {'errors':>8}")
+    print(f"{'':>6} {'':>9} {'':>11}   {'p50':>8} {'p95':>8} {'p99':>8}   {'p50':>8} {'p95':>8} {'p99':>8}")
+    for level in levels:
+        print(f"{level['users']:6d} {level['charts_per_second']:9.2f} {level['requests_per_second']:11.2f}   "
+              f"{format_latency(level['chart_latency'])}   {format_latency(level['request_latency'])} {level['error_rate']:7.1%}")
+        for example in level['error_examples']:
+            print(f"{'':>8}e.g. {example}")
+
+    if memory_samples:
+        print("\nServer memory (resident, the server and every process it started)")
+        step = max(len(memory_samples) // 20, 1)
+        for seconds, users, rss_mb in memory_samples[::step] + ([memory_samples[-1]] if (len(memory_samples) - 1) % step else []):
+            print(f"  {seconds:7.1f} s  {users:4d} users  {rss_mb:8.0f} MB")
+
+    # Where adding users stopped adding (much) throughput
+    for previous, level in zip(levels, levels[1:]):
+        if level['charts_per_second'] < previous['charts_per_second'] * 1.1:
+            print(f"\nThroughput stopped growing between {previous['users']} and {level['users']} users "
+                  f"({previous['charts_per_second']:.2f} -> {level['charts_per_second']:.2f} charts/s)")
+            break
+
+
+# A folder to run the server in, with the generated csv as its data/games.csv
+def make_work_dir(rows, seed, data_dir):
+    csv_path = os.path.join(data_dir, f'games-{rows}-{seed}.csv')
+    if not os.path.exists(csv_path):
+        print(f"Generating {rows} games into {csv_path}")
+        os.makedirs(data_dir, exist_ok=True)
+        generate_games_csv(csv_path + '.tmp', rows, seed)
+        os.replace(csv_path + '.tmp', csv_path)
+
+    work_dir = tempfile.mkdtemp(prefix='steam-load-test-')
+    os.makedirs(os.path.join(work_dir, 'data'))
+    try:
+        os.symlink(csv_path, os.path.join(work_dir, 'data', 'games.csv'))
+    except OSError:
+        # Symlinks need extra permissions on Windows
+        shutil.copyfile(csv_path, os.path.join(work_dir, 'data', 'games.csv'))
+    return work_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the dashboard with a number of made-up analysts using it at once")
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 10, 50], help="how many analysts at once, one run for each")
+    parser.add_argument('--duration', type=float, default=30, help="how long (in seconds) each number of users runs for")
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help="how long (in seconds) an analyst waits between changes on average, 0 for as fast as possible")
+    parser.add_argument('--server', choices=['flask', 'gunicorn', 'waitress'], default='flask', help="how to run the dashboard")
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn worker processes, or waitress threads")
+    parser.add_argument('--setting', action='append', default=[], metavar='NAME=VALUE',
+                        help="a setting for the server (e.g. STEAM_BACKGROUND_WORKERS=0), can be given more than once")
+    parser.add_argument('--url', help="load test a server that's already running here instead of starting one")
+    parser.add_argument('--rows', type=int, help="serve a made-up csv with this many games instead of data/games.csv")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the made-up csv and the analysts")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'steam-benchmark-data'),
+                        help="where the generated csvs are kept between runs")
+    parser.add_argument('--memory-interval', type=float, default=1.0, help="how often (in seconds) to check the server's memory")
+    parser.add_argument('--output', help="also write the results to this json file")
+    args = parser.parse_args(argv)
+
+    server = None
+    work_dir = None
+    sampler = None
+    levels = []
+    try:
+        if args.url:
+            url = args.url.rstrip('/')
+        else:
+            work_dir = make_work_dir(args.rows, args.seed, args.data_dir) if args.rows else None
+            settings = dict(setting.split('=', 1) for setting in args.setting)
+            server = LocalServer(args.server, args.workers, work_dir or PROJECT_DIR, settings)
+            print(f"Starting the {args.server} server on {server.url} (its output goes to {server.log_path})")
+            server.wait_until_ready()
+            url = server.url
+
+            sampler = MemorySampler(server, args.memory_interval)
+            sampler.start()
+
+        for users in args.users:
+            print(f"{users} users for {args.duration:g} seconds")
+            if sampler is not None:
+                sampler.users = users
+            levels.append(run_level(url, users, args.duration, args.think_time, args.seed))
+    finally:
+        if sampler is not None:
+            sampler.stopped.set()
+            sampler.join()
+        if server is not None:
+            server.stop()
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    memory_samples = sampler.samples if sampler is not None else []
+    print_report(levels, memory_samples)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'server': args.url or args.server, 'levels': levels, 'memory': memory_samples}, output_file, indent=2)
+
+    return 1 if any(level['errors'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+from benchmarks.generate_games import generate_games_csv
+from steam_data import SUCCESS_METRICS, load_steam_data, resident_memory_mb
+
+# Times loading the data and a fixed set of top games chart selections on made-up csvs of different sizes,
+# and compares the results against a stored baseline, so slowdowns get noticed before they ship.
+#
+#   python -m benchmarks.run_benchmarks --rows 10000 100000                 (run and compare)
+#   python -m benchmarks.run_benchmarks --rows 10000 100000 --save-baseline (run and store as the new baseline)
+#
+# It exits with status 1 if anything got slower or bigger than the baseline by more than the tolerance.
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Differences smaller than this are noise, however big they are as a percentage
+MIN_REGRESSION_MS = 2.0
+MIN_REGRESSION_MB = 5.0
+
+
+def percentiles(seconds):
+    milliseconds = np.asarray(seconds) * 1000
+    return {
+        'p50': float(np.percentile(milliseconds, 50)),
+        'p95': float(np.percentile(milliseconds, 95)),
+        'p99': float(np.percentile(milliseconds, 99)),
+        'runs': len(milliseconds),
+    }
+
+
+# Runs the function with tracemalloc on, and returns the most memory (in MB) it had allocated at once
+def peak_memory_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+# Loading prints progress, which would just get in the way of the report
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+# Times every stage of load_steam_data, building the snapshot from the csv ('cold') and loading it back ('warm')
+def time_startup(csv_path, work_dir, repeat):
+    stage_times = {}
+    for i in range(repeat):
+        snapshot_dir = os.path.join(work_dir, f'snapshot-{i}')
+        for kind in ['cold', 'warm']:
+            timings = {}
+            start = time.perf_counter()
+            quietly(load_steam_data, csv_path, snapshot_dir, timings=timings)
+            timings['total'] = time.perf_counter() - start
+
+            for stage, seconds in timings.items():
+                stage_times.setdefault(f'{kind}: {stage}', []).append(seconds)
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    return {stage: percentiles(seconds) for stage, seconds in stage_times.items()}
+
+
+# The fixed set of selections the chart callback gets timed on. The values come from the data itself
+# (the most and least common language, the most common developer...) so they match something at every size.
+def callback_cases(dataset):
+    languages = dataset.language_counts['Language'].tolist()
+    common, rare = languages[0], languages[-1]
+    price = int(dataset.games['Price'].value_counts().index[0])
+
+    def most_common(separated_column, count=1):
+        return dataset.option_indexes[separated_column].search('', count)
+
+    def case(language, maturity=None, price=None, percentage=None, developers=(), publishers=(), categories=(),
+             genres=(), tags=(), metric='Peak CCU'):
+        return ({'points': [{'x': language}]}, maturity, price, percentage, list(developers), list(publishers),
+                list(categories), list(genres), list(tags), metric)
+
+    cases = {
+        'no language': (None, None, None, None, [], [], [], [], [], 'Peak CCU'),
+        'common language': case(common),
+        'rare language': case(rare),
+        'maturity and price': case(common, maturity='G', price=price),
+        'positive percentage': case(common, percentage=80),
+        'developer': case(common, developers=most_common('developers separated')),
+        'publisher': case(common, publishers=most_common('publishers separated')),
+        'two categories': case(common, categories=most_common('categories separated', 2)),
+        'two genres and three tags': case(common, genres=most_common('genres separated', 2), tags=most_common('tags separated', 3)),
+        'everything': case(common, 'G', price, 80, most_common('developers separated'), most_common('publishers separated'),
+                           most_common('categories separated'), most_common('genres separated'), most_common('tags separated', 3)),
+        'nothing matches': case(rare, developers=most_common('developers separated', 3), categories=most_common('categories separated', 5)),
+    }
+    for metric in SUCCESS_METRICS:
+        cases[f'metric: {metric}'] = case(common, metric=metric)
+    return cases
+
+
+# Times building the chart (the cache is skipped, so every run does the full work)
+def time_callbacks(dataset, iterations):
+    from FinalProject import build_top_games_chart
+
+    results = {}
+    all_seconds = []
+    for name, inputs in callback_cases(dataset).items():
+        quietly(build_top_games_chart, dataset, *inputs)  # warm up
+        seconds = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            quietly(build_top_games_chart, dataset, *inputs)
+            seconds.append(time.perf_counter() - start)
+        results[name] = percentiles(seconds)
+        all_seconds.extend(seconds)
+
+    results['all cases'] = percentiles(all_seconds)
+    return results
+
+
+def run_size(rows, seed, repeat, iterations, data_dir):
+    csv_path = os.path.join(data_dir, f'games-{rows}-{seed}.csv')
+    if not os.path.exists(csv_path):
+        print(f"Generating {rows} games into {csv_path}")
+        generate_games_csv(csv_path + '.tmp', rows, seed)
+        os.replace(csv_path + '.tmp', csv_path)
+
+    work_dir = tempfile.mkdtemp(prefix='steam-benchmark-')
+    try:
+        print(f"Timing startup on {rows} rows")
+        stages = time_startup(csv_path, work_dir, repeat)
+
+        snapshot_dir = os.path.join(work_dir, 'snapshot')
+        memory = {
+            'cold load': peak_memory_mb(lambda: quietly(load_steam_data, csv_path, snapshot_dir)),
+            'warm load': peak_memory_mb(lambda: quietly(load_steam_data, csv_path, snapshot_dir)),
+        }
+
+        print(f"Timing {iterations} runs of every callback case on {rows} rows")
+        dataset = quietly(load_steam_data, csv_path, snapshot_dir)
+        callbacks = time_callbacks(dataset, iterations)
+        memory['callbacks'] = peak_memory_mb(lambda: time_callbacks(dataset, 1))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {'stages': stages, 'callbacks': callbacks, 'peak_memory_mb': memory}
+
+
+# Everything that got slower (p50) or bigger than the baseline by more than the tolerance
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for rows, result in results['sizes'].items():
+        baseline_result = baseline.get('sizes', {}).get(rows)
+        if baseline_result is None:
+            continue
+
+        for section in ['stages', 'callbacks']:
+            for name, timing in result[section].items():
+                old = baseline_result[section].get(name)
+                if old and timing['p50'] > old['p50'] * (1 + tolerance) and timing['p50'] - old['p50'] > MIN_REGRESSION_MS:
+                    regressions.append(f"{rows} rows, {name}: p50 {old['p50']:.1f} ms -> {timing['p50']:.1f} ms")
+
+        for name, peak in result['peak_memory_mb'].items():
+            old = baseline_result['peak_memory_mb'].get(name)
+            if old and peak > old * (1 + tolerance) and peak - old > MIN_REGRESSION_MB:
+                regressions.append(f"{rows} rows, {name}: peak memory {old:.1f} MB -> {peak:.1f} MB")
+
+    return regressions
+
+
+def print_report(results, baseline):
+    for rows, result in results['sizes'].items():
+        baseline_result = baseline.get('sizes', {}).get(rows, {}) if baseline else {}
+        print(f"\n{rows} rows")
+        print(f"  {'':45} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'baseline p50':>13}")
+        for section in ['stages', 'callbacks']:
+            for name, timing in result[section].items():
+                old = baseline_result.get(section, {}).get(name)
+                old_text = f"{old['p50']:.2f}" if old else '-'
+                print(f"  {name:45} {timing['p50']:10.2f} {timing['p95']:10.2f} {timing['p99']:10.2f} {old_text:>13}")
+        for name, peak in result['peak_memory_mb'].items():
+            old = baseline_result.get('peak_memory_mb', {}).get(name)
+            old_text = f"{old:.1f}" if old else '-'
+            print(f"  peak memory, {name:32} {peak:10.1f} MB {'':21} {old_text:>10}")
+
+    if results['max_rss_mb'] is not None:
+        print(f"\nResident memory at the end: {results['max_rss_mb']:.0f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading the Steam data and building the top games chart")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help="row counts of the generated csvs")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the generated csvs")
+    parser.add_argument('--repeat', type=int, default=3, help="how many times to time startup")
+    parser.add_argument('--iterations', type=int, default=30, help="how many times to time each callback case")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'steam-benchmark-data'),
+                        help="where the generated csvs are kept between runs")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="the stored results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="how much slower (0.25 = 25%%) counts as a regression")
+    parser.add_argument('--output', help="also write the results to this json file")
+    args = parser.parse_args(argv)
+
+    results = {
+        'sizes': {str(rows): run_size(rows, args.seed, args.repeat, args.iterations, args.data_dir) for rows in args.rows},
+        'max_rss_mb': resident_memory_mb(),
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline} to compare against, run with --save-baseline to store one")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the baseline:")
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
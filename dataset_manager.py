@@ -0,0 +1,126 @@
+import os
+import atexit
+import threading
+import time
+import traceback
+from steam_data import DATA_PATH, SNAPSHOT_DIR, csv_fingerprint, load_steam_data, snapshot_paths
+
+# A rebuild lock older than this was left behind by a process that died halfway through one
+STALE_LOCK_SECONDS = 15 * 60
+
+
+# Holds the dataset the dashboard is currently using, and swaps in a new one when games.csv changes.
+# The rebuild happens in a background thread while the old dataset keeps serving, and the swap is a
+# single assignment, so a callback that grabbed 'current' at its start keeps a consistent version
+# for the whole request, even if a reload finishes halfway through it.
+# A reload isn't incremental: the whole csv is read and hashed again, and the indexes, cube, leaderboards,
+# name index, range indexes and rollups are all built again from every game. Only the cleaning up of each
+# game is skipped for the ones that haven't changed (see preprocess_steam_data), so it takes about as long
+# as starting up with a new csv.
+# When there are several server processes each one has its own manager, but only one of them rebuilds
+# the snapshot at a time, the rest wait for it and then just memory-map what it wrote.
+class DatasetManager:
+    def __init__(self, csv_path=DATA_PATH, snapshot_dir=SNAPSHOT_DIR, poll_seconds=30):
+        self.csv_path = csv_path
+        self.snapshot_dir = snapshot_dir
+        self.poll_seconds = poll_seconds
+        # Shown on /metrics: how many new versions this process swapped in, and whether the last reload failed (and why)
+        self.reloads = 0
+        self.last_error = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+
+        self._seen_file = csv_fingerprint(csv_path, with_hash=False)
+        self.current = load_steam_data(csv_path, snapshot_dir)
+
+    # Takes the lock file shared by every process using the same snapshot folder, returns False if
+    # another process has it
+    def _acquire_rebuild_lock(self):
+        lock_path = snapshot_paths(self.snapshot_dir)['lock']
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        try:
+            lock_file = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return False
+
+        os.write(lock_file, str(os.getpid()).encode())
+        os.close(lock_file)
+        return True
+
+    def _release_rebuild_lock(self):
+        try:
+            os.remove(snapshot_paths(self.snapshot_dir)['lock'])
+        except OSError:
+            pass
+
+    # Returns True if a new version was swapped in, False if the data hadn't changed,
+    # and None if another process is busy rebuilding it (try again later)
+    def reload(self):
+        # Only one rebuild at a time, a second request while one is running just waits for it
+        with self._reload_lock:
+            if not self._acquire_rebuild_lock():
+                return None
+            try:
+                start = time.perf_counter()
+                new_dataset = load_steam_data(self.csv_path, self.snapshot_dir, previous=self.current)
+            finally:
+                self._release_rebuild_lock()
+
+            if new_dataset.version == self.current.version:
+                return False
+
+            self.current = new_dataset
+            self.reloads += 1
+            print(f"Swapped in the new version of {self.csv_path} ({time.perf_counter() - start:.1f}s)")
+        return True
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                current_file = csv_fingerprint(self.csv_path, with_hash=False)
+            except OSError:
+                # The file is probably being replaced right now, try again next time
+                continue
+
+            if current_file == self._seen_file:
+                pending = None
+                continue
+
+            # Wait for the file to stay the same for a whole poll before reading it,
+            # so a copy that's still in progress doesn't get loaded half-written
+            if current_file != pending:
+                pending = current_file
+                continue
+
+            try:
+                if self.reload() is None:
+                    # Another process is rebuilding it, its snapshot will be picked up next time
+                    continue
+                self.last_error = None
+            except Exception as error:
+                # Keep serving the old data, and try again once the file changes again
+                self.last_error = repr(error)
+                traceback.print_exc()
+            self._seen_file = current_file
+            pending = None
+
+    def start_watching(self):
+        # Threads don't survive a fork, so a forked server worker needs its own even if the parent had one
+        if self.poll_seconds <= 0 or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+        self._thread = threading.Thread(target=self._watch, name='dataset-watcher', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+        # Stop it when the process shuts down, so it doesn't start reloading the data on the way out
+        atexit.register(self.stop_watching)
+
+    def stop_watching(self):
+        self._stop.set()
@@ -0,0 +1,24 @@
+import os
+import multiprocessing
+
+# Where to listen, and how many worker processes to run (one per CPU by default)
+bind = os.environ.get('STEAM_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('STEAM_WORKERS', multiprocessing.cpu_count()))
+
+# Every worker would start its own filter processes (see sharded_filter.py) on top of itself, so by default
+# they share the CPUs left over per worker. With a worker per CPU that's none, and the sharding is off.
+os.environ.setdefault('STEAM_FILTER_PROCESSES', str(multiprocessing.cpu_count() // max(workers, 1)))
+
+# Load the app (and the data) once in the master process, the workers are forked from it (see wsgi.py)
+preload_app = True
+wsgi_app = 'wsgi:server'
+
+# Building the snapshot from the csv the first time can take a while
+timeout = 120
+
+
+# The data watcher is a thread, and threads don't carry over into the forked workers, so each
+# worker starts its own
+def post_fork(server, worker):
+    import FinalProject
+    FinalProject.dataset_manager.start_watching()
@@ -0,0 +1,573 @@
+import io
+import csv
+import sys
+import json
+import argparse
+import contextlib
+import numpy as np
+from steam_data import ALL_GAMES, CUBE_COLUMNS, DATA_PATH, LANGUAGE_INDEX, PLATFORMS, RELEASE_MONTH, SNAPSHOT_DIR, SUCCESS_METRICS, \
+    TOP_GAMES_COUNT, count_platforms, load_steam_data, platform_bits, platforms_match, release_periods, rollup_name
+from steam_index import EMPTY_ROWS, between, period_totals, rows_in, top_k_rows
+from request_metrics import RequestTimer
+
+# The filtering and ranking behind the top games chart, without the chart, so it can be used from other
+# scripts, the /api/top-games endpoint (see FinalProject.py) and the command line:
+#
+#   python query_engine.py queries.jsonl                        (results as JSON Lines, to the screen)
+#   python query_engine.py queries.jsonl --format csv -o out.csv
+#
+# A query is a JSON object with any of the fields below, e.g.
+#   {"language": "English", "genres": ["RPG"], "price": [0, 10], "positive": [1000, null], "metric": "Recommendations"}
+# The queries file has one per line (or is a single JSON list of them).
+
+# Every field of a query and what it is when it's left out. The lists work like the dropdowns: a game needs every
+# developer, publisher, category and genre listed, but only one of the tags. It needs one of the platforms
+# (Windows, Mac, Linux) too, or all of them if platform_mode is 'all'.
+QUERY_FIELDS = {
+    'language': None,
+    'maturity_rating': None,
+    'price': None,
+    'positive_percentage': None,
+    'developers': [],
+    'publishers': [],
+    'categories': [],
+    'genres': [],
+    'tags': [],
+    'dlc_count': None,
+    'positive': None,
+    'negative': None,
+    'achievements': None,
+    'recommendations': None,
+    'platforms': [],
+    'platform_mode': 'any',
+    'metric': 'Peak CCU',
+}
+
+LIST_FIELDS = ['developers', 'publishers', 'categories', 'genres', 'tags', 'platforms']
+
+PLATFORM_MODES = ['any', 'all']
+
+# The fields that take a [low, high] range (both included, null for no bound on that side), and their columns.
+# 'price' can be a range too, or a single price.
+RANGE_FIELDS = {
+    'dlc_count': 'DLC count',
+    'positive': 'Positive',
+    'negative': 'Negative',
+    'achievements': 'Achievements',
+    'recommendations': 'Recommendations',
+}
+
+# The filters on the list fields that a game needs every value of, as (stage name, field, index)
+FILTER_STAGES = [
+    ('developers filter', 'developers', 'developers separated'),
+    ('publishers filter', 'publishers', 'publishers separated'),
+    ('categories filter', 'categories', 'categories separated'),
+    ('genres filter', 'genres', 'genres separated'),
+]
+
+CSV_COLUMNS = ['query', 'language', 'metric', 'rank', 'app_id', 'name', 'value', 'error']
+
+# How many filter results a batch keeps around for the queries after it that use the same filter
+BATCH_MEMO_ENTRIES = 1024
+
+
+def _is_number(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float))
+
+
+# A [low, high] range from a query, or None if it has no bounds at all
+def _parse_range(value, field):
+    if value is None:
+        return None
+    if not isinstance(value, list) or len(value) != 2 or not all(bound is None or _is_number(bound) for bound in value):
+        raise ValueError(f"'{field}' has to be a [low, high] range of numbers (or nulls)")
+    return None if value == [None, None] else value
+
+
+# Checks a query from outside (the API or a queries file) and fills in the fields it left out.
+# Raises ValueError saying what's wrong with it.
+def parse_query(raw_query):
+    if not isinstance(raw_query, dict):
+        raise ValueError("A query has to be a JSON object")
+    unknown = sorted(set(raw_query) - set(QUERY_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown query field(s): {', '.join(unknown)} (the fields are {', '.join(QUERY_FIELDS)})")
+
+    query = {field: raw_query.get(field, default) for field, default in QUERY_FIELDS.items()}
+    if not isinstance(query['language'], str):
+        raise ValueError("'language' has to be given, as a string")
+    if query['maturity_rating'] is not None and not isinstance(query['maturity_rating'], str):
+        raise ValueError("'maturity_rating' has to be a string, like 'G' or 'MA'")
+    if isinstance(query['price'], list):
+        query['price'] = _parse_range(query['price'], 'price')
+    elif query['price'] is not None and not _is_number(query['price']):
+        raise ValueError("'price' has to be a number, or a [low, high] range")
+    if query['positive_percentage'] is not None and not _is_number(query['positive_percentage']):
+        raise ValueError("'positive_percentage' has to be a number")
+    for field in RANGE_FIELDS:
+        query[field] = _parse_range(query[field], field)
+    for field in LIST_FIELDS:
+        if query[field] is None:
+            query[field] = []
+        if not isinstance(query[field], list) or not all(isinstance(value, str) for value in query[field]):
+            raise ValueError(f"'{field}' has to be a list of strings")
+    unknown = sorted(set(query['platforms']) - set(PLATFORMS))
+    if unknown:
+        raise ValueError(f"Unknown platform(s): {', '.join(unknown)} (the platforms are {', '.join(PLATFORMS)})")
+    if query['platform_mode'] not in PLATFORM_MODES:
+        raise ValueError(f"'platform_mode' has to be one of {', '.join(PLATFORM_MODES)}")
+    if query['metric'] not in SUCCESS_METRICS:
+        raise ValueError(f"'metric' has to be one of {', '.join(SUCCESS_METRICS)}")
+    return query
+
+
+# Answers queries against one version of the dataset. With memo on (for batches) the rows matching each
+# developer/publisher/category/genre/tag selection are kept and reused by later queries with the same one.
+class QueryEngine:
+    def __init__(self, dataset, sharded_filter=None, memo=False):
+        self.dataset = dataset
+        self.sharded_filter = sharded_filter
+        self.memo = {} if memo else None
+
+    def _filter_rows(self, separated_column, values, any_value=False):
+        index = self.dataset.indexes[separated_column]
+        if self.memo is None:
+            return index.rows_with_any(values) if any_value else index.rows_with_all(values)
+
+        key = (separated_column, any_value, frozenset(values))
+        rows = self.memo.get(key)
+        if rows is None:
+            rows = index.rows_with_any(values) if any_value else index.rows_with_all(values)
+            if len(self.memo) >= BATCH_MEMO_ENTRIES:
+                self.memo.pop(next(iter(self.memo)))
+            self.memo[key] = rows
+        return rows
+
+    # The filters a query uses, as (stage name, column, values, estimated rows), most selective first.
+    # The estimates come from how many games have each value, which the indexes already know from when the data
+    # was loaded: a game needs all of a filter's values, so at most the rarest one's count of games can pass it,
+    # and the tags (only one needed) at most all of theirs added up. The counts of the cube and the ranges are
+    # exact, and so is the platforms', from how many games run on each combination of them. The column is the
+    # index's separated column, the range's column, 'Platforms', or None for the cube (cube_rows None leaves it out).
+    def plan(self, query, cube_rows):
+        indexes = self.dataset.indexes
+        steps = [] if cube_rows is None else [('cube filter', None, None, cube_rows)]
+        for stage_name, field, separated_column in FILTER_STAGES:
+            values = query[field]
+            if values:
+                estimate = min(indexes[separated_column].count(value) for value in values)
+                steps.append((stage_name, separated_column, values, estimate))
+        if query['tags']:
+            estimate = min(sum(indexes['tags separated'].count(value) for value in set(query['tags'])), len(self.dataset.games))
+            steps.append(('tags filter', 'tags separated', query['tags'], estimate))
+        for field, column in RANGE_FIELDS.items():
+            if query[field] is not None:
+                estimate = self.dataset.range_indexes[column].count(*query[field])
+                steps.append((f'{column} range', column, query[field], estimate))
+        if query['platforms']:
+            platforms = (platform_bits(query['platforms']), query['platform_mode'] == 'all')
+            estimate = count_platforms(self.dataset.platform_counts, *platforms)
+            steps.append(('platforms filter', 'Platforms', platforms, estimate))
+
+        # Ties keep the order above
+        return sorted(steps, key=lambda step: step[3])
+
+    # Which of the (sorted) rows are in the cube cells: the selected language (if there is one), and the allowed cube values
+    def _in_cube(self, rows, language_name, cube_masks):
+        if language_name is None:
+            keep = np.ones(len(rows), dtype=bool)
+        else:
+            keep = rows_in(rows, self.dataset.indexes[LANGUAGE_INDEX].rows(language_name))
+        for column, mask in cube_masks.items():
+            if mask is not None:
+                keep &= np.asarray(mask)[self.dataset.cube_codes(column, rows)]
+        return keep
+
+    # The maturity rating, price and percentage filters only have a handful of possible values each, so
+    # instead of checking every game they're checked against those values, and pick out cells of the cube
+    # (see steam_data.py). None means the filter isn't used.
+    def _cube_masks(self, query):
+        dataset = self.dataset
+        cube_masks = {column: None for column in CUBE_COLUMNS}
+
+        if query['maturity_rating'] is not None:
+            maturity_ratings = dataset.cube_values('Maturity Rating')
+            cube_masks['Maturity Rating'] = maturity_ratings == query['maturity_rating']
+
+        if query['price'] is not None:
+            price_ranges = dataset.cube_values('Price')
+            if isinstance(query['price'], list):
+                # Not the price SortedIndex like the other ranges, so the cube's top k for each price still gets used
+                cube_masks['Price'] = between(price_ranges, *query['price'])
+            else:
+                cube_masks['Price'] = price_ranges == query['price']
+
+        if query['positive_percentage'] is not None:
+            # A percentage takes in everything from 10 below it up to it
+            min_positive_percentage = query['positive_percentage'] - 10
+            max_positive_percentage = query['positive_percentage']
+
+            merged_reviews = dataset.cube_values('Merged Reviews')
+            cube_masks['Merged Reviews'] = (merged_reviews >= min_positive_percentage) & (merged_reviews <= max_positive_percentage)
+
+        return cube_masks
+
+    # A game has to have every selected developer, publisher, category and genre, one of the selected tags,
+    # a value in each of the ranges and the selected platforms. These are the fields of those the query uses,
+    # apart from the tags.
+    def _selected_filters(self, query):
+        selected_filters = [field for _, field, _ in FILTER_STAGES if query[field]]
+        selected_filters += [field for field in RANGE_FIELDS if query[field] is not None]
+        if query['platforms']:
+            selected_filters.append('platforms')
+        return selected_filters
+
+    # The rows of the top games for the query (best first), and the values of its metric for every game.
+    # timer records how long each stage takes and how many rows go in and out of it (see request_metrics.py).
+    # If a list is passed as explain, the steps that were taken get added to it (see plan above).
+    def top_rows(self, query, timer=None, explain=None):
+        dataset = self.dataset
+        steam_data = dataset.games
+        filter_indexes = dataset.indexes
+        timer = timer if timer is not None else RequestTimer()
+        cube_masks = self._cube_masks(query)
+
+        # The success metrics are already numbers (see steam_data.py)
+        with timer.stage('metric column'):
+            metric_column = query['metric']
+            metric_values = steam_data[metric_column].to_numpy()
+
+        selected_filters = self._selected_filters(query)
+        selected_tags = query['tags']
+        explain = explain if explain is not None else []
+
+        # With nothing picked but the language, its top 15 were already worked out when the data was loaded
+        # (for every language on the language chart), so they're used as they are
+        language = filter_indexes[LANGUAGE_INDEX].position(query['language'])
+        top_rows = None
+        if not selected_filters and not selected_tags and all(mask is None for mask in cube_masks.values()):
+            with timer.stage('leaderboard') as stage:
+                top_rows = dataset.leaderboards.top(language, SUCCESS_METRICS.index(metric_column))
+                stage.rows_out = None if top_rows is None else len(top_rows)
+            if top_rows is not None:
+                explain.append({'step': 'leaderboard', 'estimated_rows': len(top_rows), 'rows_out': len(top_rows)})
+
+        if top_rows is None:
+            # Filter for the selected language (an exact match, so 'English' doesn't also pick up 'English (UK)'),
+            # along with the filters above, by picking out the matching cells of the cube
+            with timer.stage('cube lookup', len(steam_data)) as stage:
+                cells = dataset.cube.cells(language, [cube_masks[column] for column in CUBE_COLUMNS])
+                cube_rows = dataset.cube.row_count(cells)
+                stage.rows_out = cube_rows
+
+            if not selected_filters and not selected_tags:
+                # Only the cube filters are used, and the cube already knows the best games of every cell,
+                # so only those need to be looked at
+                with timer.stage('cube top k', cube_rows) as stage:
+                    candidate_rows = dataset.cube.top_candidates(cells, SUCCESS_METRICS.index(metric_column))
+                    stage.rows_out = len(candidate_rows)
+                explain.append({'step': 'cube top k', 'estimated_rows': cube_rows, 'rows_out': len(candidate_rows)})
+            else:
+                candidate_rows = self._run_plan(query, cells, cube_rows, cube_masks, metric_column, timer, explain)
+
+            # Pick out the top 15 games by the selected metric, without sorting the rest of them
+            with timer.stage('top k', len(candidate_rows)) as stage:
+                top_rows = top_k_rows(metric_values, candidate_rows, TOP_GAMES_COUNT)
+                stage.rows_out = len(top_rows)
+
+        return top_rows, metric_values
+
+    # Starts from the rows of the most selective filter, then keeps the ones passing each of the others in turn
+    # (most selective first, so the later ones have the fewest rows to check), and stops as soon as none are left.
+    # cells is None when there's no language, and metric_column None when every matching row is wanted (not just
+    # the ones that could be in the top games), which never gets sharded.
+    def _run_plan(self, query, cells, cube_rows, cube_masks, metric_column, timer, explain):
+        dataset = self.dataset
+        steps = self.plan(query, cube_rows)
+
+        source_name, source_column, source_values, source_estimate = steps[0]
+        range_indexes = dataset.range_indexes
+        if source_estimate == 0:
+            # One of the values isn't on any game (or the cube cells are empty), so nothing can match
+            for stage_name, _, _, estimate in steps:
+                explain.append({'step': stage_name, 'estimated_rows': estimate, 'rows_out': None})
+            explain.append({'step': 'nothing can match', 'estimated_rows': 0, 'rows_out': 0})
+            return EMPTY_ROWS
+
+        if source_column is None and metric_column is not None and self.sharded_filter is not None \
+                and self.sharded_filter.should_shard(dataset, cube_rows):
+            # Lots of games to go through, so the filters are applied by several processes at once,
+            # each on its own slice of the games, and they send back their top 15s
+            shard_error = None
+            with timer.stage('sharded filters', cube_rows) as stage:
+                try:
+                    candidate_rows = self.sharded_filter.top_candidates(
+                        dataset, cells, [(column, query[field]) for _, field, column in FILTER_STAGES if query[field]],
+                        query['tags'], [(column, *query[field]) for field, column in RANGE_FIELDS.items() if query[field] is not None],
+                        (platform_bits(query['platforms']), query['platform_mode'] == 'all') if query['platforms'] else None,
+                        metric_column, TOP_GAMES_COUNT)
+                    stage.rows_out = len(candidate_rows)
+                except Exception as error:
+                    # The filter processes couldn't do it: the snapshot this dataset was mapped from has been
+                    # cleaned up since (this process hasn't picked up a reload yet), a pool process died (the
+                    # pool gets started again next time, see sharded_filter.py), or anything else went wrong
+                    # over there. Either way the query still gets its answer, it's just done here instead.
+                    shard_error = f'{type(error).__name__}: {error}'
+            if shard_error is None:
+                explain.append({'step': 'sharded filters', 'estimated_rows': cube_rows, 'rows_out': len(candidate_rows)})
+                return candidate_rows
+            explain.append({'step': 'sharded filters', 'estimated_rows': cube_rows, 'rows_out': None, 'error': shard_error})
+
+        with timer.stage(source_name, len(dataset.games)) as stage:
+            if source_column is None and cells is None:
+                # The cube is split up by language, so without one its filters are checked game by game
+                every_row = np.arange(len(dataset.games), dtype=np.int64)
+                candidate_rows = every_row[self._in_cube(every_row, None, cube_masks)]
+            elif source_column is None:
+                candidate_rows = dataset.cube.rows(cells)
+            elif source_column in range_indexes:
+                candidate_rows = range_indexes[source_column].rows_between(*source_values)
+            elif source_column == 'Platforms':
+                candidate_rows = np.flatnonzero(platforms_match(dataset.games['Platforms'].to_numpy(), *source_values))
+            else:
+                candidate_rows = self._filter_rows(source_column, source_values, any_value=source_column == 'tags separated')
+            stage.rows_out = len(candidate_rows)
+        explain.append({'step': source_name, 'estimated_rows': source_estimate, 'rows_out': len(candidate_rows)})
+
+        for stage_name, column, values, estimate in steps[1:]:
+            if len(candidate_rows) == 0:
+                explain.append({'step': stage_name, 'estimated_rows': estimate, 'rows_out': None})
+                continue
+            with timer.stage(stage_name, len(candidate_rows)) as stage:
+                if column is None:
+                    keep = self._in_cube(candidate_rows, query['language'], cube_masks)
+                elif column in range_indexes:
+                    keep = between(dataset.games[column].to_numpy()[candidate_rows], *values)
+                elif column == 'Platforms':
+                    keep = platforms_match(dataset.games['Platforms'].to_numpy()[candidate_rows], *values)
+                elif column == 'tags separated':
+                    keep = dataset.indexes[column].has_any(candidate_rows, values)
+                else:
+                    keep = dataset.indexes[column].has_all(candidate_rows, values)
+                candidate_rows = candidate_rows[keep]
+                stage.rows_out = len(candidate_rows)
+            explain.append({'step': stage_name, 'estimated_rows': estimate, 'rows_out': len(candidate_rows)})
+        return candidate_rows
+
+    # Every row (sorted) matching the query, instead of just its top games. The language can be None here, which
+    # takes in every language.
+    def matching_rows(self, query, timer=None, explain=None):
+        dataset = self.dataset
+        timer = timer if timer is not None else RequestTimer()
+        explain = explain if explain is not None else []
+        cube_masks = self._cube_masks(query)
+
+        if query['language'] is not None:
+            with timer.stage('cube lookup', len(dataset.games)) as stage:
+                cells = dataset.cube.cells(dataset.indexes[LANGUAGE_INDEX].position(query['language']),
+                                           [cube_masks[column] for column in CUBE_COLUMNS])
+                cube_rows = dataset.cube.row_count(cells)
+                stage.rows_out = cube_rows
+        else:
+            # At most every game gets through the cube filters, and none of them are used at all if they're all None
+            cells = None
+            cube_rows = len(dataset.games) if any(mask is not None for mask in cube_masks.values()) else None
+            if cube_rows is None and not self._selected_filters(query) and not query['tags']:
+                return np.arange(len(dataset.games), dtype=np.int64)
+
+        return self._run_plan(query, cells, cube_rows, cube_masks, None, timer, explain)
+
+    # The rollup that answers a trend on its own, as (index name, value), or None if it needs the filters. That's
+    # when nothing is picked but at most one of a language, a genre or a tag.
+    def _trend_rollup(self, query):
+        if self._selected_filters(query) != (['genres'] if query['genres'] else []):
+            return None
+        if any(mask is not None for mask in self._cube_masks(query).values()):
+            return None
+
+        dimensions = [
+            (LANGUAGE_INDEX, [] if query['language'] is None else [query['language']]),
+            ('genres separated', query['genres']),
+            ('tags separated', query['tags']),
+        ]
+        picked = [(index_name, set(values)) for index_name, values in dimensions if values]
+        if not picked:
+            return ALL_GAMES, None
+        if len(picked) > 1 or len(picked[0][1]) > 1:
+            return None
+        index_name, values = picked[0]
+        return index_name, next(iter(values))
+
+    # How many of the query's games came out in every month (or year, see TREND_PERIODS in steam_data.py), and the
+    # total of its metric, how many of them have a value of it and the biggest one, as (periods, counts, sums,
+    # value counts, maxima) for the periods with any games (in order). Games without a release date are left out.
+    # With nothing picked but one language, genre or tag (or nothing at all) it's a slice of the rollups worked out
+    # when the data was loaded, otherwise the filters pick out the games and they're added up.
+    def trend(self, query, period='month', timer=None, explain=None):
+        dataset = self.dataset
+        timer = timer if timer is not None else RequestTimer()
+        explain = explain if explain is not None else []
+        metric = SUCCESS_METRICS.index(query['metric'])
+
+        rollup = self._trend_rollup(query)
+        if rollup is not None:
+            index_name, value = rollup
+            with timer.stage('trend rollup') as stage:
+                if index_name == ALL_GAMES:
+                    position, estimate = 0, len(dataset.games)
+                else:
+                    position, estimate = dataset.indexes[index_name].position(value), dataset.indexes[index_name].count(value)
+                # A value no game has (position -1) has no periods at all
+                totals = dataset.rollups[rollup_name(index_name, period)].totals(position, metric)
+                stage.rows_out = int(totals[1].sum())
+            explain.append({'step': 'trend rollup', 'estimated_rows': estimate, 'rows_out': stage.rows_out})
+            return totals
+
+        rows = self.matching_rows(query, timer, explain)
+        with timer.stage('trend totals', len(rows)) as stage:
+            periods = release_periods(dataset.games[RELEASE_MONTH].to_numpy()[rows], period)
+            dated = periods >= 0
+            periods, counts, sums, value_counts, maxima = period_totals(
+                periods[dated].astype(np.int64), rows[dated], [dataset.games[query['metric']].to_numpy()])
+            stage.rows_out = int(counts.sum())
+        explain.append({'step': 'trend totals', 'estimated_rows': len(rows), 'rows_out': stage.rows_out})
+        return periods, counts, sums[0], value_counts[0], maxima[0]
+
+    # The query's top games as plain JSON-friendly values, best first. With explain on, the steps taken
+    # to answer it come back too.
+    def run(self, query, timer=None, explain=False):
+        plan = [] if explain else None
+        top_rows, metric_values = self.top_rows(query, timer, plan)
+        app_ids = self.dataset.games['AppID'].to_numpy()[top_rows] if 'AppID' in self.dataset.games else [None] * len(top_rows)
+        games = [
+            {
+                'rank': rank,
+                'app_id': None if app_id is None or app_id != app_id else int(app_id),
+                'name': name,
+                'value': None if np.isnan(value) else float(value),
+            }
+            for rank, (app_id, name, value) in enumerate(zip(app_ids, self.dataset.names.take(top_rows), metric_values[top_rows]), start=1)
+        ]
+        result = {'query': query, 'games': games}
+        if explain:
+            result['plan'] = plan
+        return result
+
+    # Runs every (already parsed) query in turn, yielding each result as soon as it's ready.
+    # Queries that failed to parse can be passed in as the ValueError, they come back as {'error': ...}.
+    # new_timer (if given) makes a RequestTimer for each query.
+    def run_batch(self, queries, new_timer=None, explain=False):
+        for query in queries:
+            if isinstance(query, ValueError):
+                yield {'error': str(query)}
+            elif new_timer is None:
+                yield self.run(query, explain=explain)
+            else:
+                with new_timer() as timer:
+                    result = self.run(query, timer, explain)
+                yield result
+
+
+# Parses every query, keeping the errors in place of the ones that aren't valid
+# (or couldn't be read in the first place, see read_queries)
+def parse_queries(raw_queries):
+    queries = []
+    for raw_query in raw_queries:
+        if isinstance(raw_query, ValueError):
+            queries.append(raw_query)
+            continue
+        try:
+            queries.append(parse_query(raw_query))
+        except ValueError as error:
+            queries.append(error)
+    return queries
+
+
+# Reads a queries file: one JSON query per line (blank lines are skipped), or a single JSON list of them
+def read_queries(queries_file):
+    text = queries_file.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+
+    raw_queries = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            raw_queries.append(json.loads(line))
+        except json.JSONDecodeError as error:
+            raw_queries.append(ValueError(f"Line {line_number} isn't valid JSON: {error}"))
+    return raw_queries
+
+
+# One line of JSON per result
+def jsonl_lines(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
+
+
+# A header, then one row per game of every result (or one row with the error, for queries that failed)
+def csv_lines(results):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+
+    for query_number, result in enumerate(results, start=1):
+        if 'error' in result:
+            writer.writerow([query_number, '', '', '', '', '', '', result['error']])
+        for game in result.get('games', []):
+            query = result['query']
+            writer.writerow([query_number, query['language'], query['metric'], game['rank'], game['app_id'], game['name'], game['value'], ''])
+        yield flush()
+
+
+OUTPUT_FORMATS = {'jsonl': jsonl_lines, 'csv': csv_lines}
+OUTPUT_MIMETYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of top games queries against the Steam data")
+    parser.add_argument('queries', help="file of JSON queries, one per line (or a JSON list), '-' to read them from stdin")
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='jsonl', help="output format, jsonl by default")
+    parser.add_argument('-o', '--output', help="where to write the results, the screen by default")
+    parser.add_argument('--csv', default=DATA_PATH, help="the games csv, data/games.csv by default")
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR, help="where the preprocessed copy of it is kept")
+    parser.add_argument('--explain', action='store_true', help="add the steps taken to answer each query (the 'plan') to its result")
+    args = parser.parse_args(argv)
+
+    if args.queries == '-':
+        raw_queries = read_queries(sys.stdin)
+    else:
+        with open(args.queries, encoding='utf-8') as queries_file:
+            raw_queries = read_queries(queries_file)
+    queries = parse_queries(raw_queries)
+
+    # Loading prints progress, which would end up mixed in with the results
+    with contextlib.redirect_stdout(sys.stderr):
+        dataset = load_steam_data(args.csv, args.snapshot_dir)
+
+    engine = QueryEngine(dataset, memo=True)
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for text in OUTPUT_FORMATS[args.format](engine.run_batch(queries, explain=args.explain)):
+            output.write(text)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    errors = sum(isinstance(query, ValueError) for query in queries)
+    print(f"Answered {len(queries) - errors} queries" + (f", {errors} couldn't be read" if errors else ''), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the histogram buckets, from a millisecond to ten seconds
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def _label_text(label_names, label_values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _quote(value):
+    return '"' + _escape(value) + '"'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# A count that only goes up, one per combination of label values
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_label_text(self.label_names, label_values)} {_number(value)}')
+        return lines
+
+
+# How many observations fell at or under each bucket's upper bound, plus their total and count,
+# one set per combination of label values (the same layout Prometheus uses)
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket..., sum, count]
+
+    def observe(self, label_values, value):
+        counts = self.values.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, counts in sorted(self.values.items()):
+            for bound, count in zip(self.buckets + ['+Inf'], counts[:-2] + counts[-1:]):
+                lines.append(f'{self.name}_bucket{_label_text(self.label_names, label_values, "le=%s" % _quote(bound))} {count}')
+            lines.append(f'{self.name}_sum{_label_text(self.label_names, label_values)} {_number(counts[-2])}')
+            lines.append(f'{self.name}_count{_label_text(self.label_names, label_values)} {counts[-1]}')
+        return lines
+
+
+# One stage of a request: how long it took, and how many rows went in and came out of it
+class Stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+
+    def describe(self):
+        text = f'{self.name} {self.seconds * 1000:.1f} ms'
+        if self.rows_in is not None and self.rows_out is not None:
+            text += f' ({self.rows_in} -> {self.rows_out} rows)'
+        return text
+
+
+# Times the stages of one callback request. Used as a context manager, it hands everything it recorded
+# over to the metrics (if any) when the request finishes.
+# on_stage (if given) is called with the name of every stage as it starts, background jobs use it to
+# report how far along they are (and it can raise to stop the request there, see background_jobs.py).
+class RequestTimer:
+    def __init__(self, metrics=None, callback='', on_stage=None):
+        self.metrics = metrics
+        self.callback = callback
+        self.on_stage = on_stage
+        self.stages = []
+        self.result = 'ok'
+        self.details = ''
+        self.seconds = 0.0
+        self._start = None
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        if self.on_stage is not None:
+            self.on_stage(name)
+        stage = Stage(name, rows_in)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            self.stages.append(stage)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.seconds = time.perf_counter() - self._start
+        # Unless whoever raised it already said how the request ended
+        if error_type is not None and self.result == 'ok':
+            self.result = 'error'
+        if self.metrics is not None:
+            self.metrics.record(self)
+        return False
+
+    def describe(self):
+        text = f'{self.callback} took {self.seconds * 1000:.1f} ms ({self.result})'
+        if self.details:
+            text += f' for {self.details}'
+        return text + ''.join(f'\n    {stage.describe()}' for stage in self.stages)
+
+
+# Timing histograms and row counts for every callback and stage, served in the Prometheus text format.
+# Requests slower than slow_request_seconds get printed with their stage by stage breakdown (0 turns that off).
+# Every server process keeps its own numbers.
+class CallbackMetrics:
+    def __init__(self, slow_request_seconds=1.0):
+        self.slow_request_seconds = slow_request_seconds
+        self.lock = threading.Lock()
+
+        self.request_seconds = Histogram('steam_callback_seconds', 'Time taken by each callback request.', ('callback', 'result'))
+        self.stage_seconds = Histogram('steam_callback_stage_seconds', 'Time taken by each stage of a callback.', ('callback', 'stage'))
+        self.stage_rows_in = Counter('steam_callback_stage_rows_in_total', 'Rows going into each stage of a callback.', ('callback', 'stage'))
+        self.stage_rows_out = Counter('steam_callback_stage_rows_out_total', 'Rows coming out of each stage of a callback.', ('callback', 'stage'))
+        self.requests = Counter('steam_callback_requests_total', 'Callback requests, by how they ended.', ('callback', 'result'))
+        self.slow_requests = Counter('steam_callback_slow_requests_total', 'Callback requests slower than the slow request threshold.', ('callback',))
+        self.extra_counters = []
+
+    # Counters for anything else worth keeping track of, they're served on /metrics along with the rest
+    def add_counter(self, name, help_text, label_names=()):
+        counter = Counter(name, help_text, label_names)
+        self.extra_counters.append(counter)
+        return counter
+
+    def inc(self, counter, label_values=(), amount=1):
+        with self.lock:
+            counter.inc(label_values, amount)
+
+    def request(self, callback, on_stage=None):
+        return RequestTimer(self, callback, on_stage)
+
+    def record(self, timer):
+        slow = 0 < self.slow_request_seconds <= timer.seconds
+
+        with self.lock:
+            self.request_seconds.observe((timer.callback, timer.result), timer.seconds)
+            self.requests.inc((timer.callback, timer.result))
+            if slow:
+                self.slow_requests.inc((timer.callback,))
+
+            for stage in timer.stages:
+                self.stage_seconds.observe((timer.callback, stage.name), stage.seconds)
+                if stage.rows_in is not None:
+                    self.stage_rows_in.inc((timer.callback, stage.name), stage.rows_in)
+                if stage.rows_out is not None:
+                    self.stage_rows_out.inc((timer.callback, stage.name), stage.rows_out)
+
+        if slow:
+            print("Slow request: " + timer.describe())
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in [self.requests, self.request_seconds, self.slow_requests, self.stage_seconds, self.stage_rows_in, self.stage_rows_out] + self.extra_counters:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
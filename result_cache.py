@@ -0,0 +1,120 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+
+# A least-recently-used cache for callback results with a limit on how much memory it can use.
+# Results are tagged with the version of the dataset they were worked out from (a number that goes up with
+# every reload, see SteamDataset.load_number). The first time a newer version is asked for everything in the
+# cache gets thrown away, and from then on requests for older versions are ignored (requests that started
+# just before a reload can still finish after it, and they mustn't throw the new version's results away again).
+class ResultCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (result, size in bytes), least recently used first
+        self.total_bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    # Returns False if the version is older than the newest one seen, so the request should be ignored
+    def _check_version(self, version):
+        if version == self.version:
+            return True
+        if self.version is not None and version is not None and version < self.version:
+            return False
+
+        if self.entries:
+            self.invalidations += 1
+        self.entries.clear()
+        self.total_bytes = 0
+        self.version = version
+        return True
+
+    # Returns the cached result, or None if there isn't one
+    def get(self, key, version=None):
+        with self.lock:
+            entry = self.entries.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result, version=None):
+        # The pickled size is a decent stand-in for how much memory the result holds on to
+        size = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if not self._check_version(version):
+                return
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (result, size)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _as_set(values):
+    return frozenset(values or ())
+
+
+# The range sliders send their value as a list, which can't be part of a key
+def _as_range(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+# The same selection should always give the same key, no matter what order the multi-select values
+# were picked in, or what else plotly puts into selectedData alongside the clicked bar
+def top_games_cache_key(selectedData, selected_maturity_rating, selected_price_range, selected_percentage, selected_developers,
+                        selected_publishers, selected_categories, selected_genres, selected_tags, selected_metric,
+                        selected_dlc_count=None, selected_positive=None, selected_negative=None, selected_achievements=None,
+                        selected_recommendations=None, selected_platforms=None, selected_platform_mode=None):
+    points = (selectedData or {}).get('points') or []
+    selected_language = points[0].get('x') if points else None
+
+    return (
+        selected_language,
+        selected_maturity_rating,
+        _as_range(selected_price_range),
+        selected_percentage,
+        _as_set(selected_developers),
+        _as_set(selected_publishers),
+        _as_set(selected_categories),
+        _as_set(selected_genres),
+        _as_set(selected_tags),
+        selected_metric,
+        _as_range(selected_dlc_count),
+        _as_range(selected_positive),
+        _as_range(selected_negative),
+        _as_range(selected_achievements),
+        _as_range(selected_recommendations),
+        _as_set(selected_platforms),
+        selected_platform_mode if selected_platforms else None,
+    )
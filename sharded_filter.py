@@ -0,0 +1,95 @@
+import os
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from steam_data import platforms_match, read_snapshot
+from steam_index import between, intersect_rows, top_k_rows
+
+# Big queries using the developers/publishers/categories/genres/tags filters get split into slices of rows
+# (shards), each one filtered by a different process, so they aren't stuck on one core. These processes
+# map the same snapshot as the server (see wsgi.py), so only the selections and the top rows go back and forth.
+
+
+# The top k rows (by metric_column) out of the rows in row_range (start, stop) that are in the cube cells,
+# have every value of each (separated column, values) in all_filters, at least one of any_values in
+# 'tags separated', a value in each (column, low, high) of ranges, and the platforms (platform bits, whether
+# all of them are needed), if that isn't None. The same filters the query engine applies, just for part of the rows.
+def shard_top_rows(dataset, cells, all_filters, any_values, ranges, platforms, metric_column, k, row_range):
+    candidate_rows = dataset.cube.rows(cells, row_range)
+    for separated_column, values in all_filters:
+        candidate_rows = intersect_rows(candidate_rows, dataset.indexes[separated_column].rows_with_all(values, row_range))
+    if any_values:
+        candidate_rows = intersect_rows(candidate_rows, dataset.indexes['tags separated'].rows_with_any(any_values, row_range))
+    for column, low, high in ranges:
+        candidate_rows = candidate_rows[between(dataset.games[column].to_numpy()[candidate_rows], low, high)]
+    if platforms is not None:
+        candidate_rows = candidate_rows[platforms_match(dataset.games['Platforms'].to_numpy()[candidate_rows], *platforms)]
+    return top_k_rows(dataset.games[metric_column].to_numpy(), candidate_rows, k)
+
+
+# Each pool process keeps the snapshot it last mapped, and swaps it for the new one after a reload
+_process_datasets = {}
+
+
+def _run_shard(snapshot_dir, meta, *args):
+    dataset = _process_datasets.get(meta['directory'])
+    if dataset is None:
+        _process_datasets.clear()
+        dataset = read_snapshot(snapshot_dir, meta)
+        _process_datasets[meta['directory']] = dataset
+    return shard_top_rows(dataset, *args)
+
+
+# A pool of processes that lives as long as the server does. Queries with fewer than min_rows rows left after
+# the cube lookup stay on the single-threaded path, where splitting them up would cost more than it saves.
+class ShardedFilter:
+    def __init__(self, processes=0, min_rows=100000):
+        self.processes = processes
+        self.min_rows = min_rows
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    # Only datasets memory-mapped from a snapshot can be shared with the pool
+    def should_shard(self, dataset, rows):
+        return self.processes > 1 and rows >= self.min_rows and dataset.snapshot is not None
+
+    def _executor(self):
+        # The processes are started fresh (not forked from the server, which has threads running), and a
+        # forked server worker starts its own pool
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    # The sorted rows that could be in the top k: each shard's own top k. A row in the overall top k is
+    # in its shard's top k as well, so top_k_rows on these gives exactly what it would on all of them.
+    def top_candidates(self, dataset, cells, all_filters, any_values, ranges, platforms, metric_column, k):
+        snapshot_dir, meta = dataset.snapshot
+        bounds = np.linspace(0, len(dataset.games), self.processes + 1).astype(np.int64)
+        pool = self._executor()
+        try:
+            shards = [
+                pool.submit(_run_shard, snapshot_dir, meta, cells, all_filters, any_values, ranges, platforms, metric_column, k, (int(start), int(stop)))
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            return np.sort(np.concatenate([shard.result() for shard in shards]))
+        except BrokenProcessPool:
+            # One of the processes died (killed, out of memory...), and a broken pool doesn't take any more work,
+            # so the next query starts a new one
+            self._discard(pool)
+            raise
+
+    def _discard(self, pool):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(cancel_futures=True)
+        self._pool = None
@@ -0,0 +1,639 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import itertools
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from steam_index import FilterCube, InvertedIndex, Leaderboards, MultiValueColumn, MultiValueColumnBuilder, PrefixIndex, SortedIndex, \
+    StringArray, TimeRollup, TrigramIndex, build_filter_indexes, build_option_indexes, save_arrays, load_array, load_arrays
+
+# psutil is only used to report how much memory loading takes
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DATA_PATH = os.path.join("data", "games.csv")
+
+# The snapshot lives next to the csv so it gets thrown away along with the data folder.
+# Every version of the csv gets its own folder of .npy files inside it, which are memory-mapped
+# when loaded, so all the server processes share the one copy of the data in the OS page cache.
+SNAPSHOT_DIR = os.path.join("data", "snapshot")
+
+# Bump this whenever the preprocessing below changes, otherwise old snapshots would still be loaded
+SNAPSHOT_VERSION = 12
+
+# The multi-valued columns, and the raw column each one is split from
+SEPARATED_COLUMNS = {
+    'developers separated': 'Developers',
+    'publishers separated': 'Publishers',
+    'categories separated': 'Categories',
+    'genres separated': 'Genres',
+    'tags separated': 'Tags',
+}
+
+# The columns that can be picked in the 'Select Success Metric' dropdown
+SUCCESS_METRICS = [
+    'Peak CCU',
+    'Metacritic score',
+    'User score',
+    'Recommendations',
+    'Average playtime forever',
+    'Median playtime forever',
+]
+
+# The key of the language index, next to the separated columns in the same dict of indexes
+LANGUAGE_INDEX = 'languages'
+
+# The dropdown filters with only a few possible values. The games of each language are split into cells by
+# these, so filtering on them is a lookup (see FilterCube in steam_index.py).
+CUBE_COLUMNS = ['Maturity Rating', 'Price', 'Merged Reviews']
+
+# The number columns with a range slider. Each one keeps its rows sorted by value, so a range is a slice of
+# them (see SortedIndex in steam_index.py). Price is in the cube as well, which is what filters it, its sorted
+# rows are only used for the slider.
+RANGE_COLUMNS = ['Price', 'DLC count', 'Positive', 'Negative', 'Achievements', 'Recommendations']
+
+# Which platforms each game runs on is packed into one number, with a bit for each of these (Windows is 1,
+# Mac 2, Linux 4), so the platform filters are a couple of bitwise operations on one small array
+PLATFORMS = ['Windows', 'Mac', 'Linux']
+
+# The release dates are kept as a month number (the year times 12 plus the month, counting January as 0, -1 when
+# there's no date), and every month and year has its totals worked out ahead of time for all the games together
+# and for every language, genre and tag on their own (see TimeRollup in steam_index.py)
+RELEASE_MONTH = 'Release Month'
+TREND_PERIODS = ['month', 'year']
+ROLLUP_INDEXES = [LANGUAGE_INDEX, 'genres separated', 'tags separated']
+ALL_GAMES = 'all games'
+
+# The formats 'Release date' comes in, e.g. 'Oct 21, 2008' and (for games without a day) 'Oct 2008'
+RELEASE_DATE_FORMATS = ['%b %d, %Y', '%b %Y']
+
+# How many games the top games chart shows. The cube keeps this many of the best games of each cell.
+TOP_GAMES_COUNT = 15
+
+# Only these columns get read from the csv, the rest of them (descriptions, reviews, screenshot and
+# movie links...) are never used and take up most of the file
+USED_COLUMNS = ['AppID', 'Name', 'Release date', 'Required age', 'Price', 'DLC count', 'Supported languages', 'Positive', 'Negative', 'Achievements'] \
+    + PLATFORMS + SUCCESS_METRICS + list(SEPARATED_COLUMNS.values())
+
+# The text columns are always read as text, otherwise a chunk where every name happens to be a number
+# would come out as a number column
+TEXT_COLUMNS = ['Name', 'Supported languages'] + list(SEPARATED_COLUMNS.values())
+
+# The csv is read this many rows at a time, so only one chunk of the raw text is in memory at once
+CHUNK_ROWS = 50000
+
+MATURITY_RATINGS = ['G', 'PG', 'M', 'MA', 'R', 'X']
+
+# The youngest 'Required age' of each of the ratings above
+MATURITY_AGE_BOUNDS = [0, 10, 13, 15, 17, 21]
+
+# Stands in for a missing name when checking for duplicates (so all the missing ones count as one name,
+# the same as drop_duplicates does)
+MISSING_NAME = '\0missing name'
+
+# 'Supported languages' is stored as a python list literal like "['English', 'French']".
+# This pulls out every quoted entry in one pass over the whole column instead of running
+# ast.literal_eval on each row. The closing quote has to be followed by ', ' or the closing bracket,
+# so quotes inside a language name (e.g. "Cote d'Ivoire") don't end it early.
+LANGUAGE_LIST_PATTERN = r'^\[.*\]$'
+LANGUAGE_ENTRY_PATTERN = r"""(?P<quote>['"])(?P<language>.*?)(?P=quote)(?=\s*,|\s*\]$)"""
+
+
+# Define a function to map the age values to maturity ratings. It does the whole column at once:
+# each age gets the last rating whose youngest age it's at or above, and anything below 0 or missing is 'X'.
+def map_age_to_rating(ages):
+    codes = np.searchsorted(MATURITY_AGE_BOUNDS, ages, side='right') - 1
+    codes[codes < 0] = len(MATURITY_RATINGS) - 1
+    return pd.Categorical.from_codes(codes, categories=MATURITY_RATINGS)
+
+
+_load_numbers = itertools.count()
+
+
+# Everything the dashboard needs from the csv: the preprocessed games (one row per game, all numbers),
+# their names (a StringArray, so they can be memory-mapped too), the multi-valued columns as codes
+# (see steam_index.py), and the indexes built from them.
+# version is the content hash of the csv it came from, and snapshot the (snapshot folder, meta) it was
+# memory-mapped from, if it was, so other processes can map the same files (see sharded_filter.py).
+# load_number goes up with every dataset a process loads, so it tells which of two is newer (the hash can't,
+# the csv might have been put back the way it was).
+class SteamDataset:
+    def __init__(self, games, names, value_columns, indexes, cube, option_indexes=None, version=None, leaderboards=None, name_index=None,
+                 range_indexes=None, rollups=None):
+        self.games = games
+        self.names = names
+        self.value_columns = value_columns
+        self.indexes = indexes
+        self.cube = cube
+        self.version = version
+        self.load_number = next(_load_numbers)
+        self.snapshot = None
+
+        # The smaller things worked out from the indexes, kept with them so a reload swaps everything at once
+        self.language_counts = count_languages(indexes[LANGUAGE_INDEX])
+        self.platform_counts = np.bincount(games['Platforms'].to_numpy(), minlength=1 << len(PLATFORMS))
+        self.option_indexes = option_indexes if option_indexes is not None else build_option_indexes(indexes, SEPARATED_COLUMNS)
+        self.leaderboards = leaderboards if leaderboards is not None else build_leaderboards(games, indexes[LANGUAGE_INDEX], cube)
+        self.name_index = name_index if name_index is not None else TrigramIndex.from_strings(names)
+        self.range_indexes = range_indexes if range_indexes is not None else build_range_indexes(games)
+        self.rollups = rollups if rollups is not None else build_rollups(games, indexes)
+
+    # The distinct values of one of the CUBE_COLUMNS, in the order of the cube's codes for it
+    def cube_values(self, column):
+        values = self.cube.dimension_values[CUBE_COLUMNS.index(column)]
+        if isinstance(self.games[column].dtype, pd.CategoricalDtype):
+            return np.asarray(self.games[column].cat.categories, dtype=object)[values]
+        return values
+
+    # Which of cube_values(column) each of the rows has (its position in them)
+    def cube_codes(self, column, rows):
+        values = self.games[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            row_values = values.array.codes[rows]
+        else:
+            row_values = values.to_numpy()[rows]
+        return np.searchsorted(self.cube.dimension_values[CUBE_COLUMNS.index(column)], row_values)
+
+
+# Everything but AppID has to be in the csv. The header gets checked before any of it is read, so a csv
+# that's missing some columns gets one error naming all of them, instead of a KeyError halfway through.
+def read_games_csv(csv_path, chunk_rows=CHUNK_ROWS):
+    header = pd.read_csv(csv_path, encoding="latin-1", nrows=0).columns
+    missing = [column for column in USED_COLUMNS if column != 'AppID' and column not in header]
+    if missing:
+        raise ValueError(f"{csv_path} is missing the column(s): {', '.join(missing)}")
+
+    return pd.read_csv(
+        csv_path,
+        encoding="latin-1",
+        usecols=lambda column: column in USED_COLUMNS,
+        dtype={column: str for column in TEXT_COLUMNS},
+        chunksize=chunk_rows,
+    )
+
+
+def preprocess_chunk(chunk):
+    # There are so many values which are multiple cents thanks to international currency differences.
+    # It can be fixed by just rounding all of them up.
+    games = pd.DataFrame({
+        'Name': chunk['Name'],
+        'Price': pd.to_numeric(chunk['Price'], errors='coerce').round().astype(np.float32),
+    })
+
+    if 'AppID' in chunk:
+        games['AppID'] = pd.to_numeric(chunk['AppID'], errors='coerce', downcast='integer')
+
+    # Apply the function to create a new column 'Maturity Rating'
+    games['Maturity Rating'] = map_age_to_rating(pd.to_numeric(chunk['Required age'], errors='coerce').to_numpy(dtype=np.float64))
+
+    games[RELEASE_MONTH] = parse_release_months(chunk['Release date'])
+
+    # Parse the 'TRUE' and 'FALSE' values into the platform bits. pandas already turns a column of nothing but
+    # True/False into booleans (which is why mapping the 'TRUE' strings never matched anything), so both the
+    # booleans and the strings are read by their text.
+    platforms = np.zeros(len(chunk), dtype=np.uint8)
+    for bit, platform in enumerate(PLATFORMS):
+        platforms |= (chunk[platform].astype(str).str.strip().str.upper() == 'TRUE').to_numpy().astype(np.uint8) << bit
+    games['Platforms'] = platforms
+
+    # Convert the success metrics to numbers once here, instead of every time one gets picked.
+    # float32 holds every whole number up to 16 million exactly, which is plenty for these.
+    for metric in SUCCESS_METRICS:
+        games[metric] = pd.to_numeric(chunk[metric], errors='coerce').astype(np.float32)
+
+    # The counts for the range sliders, as numbers the same way
+    for column in ['DLC count', 'Positive', 'Negative', 'Achievements']:
+        games[column] = pd.to_numeric(chunk[column], errors='coerce').astype(np.float32)
+
+    # Calculate the merged reviews column (rounded to the nearest 10%)
+    positive = pd.to_numeric(chunk['Positive'], errors='coerce')
+    negative = pd.to_numeric(chunk['Negative'], errors='coerce')
+    games['Merged Reviews'] = (((positive / (positive + negative)) * 10).round() * 10).astype(np.float32)
+
+    return games.reset_index(drop=True)
+
+
+# The month number of every release date. Lots of games share a release date, so each distinct one is only
+# parsed once (with each of the formats in turn, for the ones the earlier formats didn't fit) and the months
+# are handed back out to the games from that.
+def parse_release_months(release_dates):
+    codes, distinct_dates = pd.factorize(release_dates.astype(str).str.strip())
+    distinct_dates = pd.Series(distinct_dates, dtype=object)
+    dates = pd.Series(pd.NaT, index=distinct_dates.index, dtype='datetime64[ns]')
+    for date_format in RELEASE_DATE_FORMATS:
+        missing = dates.isna()
+        dates[missing] = pd.to_datetime(distinct_dates[missing], format=date_format, errors='coerce')
+
+    months = (dates.dt.year * 12 + dates.dt.month - 1).fillna(-1).to_numpy().astype(np.int32)
+    return months[codes] if len(months) else np.full(len(codes), -1, dtype=np.int32)
+
+
+# The periods (the month numbers as they are, or just their years) of some games' month numbers, -1 stays -1
+def release_periods(months, period):
+    if period == 'year':
+        return np.where(months >= 0, months // 12, -1)
+    return months
+
+
+# Splits 'Single-player,Steam achievements,etc.' style values, returning the position of the
+# row each value came from and the value itself
+def split_values(raw_values):
+    values = raw_values.reset_index(drop=True).str.split(',').explode().dropna()
+    return values.index.to_numpy(dtype=np.int64), values.to_numpy()
+
+
+# Returns a (row position, language) pair for every language every game supports
+def parse_supported_languages(supported_languages):
+    supported_languages = supported_languages.reset_index(drop=True).astype(str).str.strip()
+
+    # Anything that isn't a list (the old literal_eval would have failed on it) is skipped
+    is_list = supported_languages.str.match(LANGUAGE_LIST_PATTERN)
+    entries = supported_languages[is_list].str.extractall(LANGUAGE_ENTRY_PATTERN)['language']
+
+    rows = entries.index.get_level_values(0).to_numpy(dtype=np.int64)
+    return rows, entries.to_numpy()
+
+
+# Every language/developer/... of the given chunk rows, as (row position, value) pairs
+def chunk_values(chunk, name):
+    if name == LANGUAGE_INDEX:
+        return parse_supported_languages(chunk['Supported languages'])
+    return split_values(chunk[SEPARATED_COLUMNS[name]])
+
+
+# Reads the csv a chunk at a time and only keeps the lean, preprocessed version of each chunk.
+# If the dataset from a previous version of the csv is passed in, rows that haven't changed at all
+# (same hash of their raw values) are copied over from it instead of being preprocessed again.
+def preprocess_steam_data(chunks, previous=None):
+    games_chunks = []
+    builders = {name: MultiValueColumnBuilder() for name in list(SEPARATED_COLUMNS) + [LANGUAGE_INDEX]}
+    seen_names = set()
+    previous_hashes = pd.Index(previous.games['Row Hash']) if previous is not None else None
+    reused_count = 0
+
+    for chunk in chunks:
+        # I don't want to see duplicate game titles ruining my beautiful graphs.
+        # The first time a name shows up wins, even if that row is dropped below (same as drop_duplicates).
+        names = chunk['Name'].fillna(MISSING_NAME)
+        first_time = ~names.duplicated() & ~names.isin(seen_names)
+        seen_names.update(names[first_time])
+
+        chunk = chunk[first_time]
+        chunk = chunk.dropna(subset=['Supported languages']).reset_index(drop=True)
+
+        # The hash covers every column that gets read (AppID and Name included), so a matching hash
+        # means the game is exactly the same as last time
+        row_hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        if previous_hashes is not None:
+            previous_rows = previous_hashes.get_indexer(row_hashes)
+        else:
+            previous_rows = np.full(len(chunk), -1)
+
+        reused = np.flatnonzero(previous_rows >= 0)
+        fresh = np.flatnonzero(previous_rows < 0)
+        fresh_chunk = chunk.iloc[fresh]
+        reused_count += len(reused)
+
+        # Put the copied rows and the newly preprocessed ones back into the order of the csv
+        chunk_games = preprocess_chunk(fresh_chunk)
+        if len(reused):
+            reused_games = previous.games.iloc[previous_rows[reused]].assign(Name=previous.names.take(previous_rows[reused]))
+            chunk_games = pd.concat([reused_games[chunk_games.columns], chunk_games], ignore_index=True)
+        chunk_games = chunk_games.iloc[np.argsort(np.concatenate([reused, fresh]), kind='stable')].reset_index(drop=True)
+        chunk_games['Row Hash'] = row_hashes
+        games_chunks.append(chunk_games)
+
+        for name, builder in builders.items():
+            fresh_rows, fresh_values = chunk_values(fresh_chunk, name)
+            rows, values = fresh[fresh_rows], fresh_values
+
+            if len(reused):
+                reused_rows, reused_values = previous.value_columns[name].take(previous_rows[reused])
+                rows = np.concatenate([reused[reused_rows], rows])
+                values = np.concatenate([reused_values, values])
+                order = np.argsort(rows, kind='stable')
+                rows, values = rows[order], values[order]
+
+            builder.add(rows, values, len(chunk))
+
+    if games_chunks:
+        games = pd.concat(games_chunks, ignore_index=True)
+    else:
+        games = preprocess_chunk(pd.DataFrame(columns=USED_COLUMNS))
+        games['Row Hash'] = np.empty(0, dtype=np.uint64)
+
+    if previous is not None:
+        print(f"Reused {reused_count} unchanged games, preprocessed {len(games) - reused_count} new or changed ones")
+
+    value_columns = {name: builder.build() for name, builder in builders.items()}
+    return games, value_columns
+
+
+# Codes every game by its value in each of the CUBE_COLUMNS (categorical columns by their codes), and builds
+# the cube of those codes for every language with the top games by every success metric
+def build_cube(games, language_index):
+    dimensions = []
+    for column in CUBE_COLUMNS:
+        values = games[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.codes
+        dimensions.append(np.unique(values.to_numpy(), return_inverse=True))
+
+    metrics = [games[metric].to_numpy() for metric in SUCCESS_METRICS]
+    return FilterCube.build(language_index, dimensions, metrics, TOP_GAMES_COUNT)
+
+
+# The top games of every language on the language chart by every success metric
+def build_leaderboards(games, language_index, cube):
+    languages = [language_index.position(language) for language in count_languages(language_index)['Language']]
+    metrics = [games[metric].to_numpy() for metric in SUCCESS_METRICS]
+    return Leaderboards.build(cube, languages, metrics, TOP_GAMES_COUNT)
+
+
+def build_range_indexes(games):
+    return {column: SortedIndex.from_values(games[column].to_numpy()) for column in RANGE_COLUMNS}
+
+
+# The name of a rollup in SteamDataset.rollups, index_name being one of ROLLUP_INDEXES or ALL_GAMES
+def rollup_name(index_name, period):
+    return f'{index_name} by {period}'
+
+
+def build_rollups(games, indexes):
+    metrics = [games[metric].to_numpy() for metric in SUCCESS_METRICS]
+    every_row = np.arange(len(games), dtype=np.int64)
+    rollups = {}
+    for period in TREND_PERIODS:
+        periods = release_periods(games[RELEASE_MONTH].to_numpy(), period)
+        rollups[rollup_name(ALL_GAMES, period)] = TimeRollup.build(np.array([0, len(games)]), every_row, periods, metrics)
+        for name in ROLLUP_INDEXES:
+            rollups[rollup_name(name, period)] = TimeRollup.build(indexes[name].offsets, indexes[name].row_ids, periods, metrics)
+    return rollups
+
+
+# The platform bits of a list of platform names
+def platform_bits(platforms):
+    bits = 0
+    for platform in platforms:
+        bits |= 1 << PLATFORMS.index(platform)
+    return bits
+
+
+# Which of the games' platform bits have any of the wanted bits (or all of them, with require_all)
+def platforms_match(platforms, wanted_bits, require_all=False):
+    if require_all:
+        return (platforms & wanted_bits) == wanted_bits
+    return (platforms & wanted_bits) != 0
+
+
+# How many games run on any (or all) of the wanted platforms, from the count of every combination of them
+def count_platforms(platform_counts, wanted_bits, require_all=False):
+    combinations = np.arange(len(platform_counts))
+    return int(platform_counts[platforms_match(combinations, wanted_bits, require_all)].sum())
+
+
+# The 50 most supported languages, straight from the sizes of the language index
+def count_languages(language_index):
+    language_counts = pd.Series(language_index.counts(), dtype=np.int64).sort_values(ascending=False, kind='stable')
+    language_counts = language_counts.reset_index().head(50)
+    language_counts.columns = ['Language', 'Count']
+    return language_counts
+
+
+# The snapshot key. Size and mtime are cheap to check, and when both match the csv counts as unchanged.
+# When only the size matches the hash decides (copying the file around changes the mtime but not the contents).
+def csv_fingerprint(csv_path, with_hash=True):
+    stat = os.stat(csv_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    if with_hash:
+        content_hash = hashlib.blake2b(digest_size=20)
+        with open(csv_path, 'rb') as csv_file:
+            for block in iter(lambda: csv_file.read(1 << 20), b''):
+                content_hash.update(block)
+        fingerprint['hash'] = content_hash.hexdigest()
+
+    return fingerprint
+
+
+def snapshot_paths(snapshot_dir):
+    return {
+        'meta': os.path.join(snapshot_dir, 'snapshot.json'),
+        'lock': os.path.join(snapshot_dir, 'rebuild.lock'),
+    }
+
+
+def read_snapshot_meta(snapshot_dir):
+    try:
+        with open(snapshot_paths(snapshot_dir)['meta']) as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+
+# Returns the stored metadata if the snapshot was built from this exact csv (otherwise None), along with the
+# csv's full fingerprint if it had to be hashed to find that out (otherwise None), so it isn't hashed twice
+def matching_snapshot(csv_path, snapshot_dir):
+    meta = read_snapshot_meta(snapshot_dir)
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION:
+        return None, None
+
+    stored = meta['source']
+    current = csv_fingerprint(csv_path, with_hash=False)
+    if current['size'] != stored['size']:
+        return None, None
+
+    # Same size and mtime as the csv the snapshot was built from, so it's taken as the same file without
+    # reading the whole thing to hash it
+    if current['mtime'] == stored['mtime']:
+        return meta, None
+
+    current = csv_fingerprint(csv_path)
+    if current['hash'] != stored['hash']:
+        return None, current
+
+    # Same contents but a different mtime (e.g. the file was copied), so remember the new mtime,
+    # and the next start can skip the hash
+    meta['source'] = current
+    write_snapshot_meta(snapshot_dir, meta)
+    return meta, current
+
+
+def write_snapshot_meta(snapshot_dir, meta):
+    meta_path = snapshot_paths(snapshot_dir)['meta']
+    with open(f'{meta_path}.{os.getpid()}.tmp', 'w') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(f'{meta_path}.{os.getpid()}.tmp', meta_path)
+
+
+# Writes every array of the dataset into a new folder for this version of the csv. A folder is never
+# changed once it's written (other processes may have it memory-mapped), so it's written under a temporary
+# name and renamed into place, and snapshot.json is only pointed at it once it's complete.
+def write_snapshot(snapshot_dir, fingerprint, dataset):
+    directory = f"{SNAPSHOT_VERSION}-{fingerprint['hash'][:16]}"
+    final_path = os.path.join(snapshot_dir, directory)
+    tmp_path = f'{final_path}.{os.getpid()}.tmp'
+    os.makedirs(tmp_path, exist_ok=True)
+
+    # Categorical columns are saved as their codes, with the categories kept in snapshot.json
+    columns = list(dataset.games.columns)
+    categories = {}
+    for i, column in enumerate(columns):
+        values = dataset.games[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories[column] = values.cat.categories.tolist()
+            values = values.cat.codes
+        np.save(os.path.join(tmp_path, f'games.{i}.npy'), values.to_numpy())
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'source': fingerprint,
+        'directory': directory,
+        'columns': columns,
+        'categories': categories,
+        'names': save_arrays(tmp_path, 'names', {'Name': dataset.names})['Name'],
+        'value columns': save_arrays(tmp_path, 'value_columns', dataset.value_columns),
+        'indexes': save_arrays(tmp_path, 'indexes', dataset.indexes),
+        'cube': save_arrays(tmp_path, 'cube', {'cube': dataset.cube})['cube'],
+        'options': save_arrays(tmp_path, 'options', dataset.option_indexes),
+        'leaderboards': save_arrays(tmp_path, 'leaderboards', {'leaderboards': dataset.leaderboards})['leaderboards'],
+        'name index': save_arrays(tmp_path, 'name_index', {'Name': dataset.name_index})['Name'],
+        'range indexes': save_arrays(tmp_path, 'range_indexes', dataset.range_indexes),
+        'rollups': save_arrays(tmp_path, 'rollups', dataset.rollups),
+    }
+
+    if os.path.exists(final_path):
+        # Another process got there first with the same data
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    else:
+        os.replace(tmp_path, final_path)
+    previous_meta = read_snapshot_meta(snapshot_dir)
+    write_snapshot_meta(snapshot_dir, meta)
+
+    # Versions older than the one being replaced are only in the way now. The one being replaced stays until the
+    # next rebuild, since server processes that haven't reloaded yet still send it to the filter processes (see
+    # sharded_filter.py). On Windows a folder that's still memory-mapped by some process can't be removed yet,
+    # it'll be cleaned up after a later reload instead.
+    keep = {directory}
+    if previous_meta is not None and 'directory' in previous_meta:
+        keep.add(previous_meta['directory'])
+    for entry in os.listdir(snapshot_dir):
+        entry_path = os.path.join(snapshot_dir, entry)
+        if entry not in keep and os.path.isdir(entry_path) and not entry.endswith('.tmp'):
+            shutil.rmtree(entry_path, ignore_errors=True)
+
+    return meta
+
+
+# Every array comes back memory-mapped and read-only, so loading a snapshot costs next to nothing and
+# every process that loads the same one shares its memory
+def read_snapshot(snapshot_dir, meta):
+    path = os.path.join(snapshot_dir, meta['directory'])
+
+    columns = {}
+    for i, column in enumerate(meta['columns']):
+        values = load_array(os.path.join(path, f'games.{i}.npy'))
+        if column in meta['categories']:
+            values = pd.Categorical.from_codes(values, categories=meta['categories'][column])
+        columns[column] = values
+
+    dataset = SteamDataset(
+        pd.DataFrame(columns, copy=False),
+        load_arrays(path, 'names', {'Name': meta['names']}, StringArray)['Name'],
+        load_arrays(path, 'value_columns', meta['value columns'], MultiValueColumn),
+        load_arrays(path, 'indexes', meta['indexes'], InvertedIndex),
+        load_arrays(path, 'cube', {'cube': meta['cube']}, FilterCube)['cube'],
+        load_arrays(path, 'options', meta['options'], PrefixIndex),
+        meta['source']['hash'],
+        load_arrays(path, 'leaderboards', {'leaderboards': meta['leaderboards']}, Leaderboards)['leaderboards'],
+        load_arrays(path, 'name_index', {'Name': meta['name index']}, TrigramIndex)['Name'],
+        load_arrays(path, 'range_indexes', meta['range indexes'], SortedIndex),
+        load_arrays(path, 'rollups', meta['rollups'], TimeRollup),
+    )
+    dataset.snapshot = (snapshot_dir, meta)
+    return dataset
+
+
+# Resident memory of this process in MB, if psutil is around to tell us
+def resident_memory_mb():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def report_memory(label, before_mb):
+    after_mb = resident_memory_mb()
+    if after_mb is not None:
+        print(f"{label}: memory went from {before_mb:.0f} MB to {after_mb:.0f} MB")
+
+
+# Adds how long the block took (in seconds) to timings under the stage's name, if there is a timings dict
+@contextmanager
+def timed_stage(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+# Loads the preprocessed data and its indexes, from the snapshot if the csv hasn't changed since it
+# was written, otherwise from the csv (and then writes a new snapshot for next time).
+# previous is the currently loaded dataset when reloading, so the unchanged games don't have to be cleaned up
+# again (everything built from the games still is, see dataset_manager.py).
+# Pass a dict as timings to get how long each stage took (the benchmarks use this).
+def load_steam_data(csv_path=DATA_PATH, snapshot_dir=SNAPSHOT_DIR, previous=None, timings=None):
+    memory_before = resident_memory_mb()
+
+    fingerprint = None
+    try:
+        with timed_stage(timings, 'check snapshot'):
+            meta, fingerprint = matching_snapshot(csv_path, snapshot_dir)
+        if meta is not None:
+            print("Loading preprocessed snapshot from", snapshot_dir)
+            with timed_stage(timings, 'read snapshot'):
+                dataset = read_snapshot(snapshot_dir, meta)
+            report_memory("Loaded snapshot", memory_before)
+            return dataset
+    except (OSError, ValueError, TypeError, KeyError) as error:
+        print("Snapshot could not be read, rebuilding it:", error)
+
+    if fingerprint is None:
+        with timed_stage(timings, 'hash csv'):
+            fingerprint = csv_fingerprint(csv_path)
+    with timed_stage(timings, 'read and preprocess csv'):
+        games, value_columns = preprocess_steam_data(read_games_csv(csv_path), previous)
+        names = StringArray.from_strings(games.pop('Name').fillna('').astype(str))
+    with timed_stage(timings, 'build indexes'):
+        indexes = build_filter_indexes(value_columns)
+    with timed_stage(timings, 'build cube'):
+        cube = build_cube(games, indexes[LANGUAGE_INDEX])
+    with timed_stage(timings, 'build leaderboards'):
+        leaderboards = build_leaderboards(games, indexes[LANGUAGE_INDEX], cube)
+    with timed_stage(timings, 'build name index'):
+        name_index = TrigramIndex.from_strings(names)
+    with timed_stage(timings, 'build range indexes'):
+        range_indexes = build_range_indexes(games)
+    with timed_stage(timings, 'build time rollups'):
+        rollups = build_rollups(games, indexes)
+    with timed_stage(timings, 'build option indexes'):
+        dataset = SteamDataset(games, names, value_columns, indexes, cube, version=fingerprint['hash'], leaderboards=leaderboards,
+                               name_index=name_index, range_indexes=range_indexes, rollups=rollups)
+    report_memory("Loaded " + csv_path, memory_before)
+
+    try:
+        # Serve from the memory-mapped copy as well, so this process shares it like all the others
+        with timed_stage(timings, 'write snapshot'):
+            meta = write_snapshot(snapshot_dir, fingerprint, dataset)
+        with timed_stage(timings, 'read snapshot'):
+            dataset = read_snapshot(snapshot_dir, meta)
+    except (OSError, ValueError, TypeError) as error:
+        print("Snapshot could not be written:", error)
+
+    return dataset
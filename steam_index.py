@@ -0,0 +1,729 @@
+import os
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+# Sorts after every character that shows up in the data, so prefix + LAST_CHARACTER is the end of
+# the range of strings starting with prefix
+LAST_CHARACTER = '\uffff'
+
+
+# A list of strings stored as one block of utf-8 bytes plus where each string starts. Unlike a list of
+# python strings it's just two numpy arrays, so it can be memory-mapped from the snapshot and shared
+# between processes. Strings are only decoded when they're looked at.
+class StringArray:
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def take(self, rows):
+        return [self[row] for row in rows]
+
+    def tolist(self):
+        return self.take(range(len(self)))
+
+    def to_arrays(self):
+        return self.data, self.offsets
+
+    @classmethod
+    def from_arrays(cls, data, offsets):
+        return cls(data, offsets)
+
+
+# The values of a multi-valued column (e.g. every game's developers) stored as integer codes into a
+# vocabulary of the distinct values, instead of a python list per row. The values of row i are
+# codes[offsets[i]:offsets[i + 1]].
+class MultiValueColumn:
+    def __init__(self, vocabulary, offsets, codes):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row_values(self, row):
+        return [self.vocabulary[code] for code in self.codes[self.offsets[row]:self.offsets[row + 1]]]
+
+    # The row each code belongs to
+    def entry_rows(self):
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    # The values of a handful of rows, as (position in the given rows, value) pairs
+    def take(self, rows):
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        positions = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+        entries = _range_positions(starts, lengths)
+
+        # Only decode each distinct value once
+        codes, inverse = np.unique(self.codes[entries], return_inverse=True)
+        decoded = np.array([self.vocabulary[code] for code in codes.tolist()], dtype=object)
+        return positions, decoded[inverse.reshape(-1)]
+
+    def to_arrays(self):
+        return self.vocabulary.to_arrays() + (self.offsets, self.codes)
+
+    @classmethod
+    def from_arrays(cls, vocabulary_data, vocabulary_offsets, offsets, codes):
+        return cls(StringArray(vocabulary_data, vocabulary_offsets), offsets, codes)
+
+
+# The same as np.unique(values) without any of its options, which on some versions of numpy is many times
+# slower than sorting and dropping the repeats
+def sorted_unique(values):
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+# Every position in the ranges [start, start + length), one range after the other
+def _range_positions(starts, lengths):
+    range_starts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return range_starts + np.arange(range_starts.shape[0], dtype=np.int64)
+
+
+# Builds a MultiValueColumn one chunk of the csv at a time, with the vocabulary shared between chunks
+class MultiValueColumnBuilder:
+    def __init__(self):
+        self.vocabulary = {}
+        self.row_counts = []
+        self.codes = []
+
+    # rows are the (sorted) positions inside the chunk that each value belongs to
+    def add(self, rows, values, chunk_rows):
+        values = pd.Series(values, dtype=object)
+
+        new_values = pd.unique(values[~values.isin(self.vocabulary.keys())])
+        for value in new_values:
+            self.vocabulary[value] = len(self.vocabulary)
+
+        self.codes.append(values.map(self.vocabulary).to_numpy(dtype=np.int32))
+        self.row_counts.append(np.bincount(rows, minlength=chunk_rows))
+
+    def build(self):
+        row_counts = np.concatenate(self.row_counts) if self.row_counts else EMPTY_ROWS
+        offsets = np.zeros(len(row_counts) + 1, dtype=np.int64)
+        np.cumsum(row_counts, out=offsets[1:])
+        codes = np.concatenate(self.codes) if self.codes else np.empty(0, dtype=np.int32)
+        return MultiValueColumn(StringArray.from_strings(self.vocabulary), offsets, codes)
+
+
+# Maps every distinct value of a multi-valued column (e.g. every developer) to the sorted row ids
+# of the games that have it, so the filters become set operations instead of scanning every row.
+# The values are kept in sorted order and found with a binary search, and the row ids of value i are
+# row_ids[offsets[i]:offsets[i + 1]], so the whole index is plain arrays.
+class InvertedIndex:
+    def __init__(self, values, offsets, row_ids):
+        self.values = values
+        self.offsets = offsets
+        self.row_ids = row_ids
+
+    @classmethod
+    def from_value_column(cls, column):
+        # Number the vocabulary in sorted order, so the index comes out sorted by value
+        vocabulary = np.array(column.vocabulary.tolist(), dtype=object)
+        sorted_codes = np.argsort(vocabulary, kind='stable')
+        rank = np.empty(len(vocabulary), dtype=np.int64)
+        rank[sorted_codes] = np.arange(len(vocabulary))
+
+        # One number per (value, row) pair, sorted by value then row, which also gets rid of
+        # values listed twice for the same game
+        row_count = max(len(column), 1)
+        pairs = sorted_unique(rank[column.codes] * row_count + column.entry_rows())
+        ranks, row_ids = np.divmod(pairs, row_count)
+
+        # Each value's rows are one run of the same rank
+        run_starts = np.flatnonzero(np.diff(ranks, prepend=-1))
+        offsets = np.append(run_starts, len(row_ids)).astype(np.int64)
+        values = StringArray.from_strings(vocabulary[sorted_codes[ranks[run_starts]]].tolist())
+        return cls(values, offsets, row_ids)
+
+    def to_arrays(self):
+        return self.values.to_arrays() + (self.offsets, self.row_ids)
+
+    @classmethod
+    def from_arrays(cls, values_data, values_offsets, offsets, row_ids):
+        return cls(StringArray(values_data, values_offsets), offsets, row_ids)
+
+    def counts(self):
+        return dict(zip(self.values.tolist(), np.diff(self.offsets).tolist()))
+
+    # Where the value is in the sorted values, or -1 if no game has it
+    def position(self, value):
+        i = bisect_left(self.values, value)
+        if i < len(self.values) and self.values[i] == value:
+            return i
+        return -1
+
+    # How many games have the value
+    def count(self, value):
+        i = self.position(value)
+        return 0 if i < 0 else int(self.offsets[i + 1] - self.offsets[i])
+
+    # row_range (start, stop) only takes the rows in it, which is a binary search since the rows are sorted
+    def rows(self, value, row_range=None):
+        i = self.position(value)
+        if i < 0:
+            return EMPTY_ROWS
+        rows = self.row_ids[self.offsets[i]:self.offsets[i + 1]]
+        if row_range is not None:
+            start, stop = np.searchsorted(rows, row_range)
+            rows = rows[start:stop]
+        return rows
+
+    # Rows which have every one of the values (the AND filters)
+    def rows_with_all(self, values, row_range=None):
+        # Intersecting the smallest lists first keeps everything after it small
+        row_sets = sorted((self.rows(value, row_range) for value in set(values)), key=len)
+        return _intersect_all(row_sets)
+
+    # Rows which have at least one of the values (the ANY filter)
+    def rows_with_any(self, values, row_range=None):
+        row_sets = [self.rows(value, row_range) for value in set(values)]
+        if not row_sets:
+            return EMPTY_ROWS
+        return sorted_unique(np.concatenate(row_sets))
+
+    # Which of the (sorted) rows have every one of the values, when there are only a few rows to check
+    # it's quicker than intersecting with the full lists
+    def has_all(self, rows, values):
+        keep = np.ones(len(rows), dtype=bool)
+        for value in set(values):
+            keep &= rows_in(rows, self.rows(value))
+        return keep
+
+    # Which of the (sorted) rows have at least one of the values
+    def has_any(self, rows, values):
+        keep = np.zeros(len(rows), dtype=bool)
+        for value in set(values):
+            keep |= rows_in(rows, self.rows(value))
+        return keep
+
+
+# Which of the rows are in the sorted rows, with a binary search for each one
+def rows_in(rows, sorted_rows):
+    positions = np.searchsorted(sorted_rows, rows)
+    found = positions < len(sorted_rows)
+    found[found] = sorted_rows[positions[found]] == rows[found]
+    return found
+
+
+# Which of the values are from low to high (both included, None for no bound). Missing values never are.
+def between(values, low, high):
+    keep = ~np.isnan(values)
+    if low is not None:
+        keep &= values >= low
+    if high is not None:
+        keep &= values <= high
+    return keep
+
+
+def _intersect_all(row_sets):
+    if not row_sets:
+        return EMPTY_ROWS
+
+    rows = row_sets[0]
+    for other_rows in row_sets[1:]:
+        if len(rows) == 0:
+            break
+        rows = np.intersect1d(rows, other_rows, assume_unique=True)
+    return rows
+
+
+def intersect_rows(rows, other_rows):
+    return np.intersect1d(rows, other_rows, assume_unique=True)
+
+
+# Build one index per multi-valued column, keyed on the same name as the column
+def build_filter_indexes(value_columns):
+    return {name: InvertedIndex.from_value_column(column) for name, column in value_columns.items()}
+
+
+# The games of every language split into cells by a few columns with only a handful of distinct values
+# (e.g. maturity rating, price and review percentage), so filtering on them picks out whole cells instead of
+# checking every game. Each cell keeps its sorted row ids, and every cell with more than k games also keeps
+# its top k rows by each metric, so a query that only uses these filters never has to look at more than k
+# rows of any cell. A cell's key is its language's position in the language index followed by its code in
+# each dimension, as one number, and the cells are sorted by key.
+class FilterCube:
+    def __init__(self, cell_keys, offsets, row_ids, top_positions, top_rows, *dimension_values):
+        self.cell_keys = cell_keys
+        self.offsets = offsets
+        self.row_ids = row_ids
+        self.top_positions = top_positions  # cell -> its row in top_rows, or -1 if it's small
+        self.top_rows = top_rows  # metric, big cell -> its top k rows
+        self.dimension_values = dimension_values
+
+        self.dimension_sizes = [len(values) for values in dimension_values]
+        self.cells_per_language = int(np.prod(self.dimension_sizes, dtype=np.int64))
+        self.k = top_rows.shape[2]
+
+    # dimensions is a list of (distinct values, each row's code into them) pairs, and metrics a list of
+    # each row's value of every metric
+    @classmethod
+    def build(cls, language_index, dimensions, metrics, k):
+        rows = np.asarray(language_index.row_ids, dtype=np.int64)
+        keys = np.repeat(np.arange(len(language_index.values), dtype=np.int64), np.diff(language_index.offsets))
+        for values, codes in dimensions:
+            keys = keys * len(values) + np.asarray(codes, dtype=np.int64)[rows]
+
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        cell_keys, starts = np.unique(keys, return_index=True)
+        offsets = np.append(starts, len(rows)).astype(np.int64)
+        sizes = np.diff(offsets)
+
+        big_cells = np.flatnonzero(sizes > k)
+        top_positions = np.full(len(cell_keys), -1, dtype=np.int64)
+        top_positions[big_cells] = np.arange(len(big_cells))
+
+        # Sort the rows of the big cells the same way top_k_rows does (biggest first, rows without a value
+        # last, ties in row order), then the first k of each cell are its top k
+        entry_cells = np.repeat(np.arange(len(cell_keys), dtype=np.int64), sizes)
+        in_big_cell = sizes[entry_cells] > k
+        big_rows, big_entry_cells = rows[in_big_cell], entry_cells[in_big_cell]
+        big_starts = np.cumsum(sizes[big_cells]) - sizes[big_cells]
+        top_entries = big_starts[:, None] + np.arange(k, dtype=np.int64)
+
+        top_rows = np.empty((len(metrics), len(big_cells), k), dtype=np.int64)
+        for metric, values in enumerate(metrics):
+            big_values = values[big_rows]
+            missing = np.isnan(big_values)
+            order = np.lexsort((big_rows, -np.where(missing, 0, big_values), missing, big_entry_cells))
+            top_rows[metric] = big_rows[order][top_entries]
+
+        return cls(cell_keys, offsets, rows, top_positions, top_rows, *[values for values, _ in dimensions])
+
+    def to_arrays(self):
+        return (self.cell_keys, self.offsets, self.row_ids, self.top_positions, self.top_rows) + tuple(self.dimension_values)
+
+    @classmethod
+    def from_arrays(cls, *arrays):
+        return cls(*arrays)
+
+    # The cells of the language (its position in the language index) whose value in each dimension
+    # passes that dimension's mask (a bool per distinct value, or None to take all of them)
+    def cells(self, language, masks):
+        if language < 0:
+            return EMPTY_ROWS
+
+        first = np.searchsorted(self.cell_keys, language * self.cells_per_language)
+        last = np.searchsorted(self.cell_keys, (language + 1) * self.cells_per_language)
+        cells = np.arange(first, last, dtype=np.int64)
+
+        # Peel the codes off the keys from the last dimension back to the first
+        keep = np.ones(len(cells), dtype=bool)
+        remainder = np.asarray(self.cell_keys[first:last])
+        for size, mask in reversed(list(zip(self.dimension_sizes, masks))):
+            remainder, codes = np.divmod(remainder, size)
+            if mask is not None:
+                keep &= np.asarray(mask)[codes]
+        return cells[keep]
+
+    def _rows_of(self, cells):
+        starts = self.offsets[cells]
+        return self.row_ids[_range_positions(starts, self.offsets[cells + 1] - starts)]
+
+    def row_count(self, cells):
+        return int((self.offsets[cells + 1] - self.offsets[cells]).sum())
+
+    # Every row in the cells, sorted (only the ones in row_range, (start, stop), if there is one)
+    def rows(self, cells, row_range=None):
+        rows = self._rows_of(cells)
+        if row_range is not None:
+            rows = rows[(rows >= row_range[0]) & (rows < row_range[1])]
+        return np.sort(rows)
+
+    # The (sorted) rows of the cells that could be in their top k by the metric (its position in the metrics
+    # the cube was built with): all the rows of the small cells, and just the top k of each big one
+    def top_candidates(self, cells, metric):
+        top_positions = self.top_positions[cells]
+        small = top_positions < 0
+        return np.sort(np.concatenate([
+            self._rows_of(cells[small]),
+            np.asarray(self.top_rows[metric][top_positions[~small]]).reshape(-1),
+        ]))
+
+
+# Every name split into overlapping three byte pieces (trigrams) of its lowercased utf-8, with two spaces added in
+# front and one at the end, so 'Portal' is '  p', ' po', 'por', 'ort', 'rta', 'tal' and 'al ' (the same padding
+# Postgres' pg_trgm uses, the start of a name counts for a bit more). Each trigram is one number and keeps the
+# sorted rows of the names it's in, so the whole index is plain arrays like the others. A name that shares most
+# of its trigrams with what was typed is a match, even with a typo or two in it.
+class TrigramIndex:
+    def __init__(self, trigrams, offsets, row_ids, row_trigram_counts):
+        self.trigrams = trigrams
+        self.offsets = offsets
+        self.row_ids = row_ids
+        self.row_trigram_counts = row_trigram_counts  # how many different trigrams each name has
+
+    # Lowercase, with ASCII punctuation as spaces so 'Half-Life' and 'half life' come out the same.
+    # Bytes of other characters are left as they are.
+    @staticmethod
+    def _normalize(data):
+        data = np.asarray(data, dtype=np.uint8)
+        data = np.where((data >= ord('A')) & (data <= ord('Z')), data + 32, data)
+        letter_or_digit = ((data >= ord('a')) & (data <= ord('z'))) | ((data >= ord('0')) & (data <= ord('9')))
+        return np.where((data < 128) & ~letter_or_digit, ord(' '), data).astype(np.uint8)
+
+    # Every trigram of every string (as data and offsets like a StringArray), and which string it's from
+    @classmethod
+    def _trigrams(cls, data, offsets):
+        lengths = np.diff(offsets)
+        byte_strings = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+        # Each string padded with spaces, one after the other
+        padded = np.full(len(data) + 3 * len(lengths), ord(' '), dtype=np.int64)
+        padded[np.arange(len(data), dtype=np.int64) + 3 * byte_strings + 2] = cls._normalize(data[offsets[0]:offsets[-1]])
+
+        # A padded string of n bytes has n - 2 trigrams, one starting at each of its bytes but the last two
+        strings = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths + 1)
+        starts = _range_positions(offsets[:-1] + 3 * np.arange(len(lengths), dtype=np.int64), lengths + 1)
+        return (padded[starts] << 16) | (padded[starts + 1] << 8) | padded[starts + 2], strings
+
+    @classmethod
+    def from_strings(cls, strings):
+        trigrams, rows = cls._trigrams(strings.data, strings.offsets)
+
+        # One number per (trigram, row) pair, sorted by trigram then row, which also drops repeats within a name
+        row_count = max(len(strings), 1)
+        pairs = sorted_unique(trigrams * row_count + rows)
+        trigrams, row_ids = np.divmod(pairs, row_count)
+
+        run_starts = np.flatnonzero(np.diff(trigrams, prepend=-1))
+        offsets = np.append(run_starts, len(row_ids)).astype(np.int64)
+        return cls(trigrams[run_starts], offsets, row_ids, np.bincount(row_ids, minlength=len(strings)))
+
+    def to_arrays(self):
+        return (self.trigrams, self.offsets, self.row_ids, self.row_trigram_counts)
+
+    @classmethod
+    def from_arrays(cls, trigrams, offsets, row_ids, row_trigram_counts):
+        return cls(trigrams, offsets, row_ids, row_trigram_counts)
+
+    # The rows of up to limit names most like the text, best first, and how much they match it (the share of
+    # the text's trigrams that are in the name, from 0 to 1). Names matching less than min_match are left out,
+    # and names that match as much are ranked by how few other trigrams they have (closer to the same length).
+    def search(self, text, limit=10, min_match=0.4):
+        query = np.frombuffer((text or '').strip().encode('utf-8'), dtype=np.uint8)
+        if len(query) == 0:
+            return EMPTY_ROWS, np.empty(0)
+
+        query_trigrams = sorted_unique(self._trigrams(query, np.array([0, len(query)]))[0])
+        positions = np.searchsorted(self.trigrams, query_trigrams)
+        found = positions < len(self.trigrams)
+        found[found] = self.trigrams[positions[found]] == query_trigrams[found]
+        positions = positions[found]
+
+        # A name has to have at least this many of the query's trigrams to be similar enough, so it has to be
+        # in at least one of the lists of all but that many minus one of them. Taking the shortest ones, only
+        # the names in them need checking, which keeps this quick however many names there are.
+        min_overlap = max(int(np.ceil(min_match * len(query_trigrams) - 1e-9)), 1)
+        if len(positions) < min_overlap:
+            return EMPTY_ROWS, np.empty(0)
+        starts, ends = self.offsets[positions], self.offsets[positions + 1]
+        rarest = np.argsort(ends - starts, kind='stable')[:len(positions) - min_overlap + 1]
+        candidates = sorted_unique(np.concatenate([self.row_ids[starts[i]:ends[i]] for i in rarest]))
+
+        overlap = np.zeros(len(candidates), dtype=np.int64)
+        for start, end in zip(starts, ends):
+            rows = self.row_ids[start:end]
+            found_at = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+            overlap += rows[found_at] == candidates
+
+        match = overlap / len(query_trigrams)
+        similarity = overlap / (len(query_trigrams) + self.row_trigram_counts[candidates] - overlap)
+        matching = overlap >= min_overlap
+        candidates, match, similarity = candidates[matching], match[matching], similarity[matching]
+
+        best = np.lexsort((candidates, -similarity, -match))[:limit]
+        return candidates[best], match[best]
+
+
+# The top k rows by every metric of a few languages (the ones on the language chart), worked out ahead of time,
+# since picking a language without touching any other filter is what happens most
+class Leaderboards:
+    def __init__(self, languages, counts, top_rows):
+        self.languages = languages  # their positions in the language index, sorted
+        self.counts = counts  # how many games each one has in its top k (fewer than k if it has fewer games)
+        self.top_rows = top_rows  # metric, language -> its top k rows, padded with -1
+
+    # metrics is a list of each row's value of every metric, in the same order the cube was built with
+    @classmethod
+    def build(cls, cube, languages, metrics, k):
+        languages = sorted_unique(np.asarray([language for language in languages if language >= 0], dtype=np.int64))
+        counts = np.zeros(len(languages), dtype=np.int64)
+        top_rows = np.full((len(metrics), len(languages), k), -1, dtype=np.int64)
+
+        # All of a language's cells, and the cube already knows which of their games could be in the top k
+        every_value = [None] * len(cube.dimension_sizes)
+        for i, language in enumerate(languages):
+            cells = cube.cells(language, every_value)
+            for metric, values in enumerate(metrics):
+                rows = top_k_rows(values, cube.top_candidates(cells, metric), k)
+                top_rows[metric, i, :len(rows)] = rows
+                counts[i] = len(rows)
+
+        return cls(languages, counts, top_rows)
+
+    def to_arrays(self):
+        return (self.languages, self.counts, self.top_rows)
+
+    @classmethod
+    def from_arrays(cls, languages, counts, top_rows):
+        return cls(languages, counts, top_rows)
+
+    # The top rows of the language (its position in the language index) by the metric, or None if it
+    # doesn't have a leaderboard
+    def top(self, language, metric):
+        i = np.searchsorted(self.languages, language)
+        if i == len(self.languages) or self.languages[i] != language:
+            return None
+        return self.top_rows[metric, i, :self.counts[i]]
+
+
+# The rows of a number column sorted by their value (the argsort, with the rows that have no value left out),
+# so the rows with a value in a range are one slice of it, found with two binary searches
+class SortedIndex:
+    def __init__(self, values, rows):
+        self.values = values  # every value, sorted
+        self.rows = rows  # the row each of them is from
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values)
+        present = np.flatnonzero(~np.isnan(values))
+        order = present[np.argsort(values[present], kind='stable')]
+        return cls(values[order], order.astype(np.int64))
+
+    def to_arrays(self):
+        return (self.values, self.rows)
+
+    @classmethod
+    def from_arrays(cls, values, rows):
+        return cls(values, rows)
+
+    # Where the values from low to high (both included) start and stop. None means no bound on that side.
+    def _slice(self, low, high):
+        start = 0 if low is None else int(np.searchsorted(self.values, low, side='left'))
+        stop = len(self.values) if high is None else int(np.searchsorted(self.values, high, side='right'))
+        return start, max(start, stop)
+
+    # How many games have a value from low to high
+    def count(self, low, high):
+        start, stop = self._slice(low, high)
+        return stop - start
+
+    # The sorted rows with a value from low to high
+    def rows_between(self, low, high):
+        start, stop = self._slice(low, high)
+        return np.sort(self.rows[start:stop])
+
+    # Up to count values spread through the games (the smallest and biggest included), so every step between
+    # two of them takes in about as many games. Good for the marks of a slider. When lots of games have the
+    # same value (most games have no DLC at all), the steps after it are spread over the games left instead.
+    def stops(self, count):
+        stops = []
+        start = 0
+        while start < len(self.values) and len(stops) < count:
+            steps_left = count - len(stops) - 1
+            position = start if not stops else start + -(-(len(self.values) - start) // max(steps_left, 1)) - 1
+            stops.append(self.values[position])
+            start = int(np.searchsorted(self.values, self.values[position], side='right'))
+        return np.asarray(stops, dtype=self.values.dtype)
+
+
+# Adds up the games of every distinct key: how many there are, and for every metric the total, how many of
+# them have a value and the biggest value (missing values are left out of all three). rows are the row each
+# key is from, and metrics each row's value of every metric. The keys come back sorted.
+def period_totals(keys, rows, metrics):
+    order = np.argsort(keys, kind='stable')
+    keys, rows = keys[order], rows[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else EMPTY_ROWS
+
+    counts = np.diff(np.append(starts, len(keys)))
+    sums = np.zeros((len(metrics), len(starts)), dtype=np.float64)
+    value_counts = np.zeros((len(metrics), len(starts)), dtype=np.int64)
+    maxima = np.full((len(metrics), len(starts)), np.nan, dtype=np.float32)
+    if len(keys):
+        for i, values in enumerate(metrics):
+            values = values[rows]
+            has_value = ~np.isnan(values)
+            sums[i] = np.add.reduceat(np.where(has_value, values, 0).astype(np.float64), starts)
+            value_counts[i] = np.add.reduceat(has_value.astype(np.int64), starts)
+            maxima[i] = np.fmax.reduceat(values, starts)
+    return keys[starts], counts, sums, value_counts, maxima
+
+
+# The totals of every month (or year) for every value of an index, worked out when the data is loaded, so a
+# trend over time of one language, genre or tag is a slice of it instead of a pass over its games. Only the
+# (value, period) pairs with any games are kept, each as one number (the value's position times how many
+# periods there are, plus the period), sorted, so a value's periods are found with two binary searches.
+class TimeRollup:
+    def __init__(self, bounds, keys, counts, sums, value_counts, maxima):
+        self.bounds = bounds  # the first period, and how many periods there are from it to the last
+        self.keys = keys
+        self.counts = counts  # how many games came out in each
+        self.sums = sums  # metric, key -> the total of the metric
+        self.value_counts = value_counts  # metric, key -> how many games have a value of it
+        self.maxima = maxima  # metric, key -> the biggest value of it
+
+    # offsets and row_ids are an index's (value i has rows row_ids[offsets[i]:offsets[i + 1]]), periods every
+    # row's period (-1 for no release date, those are left out) and metrics every row's value of every metric
+    @classmethod
+    def build(cls, offsets, row_ids, periods, metrics):
+        row_periods = periods[row_ids]
+        positions = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        dated = np.flatnonzero(row_periods >= 0)
+        first = int(row_periods[dated].min()) if len(dated) else 0
+        span = int(row_periods[dated].max()) - first + 1 if len(dated) else 1
+
+        keys = positions[dated] * span + (row_periods[dated].astype(np.int64) - first)
+        keys, counts, sums, value_counts, maxima = period_totals(keys, row_ids[dated], metrics)
+        return cls(np.array([first, span], dtype=np.int64), keys, counts, sums, value_counts, maxima)
+
+    def to_arrays(self):
+        return (self.bounds, self.keys, self.counts, self.sums, self.value_counts, self.maxima)
+
+    @classmethod
+    def from_arrays(cls, bounds, keys, counts, sums, value_counts, maxima):
+        return cls(bounds, keys, counts, sums, value_counts, maxima)
+
+    # The periods the value at position has games in, and their (counts, sums, value counts, maxima) of the metric
+    def totals(self, position, metric):
+        first, span = int(self.bounds[0]), int(self.bounds[1])
+        start, stop = np.searchsorted(self.keys, [position * span, (position + 1) * span])
+        periods = self.keys[start:stop] - position * span + first
+        return periods, self.counts[start:stop], self.sums[metric, start:stop], self.value_counts[metric, start:stop], \
+            self.maxima[metric, start:stop]
+
+
+# Deduplicated, frequency-ranked list of every value in an index, for the dropdown searches.
+# The values are sorted case-insensitively so all the values starting with what the user has typed
+# sit next to each other and can be found with two binary searches.
+class PrefixIndex:
+    def __init__(self, keys, values, counts, limit=50, cached_prefix_length=1):
+        self.keys = keys
+        self.values = values
+        self.counts = counts
+        self.limit = limit
+
+        # The shortest prefixes match the most values, so their answers are worked out up front
+        self.cached = {'': self._search('', limit)}
+        start = 0
+        while start < len(keys):
+            prefix = keys[start][:cached_prefix_length]
+            self.cached[prefix] = self._search(prefix, limit)
+            start = bisect_left(keys, prefix + LAST_CHARACTER, lo=start + 1)
+
+    @classmethod
+    def from_index(cls, index, limit=50):
+        entries = sorted(index.counts().items(), key=lambda entry: (entry[0].lower(), entry[0]))
+        return cls(
+            StringArray.from_strings([value.lower() for value, _ in entries]),
+            StringArray.from_strings([value for value, _ in entries]),
+            np.array([count for _, count in entries], dtype=np.int64),
+            limit,
+        )
+
+    def to_arrays(self):
+        return self.keys.to_arrays() + self.values.to_arrays() + (self.counts,)
+
+    @classmethod
+    def from_arrays(cls, keys_data, keys_offsets, values_data, values_offsets, counts):
+        return cls(StringArray(keys_data, keys_offsets), StringArray(values_data, values_offsets), counts)
+
+    def _search(self, prefix, limit):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + LAST_CHARACTER, lo=start)
+        counts = self.counts[start:end]
+
+        # Only the top few are needed, so partition instead of sorting every match
+        if len(counts) > limit:
+            top = np.argpartition(-counts, limit - 1)[:limit]
+        else:
+            top = np.arange(len(counts))
+        top = top[np.lexsort((top, -counts[top]))]
+
+        return self.values.take(start + top)
+
+    # The most common values starting with the text (case-insensitive), most common first
+    def search(self, text, limit=None):
+        limit = self.limit if limit is None else limit
+        prefix = (text or '').strip().lower()
+
+        if limit <= self.limit and prefix in self.cached:
+            return self.cached[prefix][:limit]
+        return self._search(prefix, limit)
+
+
+def build_option_indexes(indexes, names, limit=50):
+    return {name: PrefixIndex.from_index(indexes[name], limit) for name in names}
+
+
+# The k rows (out of the sorted row ids) with the biggest values, biggest first. It works the same
+# as sort_values(ascending=False).head(k): rows without a value (NaN) go last, and ties keep their
+# row order. Only the values that can make it into the top k ever get sorted.
+def top_k_rows(values, rows, k):
+    row_values = values[rows]
+    has_value = ~np.isnan(row_values)
+    valued_rows, valued = rows[has_value], row_values[has_value]
+
+    if len(valued) > k:
+        # The k-th biggest value, everything above it is in, and the ties on it are taken in row order
+        kth_value = np.partition(valued, len(valued) - k)[len(valued) - k]
+        above = np.flatnonzero(valued > kth_value)
+        tied = np.flatnonzero(valued == kth_value)[:k - len(above)]
+        keep = np.concatenate([above, tied])
+        valued_rows, valued = valued_rows[keep], valued[keep]
+
+    top = valued_rows[np.lexsort((valued_rows, -valued))][:k]
+
+    if len(top) < k:
+        top = np.concatenate([top, rows[~has_value][:k - len(top)]])
+    return top
+
+
+# Each array of a dict of MultiValueColumns/indexes (anything with to_arrays) gets its own .npy file,
+# so they can be memory-mapped when they're loaded back. Returns how many arrays each one has.
+def save_arrays(directory, prefix, named_objects):
+    part_counts = {}
+    for name, named_object in named_objects.items():
+        arrays = named_object.to_arrays()
+        for part, array in enumerate(arrays):
+            np.save(os.path.join(directory, f'{prefix}.{name}.{part}.npy'), np.asarray(array))
+        part_counts[name] = len(arrays)
+    return part_counts
+
+
+# Memory-mapped and read-only, so every process that loads the same snapshot shares one copy
+def load_array(path):
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        # Empty arrays can't be memory-mapped
+        return np.load(path, allow_pickle=False)
+
+
+def load_arrays(directory, prefix, part_counts, cls):
+    return {
+        name: cls.from_arrays(*[load_array(os.path.join(directory, f'{prefix}.{name}.{part}.npy')) for part in range(count)])
+        for name, count in part_counts.items()
+    }
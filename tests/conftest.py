@@ -0,0 +1,133 @@
+import os
+import io
+import sys
+import random
+import contextlib
+import numpy as np
+import pytest
+
+# The modules are all at the top of the project, next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_games import generate_games_csv
+from query_engine import QUERY_FIELDS, RANGE_FIELDS
+from steam_data import LANGUAGE_INDEX, PLATFORMS, SUCCESS_METRICS, load_steam_data
+
+# Small enough to check every query against pandas, big enough for most cells and filters to have games
+TEST_ROWS = 4000
+
+QUERY_LIST_FIELDS = {
+    'developers': 'developers separated',
+    'publishers': 'publishers separated',
+    'categories': 'categories separated',
+    'genres': 'genres separated',
+    'tags': 'tags separated',
+}
+
+
+# A made-up games.csv
+@pytest.fixture(scope='session')
+def games_csv(tmp_path_factory):
+    csv_path = str(tmp_path_factory.mktemp('data') / 'games.csv')
+    generate_games_csv(csv_path, TEST_ROWS, seed=1)
+    return csv_path
+
+
+# The games.csv loaded the same way the dashboard loads it (so it comes back memory-mapped from its snapshot)
+@pytest.fixture(scope='session')
+def dataset(games_csv):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_steam_data(games_csv, os.path.join(os.path.dirname(games_csv), 'snapshot'))
+
+
+# Every game's languages, developers, ... as python sets, straight from the multi-valued columns (not the indexes)
+@pytest.fixture(scope='session')
+def game_values(dataset):
+    return {
+        name: [set(column.row_values(row)) for row in range(len(column))]
+        for name, column in dataset.value_columns.items()
+    }
+
+
+# The rows matching a query, worked out with plain pandas one game at a time, and its top games sorted the
+# way the dashboard always has (biggest first, games without a value last, ties in row order)
+@pytest.fixture(scope='session')
+def pandas_filter(dataset, game_values):
+    games = dataset.games
+
+    def matching(query):
+        keep = np.ones(len(games), dtype=bool)
+        if query['language'] is not None:
+            keep &= np.array([query['language'] in values for values in game_values[LANGUAGE_INDEX]])
+        if query['maturity_rating'] is not None:
+            keep &= (games['Maturity Rating'] == query['maturity_rating']).to_numpy()
+        if isinstance(query['price'], list):
+            keep &= games['Price'].between(*[bound if bound is not None else sign * np.inf for bound, sign in zip(query['price'], (-1, 1))]).to_numpy()
+        elif query['price'] is not None:
+            keep &= (games['Price'] == query['price']).to_numpy()
+        if query['positive_percentage'] is not None:
+            keep &= games['Merged Reviews'].between(query['positive_percentage'] - 10, query['positive_percentage']).to_numpy()
+        for field, name in QUERY_LIST_FIELDS.items():
+            if query[field]:
+                wanted = set(query[field])
+                test = (lambda values: bool(wanted & values)) if field == 'tags' else (lambda values: wanted <= values)
+                keep &= np.array([test(values) for values in game_values[name]])
+        for field, column in RANGE_FIELDS.items():
+            if query[field] is not None:
+                low, high = query[field]
+                keep &= games[column].between(-np.inf if low is None else low, np.inf if high is None else high).to_numpy()
+        if query['platforms']:
+            runs_on = [games['Platforms'].to_numpy() & (1 << PLATFORMS.index(platform)) != 0 for platform in query['platforms']]
+            keep &= np.logical_and.reduce(runs_on) if query['platform_mode'] == 'all' else np.logical_or.reduce(runs_on)
+        return np.flatnonzero(keep)
+
+    def top(query, k=15):
+        rows = matching(query)
+        ranked = games.iloc[rows].assign(row=rows).sort_values(query['metric'], ascending=False, kind='stable', na_position='last')
+        return ranked['row'].to_numpy()[:k]
+
+    matching.top = top
+    return matching
+
+
+# Random queries mixing every kind of filter, with values taken from the data so most of them match something
+@pytest.fixture(scope='session')
+def random_queries(dataset):
+    indexes = dataset.indexes
+
+    def make(count, seed, language_optional=False):
+        rng = random.Random(seed)
+        languages = [language for language in dataset.language_counts['Language']] + ['Not A Language']
+        values = {field: indexes[name].values.tolist() for field, name in QUERY_LIST_FIELDS.items()}
+        queries = []
+        for _ in range(count):
+            query = {field: (list(default) if isinstance(default, list) else default) for field, default in QUERY_FIELDS.items()}
+            query['language'] = rng.choice(languages[:8] if rng.random() < 0.8 else languages)
+            if language_optional and rng.random() < 0.4:
+                query['language'] = None
+            query['metric'] = rng.choice(SUCCESS_METRICS)
+            if rng.random() < 0.3:
+                query['maturity_rating'] = rng.choice(['G', 'PG', 'M', 'MA', 'R', 'X'])
+            if rng.random() < 0.3:
+                query['price'] = rng.choice([0, 5, 10, [None, 5], [5, 20], [10, None]])
+            if rng.random() < 0.3:
+                query['positive_percentage'] = rng.choice(range(10, 101, 10))
+            for field in QUERY_LIST_FIELDS:
+                if rng.random() < 0.2:
+                    # The popular values (first in the rows) as well as the rare ones
+                    pool = values[field]
+                    query[field] = rng.sample(pool[:30] if rng.random() < 0.7 else pool, rng.choice([1, 1, 2]))
+            for field, column in RANGE_FIELDS.items():
+                if rng.random() < 0.15:
+                    stops = dataset.range_indexes[column].stops(6).tolist()
+                    low, high = sorted(rng.sample(stops, 2)) if len(stops) > 1 else (None, None)
+                    query[field] = [rng.choice([low, None]), rng.choice([high, None])]
+                    if query[field] == [None, None]:
+                        query[field] = None
+            if rng.random() < 0.2:
+                query['platforms'] = rng.sample(PLATFORMS, rng.randint(1, len(PLATFORMS)))
+                query['platform_mode'] = rng.choice(['any', 'all'])
+            queries.append(query)
+        return queries
+
+    return make
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from query_engine import QueryEngine, parse_query
+
+
+def describe(query):
+    return {field: value for field, value in query.items() if value not in (None, [], 'any')}
+
+
+# The leaderboards, the cube's top k, the planner and the index/range/platform filters against plain pandas
+def test_top_rows_match_pandas(dataset, pandas_filter, random_queries):
+    engine = QueryEngine(dataset)
+    steps = set()
+    for query in random_queries(400, seed=18):
+        explain = []
+        top_rows, _ = engine.top_rows(query, explain=explain)
+        steps.update(step['step'] for step in explain)
+        assert top_rows.tolist() == pandas_filter.top(query).tolist(), describe(query)
+
+    # Every way of answering a query got used
+    assert {'leaderboard', 'cube top k', 'cube filter', 'nothing can match'} <= steps
+
+
+def test_matching_rows_match_pandas(dataset, pandas_filter, random_queries):
+    engine = QueryEngine(dataset)
+    for query in random_queries(400, seed=19, language_optional=True):
+        assert engine.matching_rows(query).tolist() == pandas_filter(query).tolist(), describe(query)
+
+
+# A batch reuses the filter results of earlier queries, which mustn't change the answers
+def test_batch_matches_single_queries(dataset, random_queries):
+    queries = random_queries(100, seed=20)
+    single = [QueryEngine(dataset).run(query) for query in queries]
+    batch = list(QueryEngine(dataset, memo=True).run_batch(queries))
+    assert batch == single
+
+
+def test_parse_query_fills_in_and_checks_fields():
+    query = parse_query({'language': 'English', 'tags': ['RPG'], 'price': [None, 10]})
+    assert query['tags'] == ['RPG'] and query['genres'] == [] and query['price'] == [None, 10] and query['metric'] == 'Peak CCU'
+
+    for bad_query in [{}, {'language': 'English', 'colour': 'red'}, {'language': 'English', 'price': [1]},
+                      {'language': 'English', 'platforms': ['Amiga']}, {'language': 'English', 'metric': 'Owners'}]:
+        try:
+            parse_query(bad_query)
+        except ValueError:
+            continue
+        raise AssertionError(f'{bad_query} should have been refused')
+
+
+# Queries that use only the language, a genre or a tag come from the rollups, the rest from the filters,
+# and both have to give the same totals as adding up the matching games directly
+def test_trend_matches_pandas(dataset, pandas_filter, random_queries):
+    games = dataset.games
+    engine = QueryEngine(dataset)
+    paths = set()
+    queries = random_queries(150, seed=23, language_optional=True)
+    # Plenty of queries the rollups answer on their own
+    for query in queries[:60]:
+        for field in ['maturity_rating', 'price', 'positive_percentage', 'dlc_count', 'positive', 'negative', 'achievements', 'recommendations']:
+            query[field] = None
+        query['developers'], query['publishers'], query['categories'], query['platforms'] = [], [], [], []
+
+    for i, query in enumerate(queries):
+        period = ['month', 'year'][i % 2]
+        explain = []
+        periods, counts, sums, value_counts, maxima = engine.trend(query, period, explain=explain)
+        paths.add(explain[-1]['step'])
+
+        rows = pandas_filter(query)
+        months = games['Release Month'].to_numpy()[rows]
+        rows, months = rows[months >= 0], months[months >= 0]
+        values = games[query['metric']].to_numpy()[rows].astype(np.float64)
+        grouped = pd.DataFrame({'period': months if period == 'month' else months // 12, 'value': values}).groupby('period')['value']
+        expected = grouped.agg(['size', 'sum', 'count', 'max'])
+
+        assert periods.tolist() == expected.index.tolist(), describe(query)
+        assert counts.tolist() == expected['size'].tolist()
+        assert value_counts.tolist() == expected['count'].tolist()
+        assert np.allclose(sums, expected['sum'].to_numpy(dtype=np.float64))
+        assert np.allclose(maxima, expected['max'].to_numpy(dtype=np.float64), equal_nan=True)
+
+    assert paths == {'trend rollup', 'trend totals'}
@@ -0,0 +1,26 @@
+from result_cache import ResultCache
+
+
+# During a reload, requests for the old and the new version of the data come in mixed together,
+# the old ones mustn't throw away (or overwrite) what's been cached for the new one
+def test_older_versions_are_ignored():
+    cache = ResultCache(1024 * 1024)
+    cache.put('chart', 'old chart', version=1)
+    assert cache.get('chart', version=1) == 'old chart'
+
+    cache.put('chart', 'new chart', version=2)
+    for _ in range(3):
+        cache.put('chart', 'old chart', version=1)
+        assert cache.get('chart', version=1) is None
+        assert cache.get('chart', version=2) == 'new chart'
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(200)
+    for i in range(20):
+        cache.put(i, 'x' * 30)
+        cache.get(0)
+    stats = cache.stats()
+    assert cache.get(0) == 'x' * 30 and cache.get(1) is None
+    assert stats['bytes'] <= 200 and stats['evictions'] > 0
@@ -0,0 +1,110 @@
+import io
+import itertools
+import os
+import contextlib
+import numpy as np
+from benchmarks.generate_games import generate_games_csv
+from query_engine import FILTER_STAGES, QUERY_FIELDS, RANGE_FIELDS, QueryEngine
+from sharded_filter import ShardedFilter, shard_top_rows
+from steam_data import CUBE_COLUMNS, LANGUAGE_INDEX, load_steam_data, platform_bits
+from steam_index import top_k_rows
+
+
+def shard_arguments(dataset, query):
+    engine = QueryEngine(dataset)
+    cube_masks = engine._cube_masks(query)
+    cells = dataset.cube.cells(dataset.indexes[LANGUAGE_INDEX].position(query['language']), [cube_masks[column] for column in CUBE_COLUMNS])
+    return (cells, [(column, query[field]) for _, field, column in FILTER_STAGES if query[field]], query['tags'],
+            [(column, *query[field]) for field, column in RANGE_FIELDS.items() if query[field] is not None],
+            (platform_bits(query['platforms']), query['platform_mode'] == 'all') if query['platforms'] else None)
+
+
+# The top k of every shard, put together, have the same top k as the whole query
+def test_shards_give_the_same_top_games(dataset, pandas_filter, random_queries):
+    rows = len(dataset.games)
+    for query in random_queries(200, seed=15):
+        arguments = shard_arguments(dataset, query)
+        for shard_count in [1, 3, 7]:
+            bounds = np.linspace(0, rows, shard_count + 1).astype(np.int64)
+            candidates = np.sort(np.concatenate([
+                shard_top_rows(dataset, *arguments, query['metric'], 15, (int(start), int(stop)))
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]))
+            top_rows = top_k_rows(dataset.games[query['metric']].to_numpy(), candidates, 15)
+            assert top_rows.tolist() == pandas_filter.top(query).tolist(), (query, shard_count)
+
+
+# Through the pool of processes, each mapping the snapshot itself, with every query big enough to be split
+def test_process_pool_matches_single_process(dataset, random_queries):
+    sharded_filter = ShardedFilter(processes=2, min_rows=0)
+    try:
+        sharded = QueryEngine(dataset, sharded_filter)
+        single = QueryEngine(dataset)
+        queries = [query for query in random_queries(60, seed=16) if query['tags'] or query['genres'] or query['platforms']]
+        sharded_steps = 0
+        for query in queries:
+            explain = []
+            assert sharded.top_rows(query, explain=explain)[0].tolist() == single.top_rows(query)[0].tolist()
+            sharded_steps += any(step['step'] == 'sharded filters' for step in explain)
+        assert sharded_steps > 0
+    finally:
+        sharded_filter.shutdown()
+
+
+# A server process that hasn't picked up a reload yet keeps sending its old snapshot to the filter processes.
+# The snapshot it replaced is kept for one more rebuild, and once that's gone too the query is done in-process.
+def test_old_snapshot_after_reloads(tmp_path):
+    csv_path, snapshot_dir = str(tmp_path / 'games.csv'), str(tmp_path / 'snapshot')
+
+    def load(seed):
+        generate_games_csv(csv_path, 600, seed=seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_steam_data(csv_path, snapshot_dir)
+
+    old = load(seed=2)
+    # The old games' most common languages and tags, so the cube is the cheapest step and gets split up
+    tags = old.indexes['tags separated']
+    popular_tags = tags.values.take(np.argsort(-np.diff(tags.offsets), kind='stable')[:3])
+    queries = []
+    for language, tag in itertools.product(old.language_counts['Language'].tolist()[:3], popular_tags):
+        query = {field: (list(default) if isinstance(default, list) else default) for field, default in QUERY_FIELDS.items()}
+        query['language'], query['tags'] = language, [tag]
+        queries.append(query)
+    sharded_filter = ShardedFilter(processes=2, min_rows=0)
+    try:
+        load(seed=3)
+        assert os.path.isdir(os.path.join(snapshot_dir, old.snapshot[1]['directory']))
+        load(seed=4)
+        assert not os.path.isdir(os.path.join(snapshot_dir, old.snapshot[1]['directory']))
+
+        fallbacks = 0
+        for query in queries:
+            explain = []
+            assert QueryEngine(old, sharded_filter).top_rows(query, explain=explain)[0].tolist() == QueryEngine(old).top_rows(query)[0].tolist()
+            fallbacks += any(step['step'] == 'sharded filters' and step['rows_out'] is None for step in explain)
+        assert fallbacks > 0
+    finally:
+        sharded_filter.shutdown()
+
+
+# A pool process that dies takes its pool down with it: that query is filtered in-process, and the next one
+# gets a new pool
+def test_dead_pool_process(dataset, random_queries):
+    sharded_filter = ShardedFilter(processes=2, min_rows=0)
+    try:
+        engine = QueryEngine(dataset, sharded_filter)
+        single = QueryEngine(dataset)
+
+        def run(query):
+            explain = []
+            assert engine.top_rows(query, explain=explain)[0].tolist() == single.top_rows(query)[0].tolist()
+            return next((step for step in explain if step['step'] == 'sharded filters'), None)
+
+        query = next(query for query in random_queries(60, seed=16) if run(query) is not None)
+        for process in list(sharded_filter._pool._processes.values()):
+            process.kill()
+            process.join()
+        assert 'BrokenProcessPool' in run(query)['error']
+        assert run(query)['rows_out'] is not None
+    finally:
+        sharded_filter.shutdown()
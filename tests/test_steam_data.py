@@ -0,0 +1,78 @@
+import io
+import os
+import itertools
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+import steam_data
+from benchmarks.generate_games import generate_games_csv
+from steam_data import PLATFORMS, count_platforms, load_steam_data, platform_bits
+
+
+# Every game's platform bits against the Windows/Mac/Linux columns of the csv, and the platform checklist's
+# counts (added up from the count of every combination of bits) against counting the games one by one
+def test_platform_bits_match_csv(dataset, games_csv):
+    raw = pd.read_csv(games_csv, usecols=['AppID'] + PLATFORMS).set_index('AppID')
+    raw = raw.loc[dataset.games['AppID'].to_numpy().astype(np.int64)]
+    platforms = dataset.games['Platforms'].to_numpy()
+    for platform in PLATFORMS:
+        assert ((platforms & platform_bits([platform])) != 0).tolist() == raw[platform].tolist()
+
+    for size in range(1, len(PLATFORMS) + 1):
+        for wanted in itertools.combinations(PLATFORMS, size):
+            runs_on = raw[list(wanted)]
+            assert count_platforms(dataset.platform_counts, platform_bits(wanted)) == int(runs_on.any(axis=1).sum())
+            assert count_platforms(dataset.platform_counts, platform_bits(wanted), require_all=True) == int(runs_on.all(axis=1).sum())
+
+
+# A csv with the same size as the snapshot's but a different mtime gets hashed once: to see whether it's the
+# same file (it's only been copied, so the snapshot is used), or to build the new snapshot (it has changed)
+def test_csv_hashed_once(tmp_path, monkeypatch):
+    csv_path, snapshot_dir = str(tmp_path / 'games.csv'), str(tmp_path / 'snapshot')
+    generate_games_csv(csv_path, 300, seed=5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_steam_data(csv_path, snapshot_dir)
+
+    hashes = []
+    fingerprint = steam_data.csv_fingerprint
+
+    def counted_fingerprint(path, with_hash=True):
+        hashes.append(with_hash)
+        return fingerprint(path, with_hash)
+
+    monkeypatch.setattr(steam_data, 'csv_fingerprint', counted_fingerprint)
+
+    for change in ['copied', 'edited']:
+        with open(csv_path, 'rb') as csv_file:
+            contents = csv_file.read()
+        if change == 'edited':
+            # Swap two characters of the first game's row, so the size stays the same
+            start = contents.index(b'\n') + 1
+            contents = contents[:start] + contents[start + 1:start + 2] + contents[start:start + 1] + contents[start + 2:]
+        with open(csv_path, 'wb') as csv_file:
+            csv_file.write(contents)
+        os.utime(csv_path, ns=(os.stat(csv_path).st_atime_ns, os.stat(csv_path).st_mtime_ns + 10 ** 9))
+
+        hashes.clear()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            load_steam_data(csv_path, snapshot_dir)
+        assert hashes.count(True) == 1, change
+        assert ('Loading preprocessed snapshot' in output.getvalue()) == (change == 'copied')
+
+
+# A csv missing some of the used columns gets one error naming all of them, one without AppID still loads
+def test_missing_columns(tmp_path):
+    csv_path = str(tmp_path / 'games.csv')
+    generate_games_csv(csv_path, 50, seed=3)
+    games = pd.read_csv(csv_path)
+
+    games.drop(columns=['Price', 'Tags']).to_csv(csv_path, index=False)
+    with pytest.raises(ValueError, match='Price, Tags'):
+        steam_data.read_games_csv(csv_path)
+
+    games.drop(columns=['AppID']).to_csv(csv_path, index=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataset = load_steam_data(csv_path, str(tmp_path / 'snapshot'))
+    assert len(dataset.games) and 'AppID' not in dataset.games
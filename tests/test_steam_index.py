@@ -0,0 +1,75 @@
+import itertools
+import numpy as np
+import pandas as pd
+from steam_data import ALL_GAMES, CUBE_COLUMNS, LANGUAGE_INDEX, ROLLUP_INDEXES, SUCCESS_METRICS, TREND_PERIODS, rollup_name
+from steam_index import SortedIndex, TimeRollup, top_k_rows
+
+
+# Every combination of rating, price and review masks for a few languages picks out exactly the games
+# pandas finds with those values, and the cube's top k candidates hold the same top games as all of them
+def test_cube_cells_match_pandas(dataset, game_values):
+    games = dataset.games
+    rng = np.random.default_rng(12)
+    languages = dataset.language_counts['Language'].tolist()[:5]
+    for language, _ in itertools.product(languages, range(20)):
+        masks = [None if rng.random() < 0.3 else rng.random(len(dataset.cube_values(column))) < 0.5 for column in CUBE_COLUMNS]
+        cells = dataset.cube.cells(dataset.indexes[LANGUAGE_INDEX].position(language), masks)
+
+        keep = np.array([language in values for values in game_values[LANGUAGE_INDEX]])
+        for column, mask in zip(CUBE_COLUMNS, masks):
+            if mask is not None:
+                allowed = dataset.cube_values(column)[mask]
+                keep &= games[column].isin(allowed).to_numpy()
+        expected = np.flatnonzero(keep)
+
+        assert dataset.cube.rows(cells).tolist() == expected.tolist()
+        assert dataset.cube.row_count(cells) == len(expected)
+        for metric, metric_column in enumerate(SUCCESS_METRICS):
+            values = games[metric_column].to_numpy()
+            candidates = dataset.cube.top_candidates(cells, metric)
+            assert top_k_rows(values, candidates, 15).tolist() == top_k_rows(values, expected, 15).tolist()
+
+
+# Every value of every rollup against a pandas groupby of its games
+def test_time_rollups_match_groupby(dataset):
+    games = dataset.games
+    months = games['Release Month'].to_numpy()
+    for period in TREND_PERIODS:
+        periods = months if period == 'month' else np.where(months >= 0, months // 12, -1)
+        for index_name in ROLLUP_INDEXES + [ALL_GAMES]:
+            rollup = dataset.rollups[rollup_name(index_name, period)]
+            if index_name == ALL_GAMES:
+                value_rows = [np.arange(len(games))]
+            else:
+                index = dataset.indexes[index_name]
+                value_rows = [index.row_ids[index.offsets[i]:index.offsets[i + 1]] for i in range(len(index.values))]
+
+            for position, rows in enumerate(value_rows):
+                rows = rows[periods[rows] >= 0]
+                metric = position % len(SUCCESS_METRICS)
+                values = games[SUCCESS_METRICS[metric]].to_numpy()[rows].astype(np.float64)
+                expected = pd.DataFrame({'period': periods[rows], 'value': values}).groupby('period')['value'].agg(['size', 'sum', 'count', 'max'])
+
+                got_periods, counts, sums, value_counts, maxima = rollup.totals(position, metric)
+                assert got_periods.tolist() == expected.index.tolist(), (index_name, period, position)
+                assert counts.tolist() == expected['size'].tolist()
+                assert value_counts.tolist() == expected['count'].tolist()
+                assert np.allclose(sums, expected['sum'].to_numpy())
+                assert np.allclose(maxima, expected['max'].to_numpy(), equal_nan=True)
+
+
+def test_time_rollup_without_dates():
+    periods = np.array([-1, -1, -1])
+    rollup = TimeRollup.build(np.array([0, 3]), np.arange(3), periods, [np.array([1.0, 2.0, np.nan])])
+    got_periods, counts, _, _, _ = rollup.totals(0, 0)
+    assert len(got_periods) == 0 and len(counts) == 0
+
+
+def test_sorted_index_ranges():
+    values = np.array([3, np.nan, 1, 2, 2, 5, np.nan, 0], dtype=np.float32)
+    index = SortedIndex.from_values(values)
+    for low, high in [(None, None), (2, 2), (1, 3), (None, 2), (3, None), (6, 9)]:
+        expected = [row for row, value in enumerate(values) if not np.isnan(value)
+                    and (low is None or value >= low) and (high is None or value <= high)]
+        assert index.rows_between(low, high).tolist() == expected
+        assert index.count(low, high) == len(expected)
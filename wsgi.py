@@ -0,0 +1,10 @@
+# The entry point for production servers, e.g.
+#   gunicorn -c gunicorn.conf.py wsgi:server       (Linux/macOS)
+#   waitress-serve --threads 8 wsgi:server         (Windows)
+# The data is loaded once here when the module is imported. With gunicorn that happens before the
+# workers are forked (preload_app in gunicorn.conf.py), and the data itself is memory-mapped from the
+# snapshot, so adding workers doesn't add more copies of it.
+from FinalProject import create_app
+
+app = create_app()
+server = app.server